@@ -0,0 +1,249 @@
+"""
+Ricerca approssimata (ANN) dei partner su embedding densi.
+
+Ogni partner viene rappresentato da un vettore che concatena lo score di
+settore per ogni settore PMI noto, le codifiche one-hot di settori, paese,
+servizi e tipo e un embedding TF-IDF-SVD della descrizione. La PMI viene
+codificata con i pesi dello score, così il prodotto scalare riproduce lo score
+pesato a meno della componente testuale: l'indice restituisce poche centinaia
+di candidati che BusinessMatchingEngine riordina con lo scorer esatto.
+
+L'indice usa hnswlib (HNSW) se installato, altrimenti un indice IVF in NumPy.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # dipendenza opzionale
+    hnswlib = None
+
+
+def _one_hot(codes: np.ndarray, width: int) -> np.ndarray:
+    """Codifica one-hot di codici interni (-1 = ultimo slot, valore mancante)."""
+    matrix = np.zeros((len(codes), width + 1), dtype=np.float32)
+    matrix[np.arange(len(codes)), np.where(codes >= 0, codes, width)] = 1.0
+    return matrix
+
+
+class PartnerEmbedder:
+    """
+    Embedding densi dei partner di una PartnerFeatureMatrix e delle PMI.
+
+    I vocabolari sono quelli della matrice, quindi l'embedder vale solo per
+    la matrice su cui è stato costruito.
+    """
+
+    def __init__(self, features, engine, text_dimensions: int = 64, seed: int = 0):
+        self.features = features
+        self.engine = engine
+        self.sector_keys = {sector: i for i, sector in enumerate(engine.sector_compatibility)}
+        self.svd = None
+        self.tfidf = None
+
+        # Embedding testuale: TF-IDF sui conteggi già calcolati, ridotto con SVD
+        if features.term_counts is not None and len(features.term_vocabulary) > 2:
+            from sklearn.decomposition import TruncatedSVD
+            from sklearn.feature_extraction.text import TfidfTransformer
+
+            dimensions = min(text_dimensions, len(features.term_vocabulary) - 1)
+            self.tfidf = TfidfTransformer().fit(features.term_counts)
+            self.svd = TruncatedSVD(n_components=dimensions, random_state=seed).fit(
+                self.tfidf.transform(features.term_counts)
+            )
+
+    def _text_embedding(self, counts) -> np.ndarray:
+        vectors = self.svd.transform(self.tfidf.transform(counts)).astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def embed_partners(self) -> np.ndarray:
+        """Restituisce la matrice (partner x dimensioni) degli embedding."""
+        features = self.features
+
+        # Score di settore precalcolato per ogni settore PMI con settori compatibili
+        # (il massimo su più settori del partner non è un prodotto scalare)
+        sector_scores = np.zeros((features.size, len(self.sector_keys)), dtype=np.float32)
+        for pmi_sector, column in self.sector_keys.items():
+            compatible = [
+                features.sector_vocabulary[s]
+                for s in self.engine.sector_compatibility[pmi_sector]
+                if s in features.sector_vocabulary
+            ]
+            if compatible:
+                sector_scores[features.sector_bits[:, compatible].any(axis=1), column] = 0.7
+            exact = features.sector_vocabulary.get(pmi_sector)
+            if exact is not None:
+                sector_scores[features.sector_bits[:, exact], column] = 1.0
+
+        blocks = [
+            sector_scores,
+            features.sector_bits.astype(np.float32),
+            _one_hot(features.country_codes, len(features.country_vocabulary)),
+            features.service_bits.astype(np.float32),
+            _one_hot(features.type_codes, len(features.type_vocabulary)),
+        ]
+        if self.svd is not None:
+            blocks.append(self._text_embedding(features.term_counts))
+        return np.ascontiguousarray(np.hstack(blocks), dtype=np.float32)
+
+    def embed_query(self, pmi_data: Dict, weights=None) -> np.ndarray:
+        """
+        Codifica una PMI in modo che il prodotto scalare con un partner
+        approssimi lo score pesato di calculate_match_scores_batch.
+        """
+        features = self.features
+        engine = self.engine
+        if weights is None:
+            weights = engine.weights
+
+        # Settori con compatibilità: colonna precalcolata; altrimenti solo match esatto
+        sector = np.zeros(len(self.sector_keys) + len(features.sector_vocabulary), dtype=np.float32)
+        pmi_sector = pmi_data.get('sector') or ''
+        if pmi_sector in self.sector_keys:
+            sector[self.sector_keys[pmi_sector]] = 1.0
+        elif pmi_sector in features.sector_vocabulary:
+            sector[len(self.sector_keys) + features.sector_vocabulary[pmi_sector]] = 1.0
+
+        country = np.zeros(len(features.country_vocabulary) + 1, dtype=np.float32)
+        pmi_targets = pmi_data.get('target_markets') or []
+        for name, index in features.country_vocabulary.items():
+            if name in pmi_targets:
+                country[index] = 1.0
+            elif any(t in engine.neighboring_countries.get(name, []) for t in pmi_targets):
+                country[index] = 0.5
+
+        service = np.zeros(len(features.service_vocabulary), dtype=np.float32)
+        pmi_needs = pmi_data.get('business_needs') or []
+        for need in pmi_needs:
+            if need in features.service_vocabulary:
+                service[features.service_vocabulary[need]] = 1.0 / len(pmi_needs)
+
+        pmi_size = pmi_data.get('company_size') or ''
+        if pmi_size:
+            compatible_types = engine.size_compatibility.get(pmi_size, [])
+            size = np.array(
+                [1.0 if t in compatible_types else 0.3 for t in features.type_vocabulary] + [0.5],
+                dtype=np.float32
+            )
+        else:
+            size = np.full(len(features.type_vocabulary) + 1, 0.5, dtype=np.float32)
+
+        blocks = [
+            sector * weights.sector,
+            country * weights.country,
+            service * weights.service,
+            size * weights.size,
+        ]
+        if self.svd is not None:
+            counts = np.zeros((1, len(features.term_vocabulary)))
+            for term in engine.analyzer(pmi_data.get('business_objectives') or ''):
+                index = features.term_vocabulary.get(term)
+                if index is not None:
+                    counts[0, index] += 1
+            blocks.append(self._text_embedding(counts)[0] * weights.keyword)
+        return np.hstack(blocks).astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Indice a liste invertite (IVF) per la ricerca per prodotto scalare.
+
+    I vettori vengono raggruppati con k-means; una query esplora solo le
+    n_probe liste i cui centroidi hanno il prodotto scalare più alto.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: Optional[int] = None, n_probe: Optional[int] = None,
+                 iterations: int = 10, seed: int = 0):
+        self.vectors = vectors
+        n = len(vectors)
+        self.n_lists = max(1, min(n, n_lists or int(4 * np.sqrt(n))))
+        self.n_probe = min(self.n_lists, n_probe or max(1, self.n_lists // 4))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, 64 * self.n_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._assign(sample, centroids)
+            counts = np.bincount(assignment, minlength=self.n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        self.centroids = centroids
+
+        assignment = self._assign(vectors, centroids)
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=self.n_lists))))
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 8192) -> np.ndarray:
+        """Centroide più vicino (distanza euclidea) di ogni vettore, a blocchi."""
+        half_norms = 0.5 * (centroids * centroids).sum(axis=1)
+        return np.concatenate([
+            np.argmax(vectors[start:start + block] @ centroids.T - half_norms, axis=1)
+            for start in range(0, len(vectors), block)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        """Restituisce (ordinate) le righe dei k vettori con prodotto scalare più alto tra quelli esplorati."""
+        lists = np.argsort(-(self.centroids @ query), kind='stable')
+        rows, found = [], 0
+        for probe, lst in enumerate(lists):
+            if probe >= self.n_probe and found >= k:
+                break
+            members = self.order[self.offsets[lst]:self.offsets[lst + 1]]
+            rows.append(members)
+            found += len(members)
+        rows = np.concatenate(rows)
+        if len(rows) > k:
+            scores = self.vectors[rows] @ query
+            rows = rows[np.argpartition(-scores, k - 1)[:k]]
+        return np.sort(rows)
+
+
+class HNSWIndex:
+    """Indice HNSW di hnswlib (spazio prodotto scalare)."""
+
+    def __init__(self, vectors: np.ndarray, m: int = 16, ef_construction: int = 200, seed: int = 0):
+        self.index = hnswlib.Index(space='ip', dim=vectors.shape[1])
+        self.index.init_index(max_elements=len(vectors), ef_construction=ef_construction, M=m, random_seed=seed)
+        self.index.add_items(vectors, np.arange(len(vectors)))
+        self.size = len(vectors)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, self.size)
+        self.index.set_ef(max(2 * k, 64))
+        labels, _ = self.index.knn_query(query, k=k)
+        return np.sort(labels[0].astype(np.int64))
+
+
+class PartnerANNIndex:
+    """
+    Embedding dei partner di una PartnerFeatureMatrix e relativo indice ANN.
+
+    Args:
+        features: Partner codificati con encode_partners
+        engine: BusinessMatchingEngine di cui riprodurre pesi e compatibilità
+        backend: 'hnsw', 'ivf' oppure 'auto' (HNSW se hnswlib è installato)
+        text_dimensions: Dimensioni dell'embedding TF-IDF-SVD delle descrizioni
+    """
+
+    def __init__(self, features, engine, backend: str = 'auto', text_dimensions: int = 64, **index_options):
+        if backend == 'auto':
+            backend = 'hnsw' if hnswlib is not None else 'ivf'
+        if backend == 'hnsw' and hnswlib is None:
+            raise ImportError("hnswlib non installato: usare backend='ivf'")
+
+        self.backend = backend
+        self.embedder = PartnerEmbedder(features, engine, text_dimensions=text_dimensions)
+        vectors = self.embedder.embed_partners()
+        self.index = HNSWIndex(vectors, **index_options) if backend == 'hnsw' else IVFIndex(vectors, **index_options)
+
+    def search(self, pmi_data: Dict, k: int, weights=None) -> np.ndarray:
+        """
+        Restituisce le righe (ordinate) dei k partner candidati per una PMI.
+        """
+        return self.index.search(self.embedder.embed_query(pmi_data, weights), k)
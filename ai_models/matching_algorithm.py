@@ -5,11 +5,469 @@ Questo modulo implementa l'algoritmo di matching tra PMI italiane e Partner Loca
 basandosi su diversi fattori di compatibilità.
 """
 
+import heapq
+from functools import lru_cache
 import numpy as np
-from typing import List, Dict, Tuple
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import joblib
+from scipy import sparse
+from typing import List, Dict, NamedTuple, Tuple, Optional, TYPE_CHECKING
 import json
+import uuid
+
+# scikit-learn viene importato solo al primo utilizzo del vectorizer
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+# Soglia (0-100) oltre la quale un sotto-punteggio compare nella spiegazione
+EXPLANATION_THRESHOLD = 70
+
+# Sotto-punteggi citati nelle spiegazioni, nell'ordine dei bit della maschera
+EXPLANATION_SCORES = ('sector_score', 'country_score', 'service_score', 'size_score')
+
+# Frasi delle spiegazioni per lingua, nello stesso ordine di EXPLANATION_SCORES
+EXPLANATION_TEXTS = {
+    'it': {
+        'clauses': (
+            "Il partner ha esperienza nel settore {sector}",
+            "Il partner opera in {country}, uno dei vostri mercati target",
+            "Il partner offre i servizi di cui avete bisogno",
+            "La dimensione del partner è compatibile con la vostra azienda",
+        ),
+        'fallback': "Questo partner potrebbe essere interessante per la vostra espansione",
+        'default_sector': 'richiesto',
+    },
+    'en': {
+        'clauses': (
+            "The partner has experience in the {sector} sector",
+            "The partner operates in {country}, one of your target markets",
+            "The partner offers the services you need",
+            "The partner's size is compatible with your company",
+        ),
+        'fallback': "This partner could be a good fit for your expansion",
+        'default_sector': 'requested',
+    },
+}
+
+
+@lru_cache(maxsize=None)
+def _explanation_template(language: str, mask: int) -> str:
+    """
+    Compone (una volta per lingua e combinazione, 16 in tutto) il modello di
+    spiegazione per i sotto-punteggi indicati dai bit di mask.
+    """
+    texts = EXPLANATION_TEXTS[language]
+    clauses = [clause for bit, clause in enumerate(texts['clauses']) if mask & (1 << bit)]
+    return ". ".join(clauses or [texts['fallback']]) + "."
+
+
+def _build_vocabulary(values) -> Dict[str, int]:
+    """
+    Assegna un indice intero a ogni valore distinto, nell'ordine di apparizione.
+    """
+    vocabulary = {}
+    for value in values:
+        if value and value not in vocabulary:
+            vocabulary[value] = len(vocabulary)
+    return vocabulary
+
+
+def _object_array(values: List) -> np.ndarray:
+    """
+    Converte una lista in array di oggetti, indicizzabile con array di righe.
+    """
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _encode_bitset(rows: List[List[str]], vocabulary: Dict[str, int]) -> np.ndarray:
+    """
+    Codifica una lista di liste di etichette come matrice booleana (righe x vocabolario).
+    """
+    bits = np.zeros((len(rows), len(vocabulary)), dtype=bool)
+    for i, labels in enumerate(rows):
+        for label in labels:
+            index = vocabulary.get(label)
+            if index is not None:
+                bits[i, index] = True
+    return bits
+
+
+def _encode_terms(matrix, texts: List[str], analyzer):
+    """
+    Calcola i conteggi dei termini dei testi e le statistiche usate dal TF-IDF
+    a due documenti (vedi calculate_keyword_scores_batch), come attributi di matrix.
+    """
+    matrix.descriptions = _object_array(texts)
+    matrix.term_vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for text in matrix.descriptions:
+        term_counts = {}
+        for term in analyzer(text) if text else []:
+            term_counts[term] = term_counts.get(term, 0) + 1
+        for term, count in term_counts.items():
+            indices.append(matrix.term_vocabulary.setdefault(term, len(matrix.term_vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    matrix.term_counts = sparse.csr_matrix(
+        (np.array(counts, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr)),
+        shape=(len(texts), len(matrix.term_vocabulary))
+    )
+    matrix.term_presence = matrix.term_counts.copy()
+    matrix.term_presence.data[:] = 1.0
+    matrix.term_squares = matrix.term_counts.multiply(matrix.term_counts).tocsr()
+    matrix.term_total_squares = np.asarray(matrix.term_squares.sum(axis=1)).ravel()
+    matrix.term_distinct = np.diff(matrix.term_counts.indptr)
+    matrix.has_description = np.array([bool(t) for t in matrix.descriptions], dtype=bool)
+
+
+class PartnerFeatureMatrix:
+    """
+    Rappresentazione colonnare di una lista di partner per lo scoring vettoriale.
+
+    Settori e servizi sono codificati come matrici booleane (partner x vocabolario),
+    paese e tipo di partner come codici interi (-1 se mancanti). La matrice viene
+    costruita una sola volta e riutilizzata per tutte le PMI da confrontare.
+    """
+
+    def __init__(self, partners_data: List[Dict], analyzer):
+        self.partners = _object_array(partners_data)
+        self.size = len(partners_data)
+        self.ids = _object_array([p.get('id') for p in partners_data])
+
+        sectors = [p.get('sectors_expertise') or [] for p in partners_data]
+        services = [p.get('services_offered') or [] for p in partners_data]
+        countries = [p.get('country') or '' for p in partners_data]
+        partner_types = [p.get('partner_type') or '' for p in partners_data]
+
+        self.sector_vocabulary = _build_vocabulary(s for row in sectors for s in row)
+        self.service_vocabulary = _build_vocabulary(s for row in services for s in row)
+        self.country_vocabulary = _build_vocabulary(countries)
+        self.type_vocabulary = _build_vocabulary(partner_types)
+
+        self.sector_bits = _encode_bitset(sectors, self.sector_vocabulary)
+        self.service_bits = _encode_bitset(services, self.service_vocabulary)
+        self.country_codes = np.array(
+            [self.country_vocabulary.get(c, -1) for c in countries], dtype=np.int32
+        )
+        self.type_codes = np.array(
+            [self.type_vocabulary.get(t, -1) for t in partner_types], dtype=np.int32
+        )
+
+        # Conteggi dei termini delle descrizioni (stesso analyzer del TfidfVectorizer)
+        _encode_terms(self, [p.get('description') or '' for p in partners_data], analyzer)
+
+        # Righe corrispondenti nel PartnerKeywordIndex, come coppia (versione
+        # dell'indice, righe) aggiornata in un solo assegnamento (calcolate alla prima query)
+        self.keyword_rows = None
+
+        # Indice invertito per la generazione dei candidati (vedi build_candidate_index)
+        self.candidate_index = None
+
+        # Indice ANN sugli embedding densi (vedi build_ann_index)
+        self.ann_index = None
+
+    def take(self, rows: np.ndarray, include_terms: bool = True) -> 'PartnerFeatureMatrix':
+        """
+        Restituisce la sotto-matrice dei partner alle righe indicate.
+
+        I vocabolari sono condivisi con la matrice originale, quindi gli score
+        calcolati sul sottoinsieme coincidono con quelli sull'insieme completo.
+        Con include_terms=False i conteggi dei termini non vengono copiati (non
+        servono quando gli score testuali arrivano dal PartnerKeywordIndex).
+        """
+        subset = object.__new__(PartnerFeatureMatrix)
+        subset.partners = self.partners[rows]
+        subset.size = len(rows)
+        subset.ids = self.ids[rows]
+        subset.sector_vocabulary = self.sector_vocabulary
+        subset.service_vocabulary = self.service_vocabulary
+        subset.country_vocabulary = self.country_vocabulary
+        subset.type_vocabulary = self.type_vocabulary
+        subset.sector_bits = self.sector_bits[rows]
+        subset.service_bits = self.service_bits[rows]
+        subset.country_codes = self.country_codes[rows]
+        subset.type_codes = self.type_codes[rows]
+        subset.descriptions = self.descriptions[rows]
+        subset.term_vocabulary = self.term_vocabulary
+        subset.term_counts = self.term_counts[rows] if include_terms else None
+        subset.term_presence = self.term_presence[rows] if include_terms else None
+        subset.term_squares = self.term_squares[rows] if include_terms else None
+        subset.term_total_squares = self.term_total_squares[rows] if include_terms else None
+        subset.term_distinct = self.term_distinct[rows] if include_terms else None
+        subset.has_description = self.has_description[rows]
+        keyword_rows = self.keyword_rows
+        subset.keyword_rows = None if keyword_rows is None else (keyword_rows[0], keyword_rows[1][rows])
+        subset.candidate_index = None
+        subset.ann_index = None
+        return subset
+
+
+class PMIFeatureMatrix:
+    """
+    Rappresentazione colonnare di una lista di PMI per il matching inverso
+    (dal partner verso le PMI).
+
+    Settore e dimensione sono codici interi (-1 se mancanti), mercati target
+    ed esigenze matrici (PMI x vocabolario); gli obiettivi di business hanno
+    gli stessi conteggi dei termini di PartnerFeatureMatrix, quindi lo score
+    testuale usa lo stesso scorer a due documenti.
+    """
+
+    def __init__(self, pmis_data: List[Dict], analyzer):
+        self.pmis = _object_array(pmis_data)
+        self.size = len(pmis_data)
+        self.ids = _object_array([p.get('id') for p in pmis_data])
+
+        sectors = [p.get('sector') or '' for p in pmis_data]
+        sizes = [p.get('company_size') or '' for p in pmis_data]
+        targets = [p.get('target_markets') or [] for p in pmis_data]
+        needs = [p.get('business_needs') or [] for p in pmis_data]
+
+        self.sector_vocabulary = _build_vocabulary(sectors)
+        self.size_vocabulary = _build_vocabulary(sizes)
+        self.target_vocabulary = _build_vocabulary(t for row in targets for t in row)
+        self.need_vocabulary = _build_vocabulary(n for row in needs for n in row)
+
+        self.sector_codes = np.array([self.sector_vocabulary.get(s, -1) for s in sectors], dtype=np.int32)
+        self.size_codes = np.array([self.size_vocabulary.get(s, -1) for s in sizes], dtype=np.int32)
+        self.target_bits = _encode_bitset(targets, self.target_vocabulary)
+
+        # Le esigenze ripetute contano più volte, come in calculate_service_score
+        self.need_counts = np.zeros((self.size, len(self.need_vocabulary)), dtype=np.float64)
+        for i, row in enumerate(needs):
+            for need in row:
+                self.need_counts[i, self.need_vocabulary[need]] += 1
+        self.need_totals = np.array([len(row) for row in needs], dtype=np.float64)
+
+        _encode_terms(self, [p.get('business_objectives') or '' for p in pmis_data], analyzer)
+
+        # Obiettivi proiettati nel PartnerKeywordIndex, come coppia (fit_id, matrice):
+        # gli idf cambiano solo con un nuovo fit (calcolati alla prima query)
+        self.keyword_vectors = None
+
+
+_NO_POSTINGS = np.empty(0, dtype=np.int64)
+
+
+class PartnerCandidateIndex:
+    """
+    Indice invertito dalle caratteristiche categoriche alle righe dei partner.
+
+    Per ogni settore, settore compatibile, paese, paese limitrofo e servizio
+    mantiene la lista ordinata delle righe di PartnerFeatureMatrix che possono
+    ottenere un punteggio non nullo su quella componente. Le liste per settori
+    compatibili e paesi limitrofi derivano dalle tabelle sector_compatibility e
+    neighboring_countries del BusinessMatchingEngine.
+    """
+
+    def __init__(self, features: PartnerFeatureMatrix, sector_compatibility: Dict, neighboring_countries: Dict):
+        self.sector = {
+            sector: np.flatnonzero(features.sector_bits[:, column])
+            for sector, column in features.sector_vocabulary.items()
+        }
+        self.country = {
+            country: np.flatnonzero(features.country_codes == code)
+            for country, code in features.country_vocabulary.items()
+        }
+        self.service = {
+            service: np.flatnonzero(features.service_bits[:, column])
+            for service, column in features.service_vocabulary.items()
+        }
+
+        # Settore della PMI -> partner con almeno un settore compatibile
+        self.compatible_sector = {
+            pmi_sector: self._union(self.sector.get(s, _NO_POSTINGS) for s in compatible)
+            for pmi_sector, compatible in sector_compatibility.items()
+        }
+
+        # Paese target della PMI -> partner in un paese che lo ha come limitrofo
+        targets = {t for neighbors in neighboring_countries.values() for t in neighbors}
+        self.neighboring_country = {
+            target: self._union(
+                self.country.get(country, _NO_POSTINGS)
+                for country, neighbors in neighboring_countries.items()
+                if target in neighbors
+            )
+            for target in targets
+        }
+
+    @staticmethod
+    def _union(postings) -> np.ndarray:
+        postings = [p for p in postings if p.size]
+        if not postings:
+            return _NO_POSTINGS
+        return np.unique(np.concatenate(postings))
+
+
+class PartnerKeywordIndex:
+    """
+    Indice TF-IDF delle descrizioni dei partner costruito sull'intero corpus.
+
+    Il vocabolario e gli idf vengono stimati una sola volta con fit(); gli
+    aggiornamenti successivi ricalcolano solo la riga del partner modificato
+    usando il vocabolario esistente. Le righe sono normalizzate L2, quindi la
+    similarità coseno con una PMI è un singolo prodotto matrice-vettore sparso.
+    """
+
+    def __init__(self, max_features: int = 50000):
+        self.max_features = max_features
+        self.vectorizer: Optional['TfidfVectorizer'] = None
+        self.matrix: Optional[sparse.csr_matrix] = None
+        self.row_by_id: Dict[int, int] = {}
+        # Identifica il fit: le versioni di due indici addestrati separatamente
+        # non sono confrontabili
+        self.fit_id: Optional[str] = None
+        self.version = 0
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.vectorizer is not None
+
+    def fit(self, partner_ids: List[int], descriptions: List[str]) -> 'PartnerKeywordIndex':
+        """
+        Costruisce vocabolario, idf e matrice TF-IDF su tutte le descrizioni.
+
+        Args:
+            partner_ids: ID dei partner, nello stesso ordine delle descrizioni
+            descriptions: Descrizioni dei partner
+
+        Returns:
+            L'indice stesso
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(max_features=self.max_features, stop_words='english')
+        try:
+            matrix = vectorizer.fit_transform([d or '' for d in descriptions])
+        except ValueError:
+            # Vocabolario vuoto: nessuna descrizione utilizzabile
+            self.vectorizer = None
+            self.matrix = None
+            self.row_by_id = {}
+            return self
+
+        self.vectorizer = vectorizer
+        self.matrix = matrix.tocsr()
+        self.row_by_id = {partner_id: row for row, partner_id in enumerate(partner_ids)}
+        self.fit_id = uuid.uuid4().hex
+        self.version += 1
+        return self
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """Proietta dei testi nello spazio TF-IDF dell'indice."""
+        return self.vectorizer.transform(texts)
+
+    def update(self, partner_id: int, description: str):
+        """
+        Aggiorna (o aggiunge) la riga di un partner senza ricalcolare il vocabolario.
+
+        Args:
+            partner_id: ID del partner
+            description: Nuova descrizione
+        """
+        self.update_many({partner_id: description})
+
+    def update_many(self, descriptions: Dict[int, str]):
+        """
+        Aggiorna (o aggiunge) le righe di più partner ricostruendo la matrice una sola volta.
+
+        Args:
+            descriptions: Nuova descrizione per ID partner
+        """
+        if not descriptions:
+            return
+        partner_ids = list(descriptions)
+        rows = self.transform([descriptions[pid] or '' for pid in partner_ids])
+        size = self.matrix.shape[0]
+        # Riga della matrice [matrix; rows] da cui prendere ciascuna riga finale
+        order = np.arange(size, dtype=np.int64)
+        appended = []
+        for offset, partner_id in enumerate(partner_ids):
+            index = self.row_by_id.get(partner_id)
+            if index is None:
+                self.row_by_id[partner_id] = size + len(appended)
+                appended.append(size + offset)
+            else:
+                order[index] = size + offset
+        if appended:
+            order = np.concatenate([order, np.array(appended, dtype=np.int64)])
+        self.matrix = sparse.vstack([self.matrix, rows], format='csr')[order]
+        self.version += 1
+
+    def remove(self, partner_id: int):
+        """Azzera la riga di un partner mantenendo l'allineamento delle righe."""
+        if partner_id in self.row_by_id:
+            self.update(partner_id, '')
+
+    def rows_for(self, partner_ids: List[int]) -> np.ndarray:
+        """Restituisce le righe dell'indice per gli ID dati (-1 se assenti)."""
+        return np.array([self.row_by_id.get(pid, -1) for pid in partner_ids], dtype=np.int64)
+
+    def similarities(self, text: str) -> np.ndarray:
+        """
+        Calcola la similarità coseno tra un testo e tutte le righe dell'indice.
+
+        Args:
+            text: Testo della query (es. obiettivi della PMI)
+
+        Returns:
+            Array denso con una similarità per riga
+        """
+        query = self.transform([text])
+        return (self.matrix @ query.T).toarray().ravel()
+
+    def save(self, path: str):
+        """Salva l'indice su disco."""
+        joblib.dump({
+            'max_features': self.max_features,
+            'vectorizer': self.vectorizer,
+            'matrix': self.matrix,
+            'row_by_id': self.row_by_id,
+            'fit_id': self.fit_id,
+            'version': self.version,
+        }, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PartnerKeywordIndex':
+        """Carica un indice salvato con save()."""
+        state = joblib.load(path)
+        index = cls(max_features=state['max_features'])
+        index.vectorizer = state['vectorizer']
+        index.matrix = state['matrix']
+        index.row_by_id = state['row_by_id']
+        index.fit_id = state.get('fit_id')
+        index.version = state['version']
+        return index
+
+
+class MatchWeights(NamedTuple):
+    """
+    Pesi dei sotto-punteggi (somma 1) e versione dell'artefatto da cui provengono.
+
+    L'engine è condiviso tra le richieste: set_weights sostituisce l'intera
+    tupla con un solo assegnamento e ogni scoring la legge una volta, così un
+    calcolo non mescola pesi di due versioni.
+    """
+    sector: float = 0.40
+    country: float = 0.25
+    service: float = 0.20
+    size: float = 0.10
+    keyword: float = 0.05
+    # Versione dei pesi appresi (None = pesi predefiniti)
+    version: Optional[int] = None
+
+    def total(self, sector, country, service, size, keyword):
+        """Score pesato dei sotto-punteggi (scalari o array)."""
+        return (
+            sector * self.sector +
+            country * self.country +
+            service * self.service +
+            size * self.size +
+            keyword * self.keyword
+        )
 
 
 class BusinessMatchingEngine:
@@ -25,11 +483,8 @@ class BusinessMatchingEngine:
     """
     
     def __init__(self):
-        self.sector_weight = 0.40
-        self.country_weight = 0.25
-        self.service_weight = 0.20
-        self.size_weight = 0.10
-        self.keyword_weight = 0.05
+        # Pesi in uso, sostituiti in blocco da set_weights (vedi MatchWeights)
+        self.weights = MatchWeights()
         
         # Mapping settori compatibili
         self.sector_compatibility = {
@@ -43,8 +498,78 @@ class BusinessMatchingEngine:
             'healthcare': ['medical_devices', 'pharmaceuticals', 'distribution'],
         }
         
-        # Vectorizer per analisi testuale
-        self.vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
+        # Paesi limitrofi (bonus per vicinanza geografica)
+        self.neighboring_countries = {
+            'Kenya': ['Tanzania', 'Uganda'],
+            'Tanzania': ['Kenya', 'Uganda'],
+            'Ethiopia': ['Kenya', 'Sudan'],
+        }
+        
+        # Mapping dimensioni compatibili
+        self.size_compatibility = {
+            'micro': ['small_distributor', 'consultant', 'agent'],
+            'small': ['small_distributor', 'medium_distributor', 'consultant'],
+            'medium': ['medium_distributor', 'large_distributor', 'logistics_company'],
+        }
+        
+        # Vectorizer per analisi testuale (creato al primo utilizzo, vedi vectorizer)
+        self._vectorizer = None
+        self._analyzer = None
+        
+        # Indice TF-IDF sul corpus dei partner (opzionale, vedi fit_keyword_index)
+        self.keyword_index: Optional[PartnerKeywordIndex] = None
+        
+        # Score minimo (0-100) per i risultati di find_best_matches_batch: i partner
+        # che non possono raggiungerlo vengono scartati prima dello scoring
+        self.min_match_score = 0.0
+        
+        # Modalità a vettori densi: se impostato, find_best_matches_batch riordina
+        # con lo scorer esatto solo i candidati restituiti dall'indice ANN
+        self.ann_candidates: Optional[int] = None
+        self.ann_backend = 'auto'
+
+    def set_weights(self, weights: Dict[str, float], version: Optional[int] = None):
+        """
+        Imposta i pesi dei sotto-punteggi (es. quelli appresi da weight_training).
+
+        Args:
+            weights: Pesi per sector, country, service, size e keyword (normalizzati a somma 1)
+            version: Versione dell'artefatto da cui provengono i pesi
+        """
+        names = ('sector', 'country', 'service', 'size', 'keyword')
+        values = [float(weights[name]) for name in names]
+        if min(values) < 0 or sum(values) <= 0:
+            raise ValueError(f"Pesi non validi: {weights}")
+        total = sum(values)
+        self.weights = MatchWeights(*(value / total for value in values), version=version)
+
+    @property
+    def vectorizer(self) -> 'TfidfVectorizer':
+        """
+        Configurazione del TF-IDF testuale; scikit-learn viene importato solo qui.
+
+        L'engine è condiviso tra le richieste: il vectorizer non viene mai
+        addestrato direttamente (vedi calculate_keyword_score).
+        """
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
+        return self._vectorizer
+
+    @property
+    def analyzer(self):
+        """Tokenizzatore del vectorizer (senza stato, riusabile tra i thread)."""
+        if self._analyzer is None:
+            self.warm_up()
+        return self._analyzer
+
+    def warm_up(self):
+        """
+        Importa scikit-learn e costruisce il tokenizzatore, altrimenti creati
+        al primo scoring testuale.
+        """
+        if self._analyzer is None:
+            self._analyzer = self.vectorizer.build_analyzer()
     
     def calculate_sector_score(self, pmi_sector: str, partner_sectors: List[str]) -> float:
         """
@@ -91,13 +616,7 @@ class BusinessMatchingEngine:
             return 1.0
         
         # Paesi limitrofi (bonus per vicinanza geografica)
-        neighboring_countries = {
-            'Kenya': ['Tanzania', 'Uganda'],
-            'Tanzania': ['Kenya', 'Uganda'],
-            'Ethiopia': ['Kenya', 'Sudan'],
-        }
-        
-        neighbors = neighboring_countries.get(partner_country, [])
+        neighbors = self.neighboring_countries.get(partner_country, [])
         for target in pmi_targets:
             if target in neighbors:
                 return 0.5
@@ -139,23 +658,20 @@ class BusinessMatchingEngine:
         Returns:
             Score da 0 a 1
         """
-        # Mapping dimensioni compatibili
-        size_compatibility = {
-            'micro': ['small_distributor', 'consultant', 'agent'],
-            'small': ['small_distributor', 'medium_distributor', 'consultant'],
-            'medium': ['medium_distributor', 'large_distributor', 'logistics_company'],
-        }
-        
         if not pmi_size or not partner_type:
             return 0.5  # Score neutro se mancano dati
         
-        compatible_types = size_compatibility.get(pmi_size, [])
+        compatible_types = self.size_compatibility.get(pmi_size, [])
         return 1.0 if partner_type in compatible_types else 0.3
     
     def calculate_keyword_score(self, pmi_objectives: str, partner_description: str) -> float:
         """
         Calcola il punteggio di similarità testuale usando TF-IDF.
         
+        Se è disponibile un PartnerKeywordIndex i due testi vengono proiettati nel
+        suo spazio (idf stimati sull'intero corpus dei partner), altrimenti il
+        vectorizer viene addestrato sulla sola coppia di documenti.
+        
         Args:
             pmi_objectives: Obiettivi di business della PMI
             partner_description: Descrizione del partner
@@ -166,9 +682,17 @@ class BusinessMatchingEngine:
         if not pmi_objectives or not partner_description:
             return 0.0
         
+        keyword_index = self.keyword_index
+        if keyword_index is not None and keyword_index.is_fitted:
+            vectors = keyword_index.transform([pmi_objectives, partner_description])
+            return float((vectors[1] @ vectors[0].T).toarray()[0, 0])
+        
+        from sklearn.base import clone
+        from sklearn.metrics.pairwise import cosine_similarity
+        
         try:
-            # Crea matrice TF-IDF
-            tfidf_matrix = self.vectorizer.fit_transform([pmi_objectives, partner_description])
+            # Crea matrice TF-IDF (su una copia: il vectorizer è condiviso tra i thread)
+            tfidf_matrix = clone(self.vectorizer).fit_transform([pmi_objectives, partner_description])
             
             # Calcola similarità coseno
             similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
@@ -177,16 +701,16 @@ class BusinessMatchingEngine:
         except:
             return 0.0
     
-    def calculate_match_score(self, pmi_data: Dict, partner_data: Dict) -> Tuple[float, Dict]:
+    def _calculate_scores(self, pmi_data: Dict, partner_data: Dict,
+                          weights: Optional[MatchWeights] = None) -> Tuple[float, ...]:
         """
-        Calcola il punteggio totale di matching tra una PMI e un Partner.
+        Calcola i sotto-punteggi (0-1) e lo score totale pesato di una coppia PMI-Partner.
         
         Args:
-            pmi_data: Dizionario con i dati della PMI
-            partner_data: Dizionario con i dati del Partner
+            weights: Pesi da usare (default: quelli in uso nell'engine)
         
         Returns:
-            Tupla (score totale, breakdown dei punteggi)
+            Tupla (sector, country, service, size, keyword, total)
         """
         # Calcola i punteggi individuali
         sector_score = self.calculate_sector_score(
@@ -216,16 +740,19 @@ class BusinessMatchingEngine:
         )
         
         # Calcola score totale pesato
-        total_score = (
-            sector_score * self.sector_weight +
-            country_score * self.country_weight +
-            service_score * self.service_weight +
-            size_score * self.size_weight +
-            keyword_score * self.keyword_weight
-        )
+        if weights is None:
+            weights = self.weights
+        total_score = weights.total(sector_score, country_score, service_score, size_score, keyword_score)
         
-        # Crea breakdown dettagliato
-        breakdown = {
+        return sector_score, country_score, service_score, size_score, keyword_score, total_score
+    
+    @staticmethod
+    def _build_breakdown(scores: Tuple[float, ...]) -> Dict:
+        """
+        Crea il breakdown dettagliato (0-100) dalla tupla restituita da _calculate_scores.
+        """
+        sector_score, country_score, service_score, size_score, keyword_score, total_score = scores
+        return {
             'sector_score': round(sector_score * 100, 2),
             'country_score': round(country_score * 100, 2),
             'service_score': round(service_score * 100, 2),
@@ -233,86 +760,651 @@ class BusinessMatchingEngine:
             'keyword_score': round(keyword_score * 100, 2),
             'total_score': round(total_score * 100, 2)
         }
+    
+    def calculate_match_score(self, pmi_data: Dict, partner_data: Dict,
+                              weights: Optional[MatchWeights] = None) -> Tuple[float, Dict]:
+        """
+        Calcola il punteggio totale di matching tra una PMI e un Partner.
         
-        return total_score, breakdown
+        Args:
+            pmi_data: Dizionario con i dati della PMI
+            partner_data: Dizionario con i dati del Partner
+            weights: Pesi da usare (default: quelli in uso nell'engine)
+        
+        Returns:
+            Tupla (score totale, breakdown dei punteggi)
+        """
+        scores = self._calculate_scores(pmi_data, partner_data, weights)
+        return scores[-1], self._build_breakdown(scores)
     
-    def generate_match_explanation(self, breakdown: Dict, pmi_data: Dict, partner_data: Dict) -> str:
+    def generate_match_explanation(self, breakdown: Dict, pmi_data: Dict, partner_data: Dict,
+                                   language: str = 'it') -> str:
         """
         Genera una spiegazione testuale del match.
         
+        Il testo viene da un modello precompilato scelto in base ai sotto-punteggi
+        che superano EXPLANATION_THRESHOLD; restano da inserire solo settore e paese.
+        
         Args:
             breakdown: Breakdown dei punteggi
             pmi_data: Dati della PMI
             partner_data: Dati del Partner
+            language: Lingua della spiegazione ('it' o 'en')
         
         Returns:
             Testo esplicativo del match
         """
-        explanations = []
-        
-        # Settore
-        if breakdown['sector_score'] >= 70:
-            explanations.append(
-                f"Il partner ha esperienza nel settore {pmi_data.get('sector', 'richiesto')}"
-            )
-        
-        # Paese
-        if breakdown['country_score'] >= 70:
-            explanations.append(
-                f"Il partner opera in {partner_data.get('country', '')}, uno dei vostri mercati target"
-            )
+        if language not in EXPLANATION_TEXTS:
+            raise ValueError(f"Lingua non supportata: {language}")
         
-        # Servizi
-        if breakdown['service_score'] >= 70:
-            explanations.append(
-                "Il partner offre i servizi di cui avete bisogno"
-            )
-        
-        # Dimensione
-        if breakdown['size_score'] >= 70:
-            explanations.append(
-                "La dimensione del partner è compatibile con la vostra azienda"
-            )
+        mask = 0
+        for bit, key in enumerate(EXPLANATION_SCORES):
+            if breakdown[key] >= EXPLANATION_THRESHOLD:
+                mask |= 1 << bit
         
-        if not explanations:
-            explanations.append("Questo partner potrebbe essere interessante per la vostra espansione")
+        return _explanation_template(language, mask).format(
+            sector=pmi_data.get('sector', EXPLANATION_TEXTS[language]['default_sector']),
+            country=partner_data.get('country', '')
+        )
+    
+    def _build_match(self, pmi_data: Dict, partner: Dict, breakdown: Dict, explain: bool = True) -> Dict:
+        """
+        Crea il dizionario di un match per un partner selezionato.
         
-        return ". ".join(explanations) + "."
+        Con explain=False la spiegazione non viene generata (None): chi mostra
+        il match la crea con generate_match_explanation, nella lingua richiesta.
+        """
+        return {
+            'partner_id': partner.get('id'),
+            'partner_name': partner.get('company_name'),
+            'match_score': breakdown['total_score'],
+            'breakdown': breakdown,
+            'explanation': self.generate_match_explanation(breakdown, pmi_data, partner) if explain else None,
+            'partner_data': partner
+        }
     
-    def find_best_matches(self, pmi_data: Dict, partners_data: List[Dict], top_n: int = 10) -> List[Dict]:
+    def find_best_matches(self, pmi_data: Dict, partners_data: List[Dict], top_n: int = 10,
+                          explain: bool = True) -> List[Dict]:
         """
         Trova i migliori match per una PMI tra una lista di partner.
         
+        I partner vengono valutati in streaming mantenendo solo i migliori top_n
+        in un heap limitato (O(N log K)); breakdown e spiegazioni vengono creati
+        solo per i partner restituiti.
+        
         Args:
             pmi_data: Dati della PMI
             partners_data: Lista di dizionari con dati dei partner
             top_n: Numero di match da restituire
+            explain: Se False i match non contengono la spiegazione
         
         Returns:
             Lista di match ordinati per score decrescente
         """
-        matches = []
+        if top_n <= 0:
+            return []
+        weights = self.weights
         
-        for partner in partners_data:
-            score, breakdown = self.calculate_match_score(pmi_data, partner)
-            
-            # Genera spiegazione
-            explanation = self.generate_match_explanation(breakdown, pmi_data, partner)
-            
+        def scored_partners():
+            for partner in partners_data:
+                scores = self._calculate_scores(pmi_data, partner, weights)
+                yield round(scores[-1] * 100, 2), partner, scores
+        
+        # nlargest equivale a un ordinamento stabile decrescente troncato a top_n
+        best = heapq.nlargest(top_n, scored_partners(), key=lambda item: item[0])
+        
+        return [
+            self._build_match(pmi_data, partner, self._build_breakdown(scores), explain)
+            for _, partner, scores in best
+        ]
+
+    def encode_partners(self, partners_data: List[Dict]) -> PartnerFeatureMatrix:
+        """
+        Codifica una lista di partner per lo scoring vettoriale.
+
+        Args:
+            partners_data: Lista di dizionari con dati dei partner
+
+        Returns:
+            PartnerFeatureMatrix riutilizzabile per più PMI
+        """
+        return PartnerFeatureMatrix(partners_data, self.analyzer)
+
+    def encode_pmis(self, pmis_data: List[Dict]) -> PMIFeatureMatrix:
+        """
+        Codifica una lista di PMI per il matching inverso (vedi find_best_pmis_batch).
+
+        Args:
+            pmis_data: Lista di dizionari con dati delle PMI
+
+        Returns:
+            PMIFeatureMatrix riutilizzabile per più partner
+        """
+        return PMIFeatureMatrix(pmis_data, self.analyzer)
+
+    def fit_keyword_index(self, partners_data: List[Dict]) -> PartnerKeywordIndex:
+        """
+        Costruisce il PartnerKeywordIndex sulle descrizioni dei partner e lo attiva.
+
+        Args:
+            partners_data: Lista di dizionari con dati dei partner
+
+        Returns:
+            L'indice costruito
+        """
+        self.keyword_index = PartnerKeywordIndex().fit(
+            [p.get('id') for p in partners_data],
+            [p.get('description') or '' for p in partners_data]
+        )
+        return self.keyword_index
+
+    @staticmethod
+    def _keyword_rows(features: PartnerFeatureMatrix, index: PartnerKeywordIndex) -> np.ndarray:
+        """
+        Righe del PartnerKeywordIndex per i partner della matrice, ricalcolate
+        solo quando cambia l'indice (nuovo fit o nuova versione).
+        """
+        version = (index.fit_id, index.version)
+        cached = features.keyword_rows
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        rows = index.rows_for(features.ids)
+        features.keyword_rows = (version, rows)
+        return rows
+
+    def _keyword_scores_from_index(self, pmi_objectives: str, features: PartnerFeatureMatrix,
+                                   index: PartnerKeywordIndex) -> np.ndarray:
+        """
+        Score testuali dal PartnerKeywordIndex: una trasformazione sparsa della
+        query e un prodotto matrice-vettore su tutti i partner indicizzati.
+        """
+        rows = self._keyword_rows(features, index)
+
+        scores = np.zeros(features.size)
+        indexed = np.flatnonzero(rows >= 0)
+        if indexed.size > index.matrix.shape[0] // 2:
+            scores[indexed] = index.similarities(pmi_objectives)[rows[indexed]]
+        elif indexed.size:
+            # Sottoinsieme di candidati: prodotto solo sulle righe interessate
+            query = index.transform([pmi_objectives])
+            scores[indexed] = (index.matrix[rows[indexed]] @ query.T).toarray().ravel()
+
+        # Partner non ancora indicizzati: proiezione al volo delle loro descrizioni
+        missing = np.flatnonzero((rows < 0) & features.has_description)
+        if missing.size:
+            query = index.transform([pmi_objectives])
+            descriptions = index.transform(list(features.descriptions[missing]))
+            scores[missing] = (descriptions @ query.T).toarray().ravel()
+
+        scores[~features.has_description] = 0.0
+        return scores
+
+    def calculate_keyword_scores_batch(self, pmi_objectives: str, features: PartnerFeatureMatrix) -> np.ndarray:
+        """
+        Calcola il punteggio testuale per tutti i partner in un'unica passata.
+
+        Con un PartnerKeywordIndex attivo usa gli idf del corpus. Altrimenti
+        riproduce il TF-IDF a due documenti di calculate_keyword_score: i termini
+        comuni hanno idf 1, quelli presenti in un solo documento idf ln(3/2) + 1,
+        quindi la similarità coseno si ottiene da prodotti matrice-vettore sparsi
+        sui conteggi precalcolati. Le coppie il cui vocabolario supera
+        max_features ricadono sul calcolo scalare.
+
+        Args:
+            pmi_objectives: Obiettivi di business della PMI
+            features: Partner codificati con encode_partners
+
+        Returns:
+            Array di score da 0 a 1, uno per partner
+        """
+        scores = np.zeros(features.size)
+        if not pmi_objectives or features.size == 0:
+            return scores
+
+        keyword_index = self.keyword_index
+        if keyword_index is not None and keyword_index.is_fitted:
+            return self._keyword_scores_from_index(pmi_objectives, features, keyword_index)
+
+        return self._pair_keyword_scores(pmi_objectives, features)
+
+    def _pair_keyword_scores(self, pmi_objectives: str, features) -> np.ndarray:
+        """
+        TF-IDF a due documenti tra un testo e quelli di una matrice di feature
+        (PartnerFeatureMatrix o PMIFeatureMatrix: la similarità è simmetrica).
+        """
+        scores = np.zeros(features.size)
+        pmi_counts = {}
+        for term in self.analyzer(pmi_objectives):
+            pmi_counts[term] = pmi_counts.get(term, 0) + 1
+        if not pmi_counts:
+            return scores
+
+        query = np.zeros(len(features.term_vocabulary))
+        for term, count in pmi_counts.items():
+            index = features.term_vocabulary.get(term)
+            if index is not None:
+                query[index] = count
+        query_presence = (query > 0).astype(np.float64)
+
+        dot = features.term_counts @ query
+        shared_partner_squares = features.term_squares @ query_presence
+        shared_pmi_squares = features.term_presence @ (query * query)
+        shared_terms = features.term_presence @ query_presence
+
+        unique_idf_squared = (np.log(1.5) + 1.0) ** 2
+        pmi_total_squares = float(sum(c * c for c in pmi_counts.values()))
+        pmi_norm_squared = shared_pmi_squares + unique_idf_squared * (pmi_total_squares - shared_pmi_squares)
+        partner_norm_squared = shared_partner_squares + unique_idf_squared * (
+            features.term_total_squares - shared_partner_squares
+        )
+        denominator = np.sqrt(pmi_norm_squared * partner_norm_squared)
+
+        valid = features.has_description & (denominator > 0)
+        scores[valid] = dot[valid] / denominator[valid]
+
+        max_features = self.vectorizer.max_features
+        if max_features is not None:
+            vocabulary_size = len(pmi_counts) + features.term_distinct - shared_terms
+            for i in np.flatnonzero(features.has_description & (vocabulary_size > max_features)):
+                scores[i] = self.calculate_keyword_score(pmi_objectives, features.descriptions[i])
+
+        return scores
+
+    def calculate_match_scores_batch(self, pmi_data: Dict, features: PartnerFeatureMatrix,
+                                     weights: Optional[MatchWeights] = None) -> Dict[str, np.ndarray]:
+        """
+        Calcola tutti i sotto-punteggi e lo score pesato per ogni partner in modo vettoriale.
+
+        I valori coincidono con quelli di calculate_match_score applicato a ciascun partner.
+
+        Args:
+            pmi_data: Dizionario con i dati della PMI
+            features: Partner codificati con encode_partners
+            weights: Pesi da usare (default: quelli in uso nell'engine)
+
+        Returns:
+            Dizionario di array (0-1) con chiavi sector, country, service, size, keyword, total
+        """
+        n = features.size
+
+        # Settore: 1.0 match esatto, 0.7 settore compatibile
+        sector_scores = np.zeros(n)
+        pmi_sector = pmi_data.get('sector') or ''
+        if pmi_sector:
+            compatible = [
+                features.sector_vocabulary[s]
+                for s in self.sector_compatibility.get(pmi_sector, [])
+                if s in features.sector_vocabulary
+            ]
+            if compatible:
+                sector_scores[features.sector_bits[:, compatible].any(axis=1)] = 0.7
+            exact = features.sector_vocabulary.get(pmi_sector)
+            if exact is not None:
+                sector_scores[features.sector_bits[:, exact]] = 1.0
+
+        # Paese: lookup table sul vocabolario dei paesi (ultimo slot = paese mancante)
+        country_lookup = np.zeros(len(features.country_vocabulary) + 1)
+        pmi_targets = pmi_data.get('target_markets') or []
+        if pmi_targets:
+            for country, index in features.country_vocabulary.items():
+                if country in pmi_targets:
+                    country_lookup[index] = 1.0
+                elif any(t in self.neighboring_countries.get(country, []) for t in pmi_targets):
+                    country_lookup[index] = 0.5
+        country_scores = country_lookup[features.country_codes]
+
+        # Servizi: quota delle esigenze coperte
+        service_scores = np.zeros(n)
+        pmi_needs = pmi_data.get('business_needs') or []
+        if pmi_needs:
+            needed = [features.service_vocabulary[s] for s in pmi_needs if s in features.service_vocabulary]
+            if needed:
+                matches = features.service_bits[:, needed].sum(axis=1)
+                service_scores = np.minimum(matches / len(pmi_needs), 1.0)
+
+        # Dimensione: lookup table sul vocabolario dei tipi (ultimo slot = tipo mancante)
+        pmi_size = pmi_data.get('company_size') or ''
+        if pmi_size:
+            compatible_types = self.size_compatibility.get(pmi_size, [])
+            size_lookup = np.array(
+                [1.0 if t in compatible_types else 0.3 for t in features.type_vocabulary] + [0.5]
+            )
+            size_scores = size_lookup[features.type_codes]
+        else:
+            size_scores = np.full(n, 0.5)
+
+        keyword_scores = self.calculate_keyword_scores_batch(
+            pmi_data.get('business_objectives') or '', features
+        )
+
+        if weights is None:
+            weights = self.weights
+        total_scores = weights.total(sector_scores, country_scores, service_scores, size_scores, keyword_scores)
+
+        return {
+            'sector': sector_scores,
+            'country': country_scores,
+            'service': service_scores,
+            'size': size_scores,
+            'keyword': keyword_scores,
+            'total': total_scores,
+        }
+
+    def _breakdown_at(self, scores: Dict[str, np.ndarray], index: int) -> Dict:
+        """
+        Estrae il breakdown di un singolo partner dagli array dello scoring vettoriale.
+        """
+        return self._build_breakdown(tuple(
+            float(scores[key][index])
+            for key in ('sector', 'country', 'service', 'size', 'keyword', 'total')
+        ))
+
+    @staticmethod
+    def _top_k_indices(values: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indici dei k valori più alti in ordine decrescente, in O(N + K log K).
+
+        A parità di valore vince l'indice più basso, come in un ordinamento stabile.
+        """
+        n = values.size
+        if k <= 0 or n == 0:
+            return np.empty(0, dtype=np.int64)
+        if k >= n:
+            return np.argsort(-values, kind='stable')
+
+        kth_value = np.partition(values, n - k)[n - k]
+        above = np.flatnonzero(values > kth_value)
+        ties = np.flatnonzero(values == kth_value)[:k - above.size]
+        candidates = np.concatenate([above, ties])
+        return candidates[np.argsort(-values[candidates], kind='stable')]
+
+    def build_candidate_index(self, features: PartnerFeatureMatrix) -> PartnerCandidateIndex:
+        """
+        Costruisce (una volta per matrice) l'indice invertito per la generazione dei candidati.
+        """
+        if features.candidate_index is None:
+            features.candidate_index = PartnerCandidateIndex(
+                features, self.sector_compatibility, self.neighboring_countries
+            )
+        return features.candidate_index
+
+    def build_ann_index(self, features: PartnerFeatureMatrix):
+        """
+        Costruisce (una volta per matrice) l'indice ANN sugli embedding densi dei partner.
+        """
+        if features.ann_index is None:
+            from ann_index import PartnerANNIndex
+            features.ann_index = PartnerANNIndex(features, self, backend=self.ann_backend)
+        return features.ann_index
+
+    def generate_candidates(self, pmi_data: Dict, features: PartnerFeatureMatrix, min_score: float,
+                            weights: Optional[MatchWeights] = None) -> Optional[np.ndarray]:
+        """
+        Seleziona i partner che possono raggiungere min_score.
+
+        Un partner assente da tutte le liste dell'indice invertito ha punteggio
+        nullo su settore, paese e servizi, quindi al massimo weights.size +
+        weights.keyword. Per gli altri il limite superiore usa i valori esatti di
+        settore, paese e servizi e il massimo (1.0) per dimensione e keyword.
+
+        Args:
+            pmi_data: Dati della PMI
+            features: Partner codificati con encode_partners
+            min_score: Score minimo (0-100)
+            weights: Pesi da usare (default: quelli in uso nell'engine)
+
+        Returns:
+            Righe ordinate dei candidati, oppure None se nessun partner può essere escluso
+        """
+        if weights is None:
+            weights = self.weights
+        open_bound = weights.size + weights.keyword
+        threshold = min_score / 100 - 1e-9
+        if threshold <= open_bound:
+            return None
+
+        index = self.build_candidate_index(features)
+        n = features.size
+
+        # Limiti per componente, riempiti solo sulle righe delle liste interessate
+        pmi_sector = pmi_data.get('sector') or ''
+        sector_bound = np.zeros(n)
+        sector_bound[index.compatible_sector.get(pmi_sector, _NO_POSTINGS)] = 0.7
+        sector_bound[index.sector.get(pmi_sector, _NO_POSTINGS)] = 1.0
+
+        pmi_targets = pmi_data.get('target_markets') or []
+        country_bound = np.zeros(n)
+        for target in pmi_targets:
+            country_bound[index.neighboring_country.get(target, _NO_POSTINGS)] = 0.5
+        for target in pmi_targets:
+            country_bound[index.country.get(target, _NO_POSTINGS)] = 1.0
+
+        pmi_needs = pmi_data.get('business_needs') or []
+        service_bound = np.zeros(n)
+        for need in pmi_needs:
+            service_bound[index.service.get(need, _NO_POSTINGS)] += 1.0
+        if pmi_needs:
+            service_bound = np.minimum(service_bound / len(pmi_needs), 1.0)
+
+        bound = (
+            sector_bound * weights.sector +
+            country_bound * weights.country +
+            service_bound * weights.service +
+            open_bound
+        )
+        return np.flatnonzero(bound >= threshold)
+
+    def find_best_matches_batch(self, pmi_data: Dict, partners, top_n: int = 10,
+                                min_score: Optional[float] = None, explain: bool = True,
+                                weights: Optional[MatchWeights] = None) -> List[Dict]:
+        """
+        Variante vettoriale di find_best_matches.
+
+        I migliori top_n vengono selezionati con una partizione sull'array degli
+        score; breakdown e spiegazioni vengono creati solo per loro. Con uno
+        score minimo vengono valutati solo i candidati dell'indice invertito in
+        grado di raggiungerlo (vedi generate_candidates). Con ann_candidates
+        impostato vengono valutati solo i candidati dell'indice ANN: il
+        risultato è approssimato (vedi benchmarks/matching_ann.py per il recall).
+
+        Args:
+            pmi_data: Dati della PMI
+            partners: Lista di dizionari partner oppure PartnerFeatureMatrix già codificata
+            top_n: Numero di match da restituire
+            min_score: Score minimo (0-100) dei match restituiti (default: min_match_score)
+            explain: Se False i match non contengono la spiegazione
+            weights: Pesi da usare (default: quelli in uso nell'engine, letti una volta)
+
+        Returns:
+            Lista di match ordinati per score decrescente, nello stesso formato di find_best_matches
+        """
+        features = partners if isinstance(partners, PartnerFeatureMatrix) else self.encode_partners(partners)
+        if features.size == 0:
+            return []
+
+        if min_score is None:
+            min_score = self.min_match_score
+        if weights is None:
+            weights = self.weights
+
+        if self.ann_candidates and features.size > self.ann_candidates:
+            candidates = self.build_ann_index(features).search(pmi_data, self.ann_candidates, weights)
+        elif min_score > 0:
+            candidates = self.generate_candidates(pmi_data, features, min_score, weights)
+        else:
+            candidates = None
+        if candidates is not None:
+            keyword_index = self.keyword_index
+            use_index = keyword_index is not None and keyword_index.is_fitted
+            if use_index:
+                self._keyword_rows(features, keyword_index)
+            features = features.take(candidates, include_terms=not use_index)
+
+        scores = self.calculate_match_scores_batch(pmi_data, features, weights)
+        rounded = np.round(scores['total'] * 100, 2)
+
+        if min_score > 0:
+            eligible = np.flatnonzero(rounded >= min_score)
+            winners = eligible[self._top_k_indices(rounded[eligible], top_n)]
+        else:
+            winners = self._top_k_indices(rounded, top_n)
+
+        return [
+            self._build_match(pmi_data, features.partners[index], self._breakdown_at(scores, index), explain)
+            for index in winners
+        ]
+
+    def _pmi_keyword_scores_from_index(self, partner_description: str, pmis: PMIFeatureMatrix,
+                                       index: PartnerKeywordIndex) -> np.ndarray:
+        """
+        Score testuali delle PMI nello spazio del PartnerKeywordIndex. Gli
+        obiettivi vengono proiettati una volta per fit dell'indice (aggiornare
+        le righe dei partner non cambia gli idf).
+        """
+        cached = pmis.keyword_vectors
+        if cached is None or cached[0] != index.fit_id:
+            cached = (index.fit_id, index.transform(list(pmis.descriptions)))
+            pmis.keyword_vectors = cached
+
+        query = index.transform([partner_description])
+        scores = (cached[1] @ query.T).toarray().ravel()
+        scores[~pmis.has_description] = 0.0
+        return scores
+
+    def calculate_pmi_scores_batch(self, partner_data: Dict, pmis: PMIFeatureMatrix,
+                                   weights: Optional[MatchWeights] = None) -> Dict[str, np.ndarray]:
+        """
+        Calcola tutti i sotto-punteggi e lo score pesato di un partner verso ogni PMI.
+
+        È lo scoring di calculate_match_scores_batch con i ruoli invertiti: le
+        lookup table sono costruite sui vocabolari delle PMI a partire dai dati
+        del partner. I valori coincidono con quelli di calculate_match_score
+        applicato a ciascuna PMI.
+
+        Args:
+            partner_data: Dizionario con i dati del Partner
+            pmis: PMI codificate con encode_pmis
+            weights: Pesi da usare (default: quelli in uso nell'engine)
+
+        Returns:
+            Dizionario di array (0-1) con chiavi sector, country, service, size, keyword, total
+        """
+        n = pmis.size
+
+        # Settore: lookup table sul vocabolario dei settori PMI (ultimo slot = settore mancante)
+        sector_lookup = np.zeros(len(pmis.sector_vocabulary) + 1)
+        partner_sectors = partner_data.get('sectors_expertise') or []
+        if partner_sectors:
+            for sector, index in pmis.sector_vocabulary.items():
+                if sector in partner_sectors:
+                    sector_lookup[index] = 1.0
+                elif any(s in self.sector_compatibility.get(sector, []) for s in partner_sectors):
+                    sector_lookup[index] = 0.7
+        sector_scores = sector_lookup[pmis.sector_codes]
+
+        # Paese: 1.0 se è un mercato target, 0.5 se un target è un paese limitrofo
+        country_scores = np.zeros(n)
+        partner_country = partner_data.get('country') or ''
+        if partner_country:
+            neighbors = [
+                pmis.target_vocabulary[c]
+                for c in self.neighboring_countries.get(partner_country, [])
+                if c in pmis.target_vocabulary
+            ]
+            if neighbors:
+                country_scores[pmis.target_bits[:, neighbors].any(axis=1)] = 0.5
+            exact = pmis.target_vocabulary.get(partner_country)
+            if exact is not None:
+                country_scores[pmis.target_bits[:, exact]] = 1.0
+
+        # Servizi: quota delle esigenze di ogni PMI coperte dal partner
+        service_scores = np.zeros(n)
+        partner_services = partner_data.get('services_offered') or []
+        offered = [pmis.need_vocabulary[s] for s in set(partner_services) if s in pmis.need_vocabulary]
+        if offered:
+            matches = pmis.need_counts[:, offered].sum(axis=1)
+            has_needs = pmis.need_totals > 0
+            service_scores[has_needs] = np.minimum(matches[has_needs] / pmis.need_totals[has_needs], 1.0)
+
+        # Dimensione: lookup table sul vocabolario delle dimensioni (ultimo slot = dimensione mancante)
+        partner_type = partner_data.get('partner_type') or ''
+        if partner_type:
+            size_lookup = np.array(
+                [1.0 if partner_type in self.size_compatibility.get(size, []) else 0.3
+                 for size in pmis.size_vocabulary] + [0.5]
+            )
+            size_scores = size_lookup[pmis.size_codes]
+        else:
+            size_scores = np.full(n, 0.5)
+
+        keyword_scores = np.zeros(n)
+        partner_description = partner_data.get('description') or ''
+        if partner_description and n:
+            keyword_index = self.keyword_index
+            if keyword_index is not None and keyword_index.is_fitted:
+                keyword_scores = self._pmi_keyword_scores_from_index(partner_description, pmis, keyword_index)
+            else:
+                keyword_scores = self._pair_keyword_scores(partner_description, pmis)
+
+        if weights is None:
+            weights = self.weights
+        total_scores = weights.total(sector_scores, country_scores, service_scores, size_scores, keyword_scores)
+
+        return {
+            'sector': sector_scores,
+            'country': country_scores,
+            'service': service_scores,
+            'size': size_scores,
+            'keyword': keyword_scores,
+            'total': total_scores,
+        }
+
+    def find_best_pmis_batch(self, partner_data: Dict, pmis, top_n: int = 10,
+                             min_score: Optional[float] = None) -> List[Dict]:
+        """
+        Matching inverso: trova le PMI più compatibili con un partner.
+
+        Una sola passata vettoriale su una PMIFeatureMatrix già codificata,
+        con la stessa selezione top_n di find_best_matches_batch.
+
+        Args:
+            partner_data: Dati del Partner
+            pmis: Lista di dizionari PMI oppure PMIFeatureMatrix già codificata
+            top_n: Numero di PMI da restituire
+            min_score: Score minimo (0-100) dei match restituiti (default: min_match_score)
+
+        Returns:
+            Lista di match (pmi_id, pmi_name, match_score, breakdown, pmi_data)
+            ordinati per score decrescente
+        """
+        features = pmis if isinstance(pmis, PMIFeatureMatrix) else self.encode_pmis(pmis)
+        if features.size == 0:
+            return []
+
+        if min_score is None:
+            min_score = self.min_match_score
+
+        scores = self.calculate_pmi_scores_batch(partner_data, features)
+        rounded = np.round(scores['total'] * 100, 2)
+
+        if min_score > 0:
+            eligible = np.flatnonzero(rounded >= min_score)
+            winners = eligible[self._top_k_indices(rounded[eligible], top_n)]
+        else:
+            winners = self._top_k_indices(rounded, top_n)
+
+        matches = []
+        for index in winners:
+            pmi = features.pmis[index]
+            breakdown = self._breakdown_at(scores, index)
             matches.append({
-                'partner_id': partner.get('id'),
-                'partner_name': partner.get('company_name'),
+                'pmi_id': pmi.get('id'),
+                'pmi_name': pmi.get('company_name'),
                 'match_score': breakdown['total_score'],
                 'breakdown': breakdown,
-                'explanation': explanation,
-                'partner_data': partner
+                'pmi_data': pmi
             })
-        
-        # Ordina per score decrescente
-        matches.sort(key=lambda x: x['match_score'], reverse=True)
-        
-        # Restituisci top N
-        return matches[:top_n]
+        return matches
 
 
 # Esempio di utilizzo
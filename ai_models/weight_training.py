@@ -0,0 +1,155 @@
+"""
+Addestramento offline dei pesi di BusinessMatchingEngine dal feedback sui match.
+
+I sotto-punteggi (settore, paese, servizi, dimensione, keyword) di ogni match
+valutato sono le feature di una regressione logistica con regolarizzazione L2,
+stimata con il metodo di Newton (IRLS). Ogni iterazione è una passata in
+streaming sui dati a blocchi, quindi la memoria non dipende dal numero di
+match. I coefficienti, resi non negativi e normalizzati a somma 1, diventano
+i nuovi pesi e vengono salvati come artefatto JSON versionato.
+"""
+
+import json
+import os
+import re
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Sotto-punteggi usati come feature, nell'ordine delle colonne
+WEIGHT_NAMES = ('sector', 'country', 'service', 'size', 'keyword')
+
+CURRENT_ARTIFACT = 'match_weights.json'
+_VERSIONED_ARTIFACT = re.compile(r'^match_weights_v(\d+)\.json$')
+
+
+def fit_logistic_regression(
+    read_chunks: Callable[[], Iterable[Tuple[np.ndarray, np.ndarray]]],
+    l2: float = 1.0,
+    max_iterations: int = 25,
+    tolerance: float = 1e-6
+) -> Dict:
+    """
+    Stima una regressione logistica con passate in streaming sui dati.
+
+    Args:
+        read_chunks: Funzione che restituisce, a ogni chiamata, un iterabile di
+            blocchi (X, y) con X di forma (righe, feature) e y in {0, 1}
+        l2: Coefficiente di regolarizzazione (l'intercetta non viene regolarizzata)
+        max_iterations: Numero massimo di iterazioni di Newton
+        tolerance: Soglia sul passo massimo per la convergenza
+
+    Returns:
+        Dizionario con coefficients, intercept, log_loss, accuracy, samples, iterations
+    """
+    beta = None
+    for iteration in range(1, max_iterations + 1):
+        gradient = hessian = None
+        samples = 0
+        for X, y in read_chunks():
+            design = np.hstack([X, np.ones((len(X), 1))])
+            if beta is None:
+                beta = np.zeros(design.shape[1])
+            if gradient is None:
+                gradient = np.zeros(design.shape[1])
+                hessian = np.zeros((design.shape[1], design.shape[1]))
+            p = 1.0 / (1.0 + np.exp(-(design @ beta)))
+            gradient += design.T @ (p - y)
+            hessian += (design * (p * (1 - p))[:, None]).T @ design
+            samples += len(y)
+
+        if not samples:
+            raise ValueError("Nessun campione per l'addestramento")
+
+        penalty = np.full(len(beta), l2)
+        penalty[-1] = 0.0
+        gradient += penalty * beta
+        hessian += np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        beta -= step
+        if np.max(np.abs(step)) < tolerance:
+            break
+
+    # Passata finale per le metriche sul training set
+    log_loss = correct = 0.0
+    for X, y in read_chunks():
+        p = 1.0 / (1.0 + np.exp(-(X @ beta[:-1] + beta[-1])))
+        p = np.clip(p, 1e-12, 1 - 1e-12)
+        log_loss -= np.sum(y * np.log(p) + (1 - y) * np.log(1 - p))
+        correct += np.sum((p >= 0.5) == (y == 1))
+
+    return {
+        'coefficients': beta[:-1].tolist(),
+        'intercept': float(beta[-1]),
+        'log_loss': float(log_loss / samples),
+        'accuracy': float(correct / samples),
+        'samples': samples,
+        'iterations': iteration,
+    }
+
+
+def coefficients_to_weights(coefficients) -> Optional[Dict[str, float]]:
+    """
+    Converte i coefficienti in pesi dello score: i negativi valgono 0 e il
+    totale viene normalizzato a 1. None se nessun coefficiente è positivo.
+    """
+    values = np.clip(np.asarray(coefficients, dtype=float), 0.0, None)
+    total = values.sum()
+    if total <= 0:
+        return None
+    return {name: round(float(value / total), 6) for name, value in zip(WEIGHT_NAMES, values)}
+
+
+def _versions(directory: str) -> Dict[int, str]:
+    if not os.path.isdir(directory):
+        return {}
+    versions = {}
+    for name in os.listdir(directory):
+        match = _VERSIONED_ARTIFACT.match(name)
+        if match:
+            versions[int(match.group(1))] = os.path.join(directory, name)
+    return versions
+
+
+def save_weights_artifact(directory: str, weights: Dict[str, float], metadata: Dict) -> Dict:
+    """
+    Salva i pesi come nuova versione e la rende quella corrente.
+
+    Ogni versione resta in match_weights_v<N>.json; match_weights.json è la
+    copia della versione corrente, sostituita in modo atomico.
+
+    Returns:
+        L'artefatto salvato
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = max(_versions(directory), default=0) + 1
+    artifact = {
+        'version': version,
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'weights': weights,
+        **metadata,
+    }
+    content = json.dumps(artifact, indent=2)
+
+    with open(os.path.join(directory, f'match_weights_v{version}.json'), 'w') as f:
+        f.write(content)
+    tmp_path = os.path.join(directory, f'{CURRENT_ARTIFACT}.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, os.path.join(directory, CURRENT_ARTIFACT))
+    return artifact
+
+
+def load_weights_artifact(directory: str, version: Optional[int] = None) -> Optional[Dict]:
+    """
+    Carica l'artefatto corrente (o una versione precisa); None se non esiste.
+    """
+    if version is None:
+        path = os.path.join(directory, CURRENT_ARTIFACT)
+    else:
+        path = _versions(directory).get(version)
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
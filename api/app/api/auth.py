@@ -9,7 +9,8 @@ from ..core.security import (
     create_access_token,
     create_refresh_token,
     decode_token,
-    verify_token_type
+    verify_token_type,
+    subject_user_id
 )
 from ..core.dependencies import get_current_user
 from ..models.user import User
@@ -95,8 +96,8 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
         )
     
     # Crea i token
-    access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
-    refresh_token = create_refresh_token(data={"sub": user.id, "role": user.role.value})
+    access_token = create_access_token(data={"sub": str(user.id), "role": user.role.value})
+    refresh_token = create_refresh_token(data={"sub": str(user.id), "role": user.role.value})
     
     return {
         "access_token": access_token,
@@ -130,8 +131,8 @@ def refresh_token(token_data: RefreshTokenRequest, db: Session = Depends(get_db)
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == user_id).first()
+    user_id = subject_user_id(payload)
+    user = db.query(User).filter(User.id == user_id).first() if user_id is not None else None
     
     if not user or not user.is_active:
         raise HTTPException(
@@ -140,8 +141,8 @@ def refresh_token(token_data: RefreshTokenRequest, db: Session = Depends(get_db)
         )
     
     # Crea nuovi token
-    access_token = create_access_token(data={"sub": user.id, "role": user.role.value})
-    refresh_token = create_refresh_token(data={"sub": user.id, "role": user.role.value})
+    access_token = create_access_token(data={"sub": str(user.id), "role": user.role.value})
+    refresh_token = create_refresh_token(data={"sub": str(user.id), "role": user.role.value})
     
     return {
         "access_token": access_token,
@@ -18,6 +18,7 @@ from ..schemas.expo import (
     FileUploadResponse
 )
 from ..core.config import settings
+from ..core import tiered_cache
 
 router = APIRouter(prefix="/expo", tags=["Expo Virtuale"])
 
@@ -106,6 +107,7 @@ def update_my_expo_page(
 
 # Product Endpoints
 @router.get("/products", response_model=ProductListResponse)
+@tiered_cache.cached("expo:products", response_model=ProductListResponse, tags=("pmi_id",))
 def list_products(
     pmi_id: Optional[int] = None,
     category: Optional[str] = None,
@@ -184,6 +186,7 @@ def create_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    tiered_cache.invalidate("expo:products", pmi_id=pmi_profile.id)
     
     return product
 
@@ -223,6 +226,7 @@ def update_product(
     
     db.commit()
     db.refresh(product)
+    tiered_cache.invalidate("expo:products", pmi_id=pmi_profile.id)
     
     return product
 
@@ -257,6 +261,7 @@ def delete_product(
     
     db.delete(product)
     db.commit()
+    tiered_cache.invalidate("expo:products", pmi_id=pmi_profile.id)
     
     return None
 
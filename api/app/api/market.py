@@ -4,6 +4,8 @@ from typing import List, Optional
 from datetime import datetime
 
 from ..core.database import get_db
+from ..core.settings import settings
+from ..core import tiered_cache
 from ..core.dependencies import get_current_user, require_roles
 from ..models.user import User, UserRole
 from ..models.business import MarketReport, NewsItem, Alert
@@ -27,6 +29,12 @@ router = APIRouter(prefix="/market", tags=["Market Intelligence"])
 
 # Market Reports
 @router.get("/reports", response_model=MarketReportListResponse)
+# Solo il paese come tag: ogni pagina ne ha uno (o "*"), quindi invalidare il
+# paese vecchio e nuovo di un report copre anche i filtri per settore e tipo
+@tiered_cache.cached(
+    "market:reports", settings.CACHE_REPORTS_TTL,
+    response_model=MarketReportListResponse, tags=("country",)
+)
 def list_reports(
     country: Optional[str] = None,
     sector: Optional[str] = None,
@@ -95,6 +103,7 @@ def create_report(
     db.add(report)
     db.commit()
     db.refresh(report)
+    tiered_cache.invalidate("market:reports", country=report.country)
     
     return report
 
@@ -117,11 +126,15 @@ def update_report(
             detail="Report non trovato"
         )
     
+    previous_country = report.country
     for field, value in report_data.model_dump(exclude_unset=True).items():
         setattr(report, field, value)
     
     db.commit()
     db.refresh(report)
+    tiered_cache.invalidate("market:reports", country=previous_country)
+    if report.country != previous_country:
+        tiered_cache.invalidate("market:reports", country=report.country)
     
     return report
 
@@ -164,8 +177,27 @@ def list_news(
                 db.add(news_item)
         
         db.commit()
+        tiered_cache.invalidate("market:news")
     
-    # Query dal database
+    return _query_news(country, category, source, page, page_size, db=db)
+
+
+@tiered_cache.cached(
+    "market:news", settings.CACHE_NEWS_TTL,
+    response_model=NewsItemListResponse, tags=("country",),
+    stale_ttl_seconds=settings.CACHE_NEWS_STALE_TTL
+)
+def _query_news(
+    country: Optional[str],
+    category: Optional[str],
+    source: Optional[str],
+    page: int,
+    page_size: int,
+    db: Session
+):
+    """
+    Pagina di notizie dal database (in cache fino al prossimo refresh o inserimento).
+    """
     query = db.query(NewsItem)
     
     if country:
@@ -211,6 +243,7 @@ def create_news(
     db.add(news_item)
     db.commit()
     db.refresh(news_item)
+    tiered_cache.invalidate("market:news", country=news_item.country)
     
     return news_item
 
@@ -11,6 +11,9 @@ from ..schemas.matching import (
     MatchSuggestion,
     MatchBreakdown,
     PartnerSummary,
+    PMIMatchSuggestionsResponse,
+    PMIMatchSuggestion,
+    PMISummary,
     BusinessMatchResponse,
     MatchAcceptRequest,
     MatchUpdateRequest,
@@ -31,11 +34,17 @@ router = APIRouter(prefix="/matching", tags=["Business Matching"])
 @router.get("/suggestions", response_model=MatchSuggestionsResponse)
 def get_match_suggestions(
     limit: int = Query(default=10, ge=1, le=50),
+    lang: str = Query(default="it", pattern="^(it|en)$"),
     current_user: User = Depends(require_pmi),
     db: Session = Depends(get_db)
 ):
     """
     Ottiene suggerimenti di match per la PMI corrente usando l'algoritmo IA.
+    
+    I suggerimenti vengono letti da quelli precalcolati (vedi
+    tasks.matching.recalculate_all_matches); il matching in tempo reale viene
+    eseguito solo se per la PMI non esistono ancora. Le spiegazioni vengono
+    generate solo per i match restituiti, nella lingua indicata da ``lang``.
     """
     # Ottieni profilo PMI
     pmi_profile = db.query(PMIProfile).filter(PMIProfile.user_id == current_user.id).first()
@@ -48,22 +57,28 @@ def get_match_suggestions(
     
     # Usa il servizio di matching
     matching_service = MatchingService(db)
-    matches = matching_service.find_matches_for_pmi(pmi_profile.id, limit=limit)
+    matches, computed_at = matching_service.get_suggestions_for_pmi(pmi_profile.id, limit=limit)
+    
+    # Carica i profili partner completi con un'unica query
+    partner_ids = [match['partner_id'] for match in matches]
+    partner_profiles = {
+        partner.id: partner
+        for partner in db.query(PartnerProfile).filter(PartnerProfile.id.in_(partner_ids))
+    } if partner_ids else {}
     
     # Converti in formato risposta
     suggestions = []
     for match in matches:
-        # Ottieni profilo partner completo
-        partner_profile = db.query(PartnerProfile).filter(
-            PartnerProfile.id == match['partner_id']
-        ).first()
+        partner_profile = partner_profiles.get(match['partner_id'])
         
         if partner_profile:
             suggestions.append(MatchSuggestion(
                 partner_id=match['partner_id'],
                 partner_name=match['partner_name'],
                 match_score=match['match_score'],
-                explanation=match['explanation'],
+                explanation=matching_service.explain_match(
+                    match['breakdown'], pmi_profile, partner_profile, lang
+                ),
                 breakdown=MatchBreakdown(**match['breakdown']),
                 partner_data=PartnerSummary(
                     id=partner_profile.id,
@@ -76,6 +91,56 @@ def get_match_suggestions(
                 )
             ))
     
+    return {
+        "total": len(suggestions),
+        "matches": suggestions,
+        "computed_at": computed_at
+    }
+
+
+# PMI Suggestions (matching inverso)
+@router.get("/pmi-suggestions", response_model=PMIMatchSuggestionsResponse)
+def get_pmi_suggestions(
+    limit: int = Query(default=10, ge=1, le=50),
+    current_user: User = Depends(require_partner),
+    db: Session = Depends(get_db)
+):
+    """
+    Ottiene le PMI più compatibili con il partner corrente.
+    
+    Usa lo stesso scoring dei suggerimenti per le PMI, calcolato in una sola
+    passata sullo snapshot delle PMI già codificate.
+    """
+    # Ottieni profilo partner
+    partner_profile = db.query(PartnerProfile).filter(PartnerProfile.user_id == current_user.id).first()
+    
+    if not partner_profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profilo partner non trovato"
+        )
+    
+    matching_service = MatchingService(db)
+    matches = matching_service.find_pmis_for_partner(partner_profile.id, limit=limit)
+    
+    suggestions = [
+        PMIMatchSuggestion(
+            pmi_id=match['pmi_id'],
+            pmi_name=match['pmi_name'],
+            match_score=match['match_score'],
+            breakdown=MatchBreakdown(**match['breakdown']),
+            pmi_data=PMISummary(
+                id=match['pmi_data']['id'],
+                company_name=match['pmi_data']['company_name'],
+                sector=match['pmi_data']['sector'],
+                company_size=match['pmi_data']['company_size'],
+                target_markets=match['pmi_data']['target_markets'],
+                business_objectives=match['pmi_data']['business_objectives']
+            )
+        )
+        for match in matches
+    ]
+    
     return {
         "total": len(suggestions),
         "matches": suggestions
@@ -2,25 +2,79 @@
 Sistema di caching per migliorare le performance delle query frequenti
 """
 
+from collections import OrderedDict
 from functools import wraps
-from typing import Any, Callable, Optional
-from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set
 import json
 import hashlib
 import logging
+import pickle
+import sys
+import threading
+import time
+
+from .settings import settings
 
 logger = logging.getLogger(__name__)
 
 
+def _estimate_size(value: Any) -> int:
+    """Dimensione approssimata di un valore: lunghezza del pickle, altrimenti getsizeof."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _namespaces_of(key: str):
+    """Prefissi di una chiave che terminano prima di ciascun ":" (es. "a", "a:b" per "a:b:c")."""
+    start = key.find(":")
+    while start >= 0:
+        yield key[:start]
+        start = key.find(":", start + 1)
+
+
+class _CacheEntry:
+    """Valore in cache con scadenza (orologio monotono) e dimensione stimata."""
+    
+    __slots__ = ("value", "expires_at", "size")
+    
+    def __init__(self, value: Any, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
 class SimpleCache:
     """
-    Cache in memoria semplice con TTL (Time To Live).
-    Per produzione, considerare Redis per caching distribuito.
+    Cache in memoria con TTL ed eviction LRU, limitata per numero di voci e byte.
+    
+    Le voci sono in un OrderedDict in ordine di utilizzo: lettura, scrittura ed
+    eviction del meno recente sono O(1). Le scadenze usano time.monotonic, quindi
+    non risentono delle modifiche all'orologio di sistema. Le voci scadute
+    vengono rimosse alla lettura o quando sono le meno usate; un RLock rende
+    la cache sicura tra i thread del threadpool di FastAPI.
+    
+    Ogni chiave è registrata nei namespace dei suoi prefissi fino a ciascun
+    ":" (es. "news:ab12" in "news"), così l'invalidazione di un prefisso
+    costa O(chiavi del namespace) e non O(voci in cache).
+    
+    Args:
+        max_entries: Numero massimo di voci
+        max_bytes: Dimensione massima stimata dei valori (vedi _estimate_size)
     """
     
-    def __init__(self):
-        self._cache = {}
-        self._expiry = {}
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._namespaces: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
     
     def get(self, key: str) -> Optional[Any]:
         """
@@ -32,59 +86,133 @@ class SimpleCache:
         Returns:
             Valore cached o None se non trovato o scaduto
         """
-        if key not in self._cache:
-            return None
-        
-        # Verifica scadenza
-        if key in self._expiry and datetime.now() > self._expiry[key]:
-            self.delete(key)
-            return None
-        
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            # Verifica scadenza
+            if time.monotonic() >= entry.expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._cache.move_to_end(key)
+            self.hits += 1
         logger.debug(f"Cache hit: {key}")
-        return self._cache[key]
+        return entry.value
     
     def set(self, key: str, value: Any, ttl_seconds: int = 300):
         """
-        Salva un valore nella cache.
+        Salva un valore nella cache, rimuovendo le voci meno usate oltre i limiti.
         
         Args:
             key: Chiave del valore
             value: Valore da cachare
             ttl_seconds: Time to live in secondi (default 5 minuti)
         """
-        self._cache[key] = value
-        self._expiry[key] = datetime.now() + timedelta(seconds=ttl_seconds)
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            logger.debug(f"Cache skip: {key} ({size} bytes over the limit)")
+            self.delete(key)
+            return
+        
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+            self._cache[key] = _CacheEntry(value, time.monotonic() + ttl_seconds, size)
+            for namespace in _namespaces_of(key):
+                self._namespaces.setdefault(namespace, set()).add(key)
+            self._bytes += size
+            
+            while len(self._cache) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._cache))
+                self._remove(oldest)
+                self.evictions += 1
         logger.debug(f"Cache set: {key} (TTL: {ttl_seconds}s)")
     
+    def _remove(self, key: str):
+        """Rimuove una voce aggiornando il conteggio dei byte (con il lock acquisito)."""
+        entry = self._cache.pop(key)
+        self._bytes -= entry.size
+        for namespace in _namespaces_of(key):
+            keys = self._namespaces.get(namespace)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._namespaces[namespace]
+    
     def delete(self, key: str):
         """Rimuove un valore dalla cache"""
-        if key in self._cache:
-            del self._cache[key]
-        if key in self._expiry:
-            del self._expiry[key]
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
         logger.debug(f"Cache delete: {key}")
     
+    def delete_namespace(self, namespace: str) -> int:
+        """
+        Rimuove tutte le chiavi che iniziano con "<namespace>:".
+        
+        Returns:
+            Numero di voci rimosse
+        """
+        with self._lock:
+            keys = list(self._namespaces.get(namespace, ()))
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+    
+    def keys(self):
+        """Copia delle chiavi presenti (anche scadute ma non ancora rimosse)."""
+        with self._lock:
+            return list(self._cache)
+    
     def clear(self):
         """Svuota completamente la cache"""
-        self._cache.clear()
-        self._expiry.clear()
+        with self._lock:
+            self._cache.clear()
+            self._namespaces.clear()
+            self._bytes = 0
         logger.info("Cache cleared")
     
     def cleanup_expired(self):
         """Rimuove tutti i valori scaduti"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, expiry in self._expiry.items()
-            if now > expiry
-        ]
-        for key in expired_keys:
-            self.delete(key)
+        now = time.monotonic()
+        with self._lock:
+            expired_keys = [
+                key for key, entry in self._cache.items()
+                if now >= entry.expires_at
+            ]
+            for key in expired_keys:
+                self._remove(key)
+            self.expirations += len(expired_keys)
         if expired_keys:
             logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Statistiche della cache: voci, byte, hit, miss, eviction e scadenze."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
 
 
 # Istanza globale del cache
-cache = SimpleCache()
+cache = SimpleCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_MEMORY_MB * 1024 * 1024
+)
 
 
 def generate_cache_key(prefix: str, *args, **kwargs) -> str:
@@ -149,18 +277,14 @@ def cached(ttl_seconds: int = 300, key_prefix: str = "default"):
 
 def invalidate_cache(key_prefix: str):
     """
-    Invalida tutte le chiavi di cache con un certo prefisso.
+    Invalida tutte le chiavi di cache con un certo prefisso, in
+    O(chiavi del prefisso) grazie all'indice dei namespace.
     
     Args:
         key_prefix: Prefisso delle chiavi da invalidare
     """
-    keys_to_delete = [
-        key for key in cache._cache.keys()
-        if key.startswith(f"{key_prefix}:")
-    ]
-    for key in keys_to_delete:
-        cache.delete(key)
-    logger.info(f"Invalidated {len(keys_to_delete)} cache entries with prefix: {key_prefix}")
+    deleted = cache.delete_namespace(key_prefix)
+    logger.info(f"Invalidated {deleted} cache entries with prefix: {key_prefix}")
 
 
 # Funzione helper per uso in API routes
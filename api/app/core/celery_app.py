@@ -54,6 +54,22 @@ celery_app.conf.update(
             "task": "app.tasks.analytics.generate_daily_reports",
             "schedule": crontab(hour=1, minute=0),  # Daily at 1 AM
         },
+        "process-match-recompute-events": {
+            "task": "app.tasks.matching.process_match_recompute_events",
+            "schedule": crontab(minute="*"),  # Every minute
+        },
+        "recalculate-all-matches": {
+            "task": "app.tasks.matching.recalculate_all_matches",
+            "schedule": crontab(hour=4, minute=0, day_of_week=0),  # Weekly safety net, Sunday 4 AM
+        },
+        "rebuild-partner-keyword-index": {
+            "task": "app.tasks.matching.rebuild_keyword_index",
+            "schedule": crontab(hour=3, minute=0),  # Daily at 3 AM
+        },
+        "train-match-weights": {
+            "task": "app.tasks.matching.train_match_weights",
+            "schedule": crontab(hour=2, minute=30, day_of_week=0),  # Weekly, Sunday 2:30 AM
+        },
     },
 )
 
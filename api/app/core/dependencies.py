@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from .database import get_db
-from .security import decode_token, verify_token_type
+from .security import decode_token, verify_token_type, subject_user_id
 from ..models.user import User, UserRole
 
 # Security scheme per JWT
@@ -39,7 +39,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user_id: int = payload.get("sub")
+    user_id = subject_user_id(payload)
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
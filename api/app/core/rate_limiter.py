@@ -2,159 +2,361 @@
 Middleware per rate limiting delle richieste API
 """
 
-from fastapi import Request, HTTPException, status
+from fastapi import HTTPException, status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl
 import logging
+import time
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .security import decode_token
 
 logger = logging.getLogger(__name__)
 
 
+class _BucketState:
+    """Stato GCRA di una chiave: l'istante teorico di arrivo (TAT) della prossima richiesta."""
+    
+    __slots__ = ("tat",)
+    
+    def __init__(self, tat: float):
+        self.tat = tat
+
+
 class RateLimiter:
     """
-    Rate limiter semplice basato su memoria.
-    Per produzione, considerare Redis per rate limiting distribuito.
+    Rate limiter in memoria basato su GCRA (Generic Cell Rate Algorithm).
+    
+    Equivale a un token bucket di capacità requests_per_minute ricaricato in
+    modo continuo, ma per ogni chiave conserva un solo numero: ogni verifica è
+    O(1) e non alloca liste. Le chiavi sono in un LRU limitato a max_keys, quindi
+    non serve una pulizia periodica. In produzione viene usato come fallback di
+    DistributedRateLimiter.
     """
     
-    def __init__(self, requests_per_minute: int = 60):
+    def __init__(self, requests_per_minute: int = 60, max_keys: int = 100_000):
         self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = timedelta(minutes=5)
-        self.last_cleanup = datetime.now()
-    
-    def _cleanup_old_requests(self):
-        """Rimuove le richieste vecchie per liberare memoria"""
-        if datetime.now() - self.last_cleanup > self.cleanup_interval:
-            cutoff_time = datetime.now() - timedelta(minutes=1)
-            for ip in list(self.requests.keys()):
-                self.requests[ip] = [
-                    req_time for req_time in self.requests[ip]
-                    if req_time > cutoff_time
-                ]
-                if not self.requests[ip]:
-                    del self.requests[ip]
-            self.last_cleanup = datetime.now()
-    
-    def is_allowed(self, client_ip: str) -> Tuple[bool, int]:
+        self.max_keys = max_keys
+        self.emission_interval = 60.0 / requests_per_minute
+        # Anticipo massimo del TAT rispetto all'istante corrente (capacità del bucket);
+        # la tolleranza assorbe gli errori di arrotondamento delle somme
+        self.burst = 60.0 + 1e-9
+        self.states: "OrderedDict[str, _BucketState]" = OrderedDict()
+    
+    def is_allowed(self, client_ip: str, cost: int = 1) -> Tuple[bool, int]:
         """
         Verifica se la richiesta è permessa.
         
         Args:
-            client_ip: Indirizzo IP del client
+            client_ip: Indirizzo IP del client (o altra chiave)
+            cost: Token consumati dalla richiesta
         
         Returns:
             Tuple[bool, int]: (is_allowed, remaining_requests)
         """
-        self._cleanup_old_requests()
-        
-        now = datetime.now()
-        cutoff_time = now - timedelta(minutes=1)
+        now = time.monotonic()
+        states = self.states
+        state = states.get(client_ip)
+        if state is None:
+            state = states[client_ip] = _BucketState(now)
+            if len(states) > self.max_keys:
+                states.popitem(last=False)
+        else:
+            states.move_to_end(client_ip)
         
-        # Filtra richieste nell'ultimo minuto
-        recent_requests = [
-            req_time for req_time in self.requests[client_ip]
-            if req_time > cutoff_time
-        ]
-        
-        if len(recent_requests) >= self.requests_per_minute:
+        tat = max(state.tat, now) + self.emission_interval * cost
+        if tat - now > self.burst:
             return False, 0
         
-        # Aggiungi la richiesta corrente
-        self.requests[client_ip] = recent_requests + [now]
-        remaining = self.requests_per_minute - len(self.requests[client_ip])
-        
-        return True, remaining
+        state.tat = tat
+        return True, int((self.burst - (tat - now)) / self.emission_interval)
+
+
+# Token bucket atomico: ricarica, consumo e scadenza della chiave in un solo
+# round-trip. Il tempo è quello del server Redis, comune a tutte le istanze.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, math.floor(tokens)}
+"""
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
+class DistributedRateLimiter:
     """
-    Middleware FastAPI per rate limiting.
+    Rate limiter condiviso tra worker e istanze, basato su un token bucket in Redis.
+    
+    Ogni verifica esegue TOKEN_BUCKET_SCRIPT (EVALSHA, un solo round-trip). Se
+    Redis non è raggiungibile si usa un RateLimiter in memoria per
+    retry_seconds, poi si riprova Redis: i limiti restano applicati, ma per
+    processo.
+    
+    Args:
+        name: Nome del limite, usato nel prefisso delle chiavi (es. 'general', 'auth')
+        requests_per_minute: Richieste consentite al minuto (capacità del bucket)
+        redis_url: URL di Redis (None = solo limiter in memoria)
+        timeout_seconds: Timeout di connessione e risposta di Redis
+        retry_seconds: Attesa prima di riprovare Redis dopo un errore
     """
     
-    def __init__(self, app, requests_per_minute: int = 60):
-        super().__init__(app)
-        self.rate_limiter = RateLimiter(requests_per_minute)
-        self.excluded_paths = [
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/health"
-        ]
-    
-    async def dispatch(self, request: Request, call_next):
-        # Escludi alcuni path dal rate limiting
-        if any(request.url.path.startswith(path) for path in self.excluded_paths):
-            return await call_next(request)
-        
-        # Ottieni IP del client
-        client_ip = request.client.host
-        
-        # Verifica rate limit
-        is_allowed, remaining = self.rate_limiter.is_allowed(client_ip)
-        
-        if not is_allowed:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                content={
-                    "detail": "Too many requests. Please try again later.",
-                    "retry_after": 60
-                },
-                headers={
-                    "Retry-After": "60",
-                    "X-RateLimit-Limit": str(self.rate_limiter.requests_per_minute),
-                    "X-RateLimit-Remaining": "0"
-                }
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int = 60,
+        redis_url: Optional[str] = None,
+        timeout_seconds: float = 0.2,
+        retry_seconds: float = 30.0
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.key_prefix = f"ratelimit:{name}:"
+        self.redis_url = redis_url
+        self.timeout_seconds = timeout_seconds
+        self.retry_seconds = retry_seconds
+        self.local = RateLimiter(requests_per_minute)
+        self._script = None
+        self._redis_down_until = 0.0
+    
+    def _get_script(self):
+        """Client e script vengono creati al primo utilizzo, nel loop del server."""
+        if self._script is None:
+            client = aioredis.from_url(
+                self.redis_url,
+                socket_timeout=self.timeout_seconds,
+                socket_connect_timeout=self.timeout_seconds
             )
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+    
+    async def is_allowed(self, key: str, cost: int = 1) -> Tuple[bool, int]:
+        """
+        Verifica se la richiesta è permessa e consuma cost token.
         
-        # Processa la richiesta
-        response = await call_next(request)
+        Args:
+            key: Chiave del client (es. indirizzo IP)
+            cost: Token consumati dalla richiesta
         
-        # Aggiungi header rate limit
-        response.headers["X-RateLimit-Limit"] = str(self.rate_limiter.requests_per_minute)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        Returns:
+            Tuple[bool, int]: (is_allowed, remaining_requests)
+        """
+        if self.redis_url and time.monotonic() >= self._redis_down_until:
+            try:
+                allowed, remaining = await self._get_script()(
+                    keys=[self.key_prefix + key],
+                    args=[self.requests_per_minute, self.requests_per_minute / 60.0, cost]
+                )
+                return bool(allowed), int(remaining)
+            except (RedisError, OSError) as e:
+                logger.warning(f"Redis rate limiter unavailable, using in-memory limits for {self.retry_seconds}s: {e}")
+                self._redis_down_until = time.monotonic() + self.retry_seconds
         
-        return response
+        return self.local.is_allowed(key, cost)
+
+
+# Path esclusi dal limite generale (prefissi) e soggetti al limite stretto (esatti)
+EXCLUDED_PATH_PREFIXES = ("/docs", "/redoc", "/openapi.json", "/health")
+SENSITIVE_PATHS = frozenset({"/api/v1/auth/login", "/api/v1/auth/register"})
+
+
+# Valori di query string equivalenti a true per FastAPI
+_TRUE_VALUES = frozenset({"1", "true", "yes", "on"})
+
+
+@lru_cache(maxsize=10_000)
+def _token_subject(token: str) -> Optional[Tuple[str, float]]:
+    """
+    Subject e scadenza di un access token valido, None altrimenti.
+    
+    La firma viene verificata una sola volta per token: un subject non
+    verificato permetterebbe di cambiare bucket a ogni richiesta.
+    """
+    try:
+        payload = decode_token(token)
+    except HTTPException:
+        return None
+    if payload.get("type") != "access" or payload.get("sub") is None:
+        return None
+    return str(payload["sub"]), float(payload.get("exp", float("inf")))
 
 
-# Rate limiter più restrittivo per endpoint sensibili
-class StrictRateLimitMiddleware(BaseHTTPMiddleware):
+class RateLimitPolicy:
     """
-    Rate limiter più restrittivo per endpoint sensibili (login, register).
+    Chiave e costo del limite generale per una richiesta.
+    
+    Le richieste con un access token valido usano il bucket dell'utente (sub
+    del JWT), così molte PMI dietro lo stesso NAT non condividono il limite;
+    le altre quello dell'indirizzo IP. Le regole di costo hanno la forma
+    "METODO /path" oppure "METODO /path?parametro=valore" e indicano quanti
+    token consuma la richiesta (1 se nessuna regola corrisponde).
+    
+    Args:
+        route_costs: Regole di costo, es. {"GET /api/v1/market/news?refresh=true": 20}
+        key_by_user: Se False tutte le richieste usano la chiave IP
     """
     
-    def __init__(self, app, requests_per_minute: int = 10):
-        super().__init__(app)
-        self.rate_limiter = RateLimiter(requests_per_minute)
-        self.sensitive_paths = [
-            "/api/v1/auth/login",
-            "/api/v1/auth/register"
-        ]
-    
-    async def dispatch(self, request: Request, call_next):
-        # Applica solo a path sensibili
-        if not any(request.url.path == path for path in self.sensitive_paths):
-            return await call_next(request)
+    def __init__(self, route_costs: Optional[Dict[str, int]] = None, key_by_user: bool = True):
+        self.key_by_user = key_by_user
+        # (metodo, path) -> [(condizioni sulla query, costo)], regole più specifiche prima
+        self.route_costs: Dict[Tuple[str, str], list] = {}
+        for rule, cost in (route_costs or {}).items():
+            method, _, target = rule.strip().partition(" ")
+            path, _, query = target.strip().partition("?")
+            conditions = tuple((name, value.lower()) for name, value in parse_qsl(query, keep_blank_values=True))
+            self.route_costs.setdefault((method.upper(), path), []).append((conditions, int(cost)))
+        for rules in self.route_costs.values():
+            rules.sort(key=lambda rule: -len(rule[0]))
+    
+    def client_key(self, scope, client_ip: str) -> Tuple[str, bool]:
+        """
+        Restituisce (chiave, is_user): "user:<sub>" con un access token valido, "ip:<ip>" altrimenti.
+        """
+        if self.key_by_user:
+            for name, value in scope.get("headers", ()):
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer" and token:
+                        subject = _token_subject(token.strip())
+                        if subject is not None and subject[1] > time.time():
+                            return f"user:{subject[0]}", True
+                    break
+        return f"ip:{client_ip}", False
+    
+    def cost(self, scope) -> int:
+        """Token consumati dalla richiesta secondo le regole di costo."""
+        rules = self.route_costs.get((scope["method"], scope["path"]))
+        if not rules:
+            return 1
+        query = None
+        for conditions, cost in rules:
+            if conditions:
+                if query is None:
+                    query = {
+                        name: value.lower()
+                        for name, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+                    }
+                if not all(
+                    name in query and (query[name] in _TRUE_VALUES if expected == "true" else query[name] == expected)
+                    for name, expected in conditions
+                ):
+                    continue
+            return cost
+        return 1
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI per il rate limiting generale e degli endpoint sensibili.
+    
+    Un solo passaggio per richiesta: i path sensibili (login, register) sono
+    verificati prima contro il limite stretto per IP, poi, come tutti i path
+    non esclusi, contro quello generale, con chiave e costo decisi da
+    RateLimitPolicy (gli utenti autenticati hanno un bucket proprio di
+    user_requests_per_minute). La classificazione usa strutture
+    precalcolate (frozenset per i path esatti, tupla di prefissi per
+    str.startswith). Essendo ASGI puro, la risposta non viene avvolta in task
+    e stream come con BaseHTTPMiddleware: gli header del limite vengono
+    aggiunti al messaggio http.response.start.
+    """
+    
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int = 60,
+        auth_requests_per_minute: int = 10,
+        user_requests_per_minute: Optional[int] = None,
+        policy: Optional[RateLimitPolicy] = None,
+        redis_url: Optional[str] = None,
+        excluded_path_prefixes: Tuple[str, ...] = EXCLUDED_PATH_PREFIXES,
+        sensitive_paths=SENSITIVE_PATHS,
+        **redis_options
+    ):
+        self.app = app
+        self.policy = policy or RateLimitPolicy()
+        self.rate_limiter = DistributedRateLimiter("general", requests_per_minute, redis_url, **redis_options)
+        self.user_rate_limiter = DistributedRateLimiter(
+            "user", user_requests_per_minute or requests_per_minute, redis_url, **redis_options
+        )
+        self.auth_rate_limiter = DistributedRateLimiter("auth", auth_requests_per_minute, redis_url, **redis_options)
+        self.excluded_path_prefixes = tuple(excluded_path_prefixes)
+        self.sensitive_paths = frozenset(sensitive_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
         
-        client_ip = request.client.host
-        is_allowed, remaining = self.rate_limiter.is_allowed(client_ip)
+        path = scope["path"]
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        
+        # Limite stretto per endpoint sensibili
+        if path in self.sensitive_paths:
+            is_allowed, _ = await self.auth_rate_limiter.is_allowed(client_ip)
+            if not is_allowed:
+                logger.warning(f"Strict rate limit exceeded for IP: {client_ip} on path: {path}")
+                response = JSONResponse(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    content={
+                        "detail": "Too many authentication attempts. Please try again later.",
+                        "retry_after": 60
+                    },
+                    headers={
+                        "Retry-After": "60"
+                    }
+                )
+                return await response(scope, receive, send)
+        
+        # Escludi alcuni path dal rate limiting
+        if path.startswith(self.excluded_path_prefixes):
+            return await self.app(scope, receive, send)
+        
+        key, is_user = self.policy.client_key(scope, client_ip)
+        rate_limiter = self.user_rate_limiter if is_user else self.rate_limiter
+        cost = min(self.policy.cost(scope), rate_limiter.requests_per_minute)
+        is_allowed, remaining = await rate_limiter.is_allowed(key, cost)
         
         if not is_allowed:
-            logger.warning(f"Strict rate limit exceeded for IP: {client_ip} on path: {request.url.path}")
-            return JSONResponse(
+            logger.warning(f"Rate limit exceeded for {key} on path: {path} (cost {cost})")
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
-                    "detail": "Too many authentication attempts. Please try again later.",
+                    "detail": "Too many requests. Please try again later.",
                     "retry_after": 60
                 },
                 headers={
-                    "Retry-After": "60"
+                    "Retry-After": "60",
+                    "X-RateLimit-Limit": str(rate_limiter.requests_per_minute),
+                    "X-RateLimit-Remaining": "0"
                 }
             )
+            return await response(scope, receive, send)
         
-        response = await call_next(request)
-        return response
-
+        # Aggiungi header rate limit alla risposta
+        limit_header = str(rate_limiter.requests_per_minute).encode()
+        remaining_header = str(remaining).encode()
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-ratelimit-limit", limit_header))
+                headers.append((b"x-ratelimit-remaining", remaining_header))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
@@ -3,20 +3,42 @@ Redis Caching Module for Africa Business Bridge
 
 This module provides utilities for caching frequently accessed data using Redis,
 including decorators for automatic caching of API endpoints and database queries.
+
+Two clients are kept: a synchronous one for sync code paths (threadpool
+endpoints, Celery tasks) and a redis.asyncio one with its own connection
+pool for coroutines, so cache access never blocks the event loop.
 """
 
 import json
 import functools
-from typing import Any, Callable, Optional
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from datetime import timedelta
 import redis
+import redis.asyncio
 from fastapi import HTTPException
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Redis client instance
+# Redis client instances
 redis_client: Optional[redis.Redis] = None
+async_redis_client: Optional[redis.asyncio.Redis] = None
+
+# Tag sets: "tag:<tag>" holds the keys of the entries carrying that tag
+TAG_PREFIX = "tag:"
+# Keys per UNLINK command (and SCAN/SSCAN page size) during invalidation
+UNLINK_BATCH_SIZE = 500
+
+# Cross-process locks: "lock:<name>" holds the owner's token
+LOCK_PREFIX = "lock:"
+# Delete the lock only if it is still held by the given token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 def init_redis(redis_url: str = "redis://localhost:6379/0") -> redis.Redis:
@@ -46,6 +68,93 @@ def get_redis_client() -> Optional[redis.Redis]:
     return redis_client
 
 
+async def init_async_redis(
+    redis_url: str = "redis://localhost:6379/0",
+    max_connections: int = 50
+) -> Optional[redis.asyncio.Redis]:
+    """
+    Initialize the asyncio Redis client and its connection pool.
+    
+    Must be awaited from the event loop that will use the client
+    (e.g. the FastAPI startup event).
+    
+    Args:
+        redis_url: Redis connection URL
+        max_connections: Maximum connections in the pool
+        
+    Returns:
+        Async Redis client instance, or None if Redis is unreachable
+    """
+    global async_redis_client
+    client = redis.asyncio.from_url(
+        redis_url,
+        decode_responses=True,
+        max_connections=max_connections
+    )
+    try:
+        await client.ping()
+        async_redis_client = client
+        logger.info("Async Redis connection pool established successfully")
+        return async_redis_client
+    except Exception as e:
+        logger.error(f"Failed to connect to Redis (async): {e}")
+        await client.aclose()
+        async_redis_client = None
+        return None
+
+
+def get_async_redis_client() -> Optional[redis.asyncio.Redis]:
+    """Get the asyncio Redis client instance."""
+    return async_redis_client
+
+
+async def close_async_redis():
+    """Close the asyncio Redis client and disconnect its pool."""
+    global async_redis_client
+    if async_redis_client is not None:
+        await async_redis_client.aclose()
+        async_redis_client = None
+
+
+def get_many(keys: List[str]) -> List[Optional[str]]:
+    """
+    Fetch several keys in one round trip (MGET).
+    
+    Returns:
+        Values in the same order as keys (None for misses)
+    """
+    if redis_client is None or not keys:
+        return [None] * len(keys)
+    return redis_client.mget(keys)
+
+
+def set_many(values: Dict[str, str], ttl: int):
+    """Store several keys with the same TTL in one pipelined round trip."""
+    if redis_client is None or not values:
+        return
+    with redis_client.pipeline(transaction=False) as pipe:
+        for key, value in values.items():
+            pipe.setex(key, ttl, value)
+        pipe.execute()
+
+
+async def aget_many(keys: List[str]) -> List[Optional[str]]:
+    """Async counterpart of get_many, using the asyncio client."""
+    if async_redis_client is None or not keys:
+        return [None] * len(keys)
+    return await async_redis_client.mget(keys)
+
+
+async def aset_many(values: Dict[str, str], ttl: int):
+    """Async counterpart of set_many, using the asyncio client."""
+    if async_redis_client is None or not values:
+        return
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        for key, value in values.items():
+            pipe.setex(key, ttl, value)
+        await pipe.execute()
+
+
 def cache_key(prefix: str, *args, **kwargs) -> str:
     """
     Generate a cache key from prefix and arguments.
@@ -98,7 +207,7 @@ def cached(
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs) -> Any:
-            if redis_client is None:
+            if async_redis_client is None:
                 # If Redis is not available, execute function normally
                 return await func(*args, **kwargs)
             
@@ -110,7 +219,7 @@ def cached(
                     cache_k = cache_key(prefix, *args, **kwargs)
                 
                 # Try to get from cache
-                cached_value = redis_client.get(cache_k)
+                cached_value = await async_redis_client.get(cache_k)
                 if cached_value:
                     logger.debug(f"Cache hit for key: {cache_k}")
                     return json.loads(cached_value)
@@ -119,7 +228,7 @@ def cached(
                 result = await func(*args, **kwargs)
                 
                 # Store in cache
-                redis_client.setex(
+                await async_redis_client.setex(
                     cache_k,
                     timedelta(seconds=ttl),
                     json.dumps(result, default=str)
@@ -175,10 +284,137 @@ def cached(
     return decorator
 
 
+def acquire_lock(name: str, timeout_seconds: float) -> Optional[str]:
+    """
+    Try to take a cross-process lock with SET NX PX, without waiting.
+    
+    The lock expires after timeout_seconds, so a crashed owner cannot hold it forever.
+    
+    Returns:
+        Owner token to pass to release_lock, or None if the lock is taken
+        (or Redis is not available)
+    """
+    if redis_client is None:
+        return None
+    token = uuid.uuid4().hex
+    if redis_client.set(f"{LOCK_PREFIX}{name}", token, nx=True, px=int(timeout_seconds * 1000)):
+        return token
+    return None
+
+
+def release_lock(name: str, token: str):
+    """Release a lock taken with acquire_lock, unless it expired and was taken by someone else."""
+    if redis_client is None:
+        return
+    redis_client.eval(RELEASE_LOCK_SCRIPT, 1, f"{LOCK_PREFIX}{name}", token)
+
+
+async def aacquire_lock(name: str, timeout_seconds: float) -> Optional[str]:
+    """Async counterpart of acquire_lock, using the asyncio client."""
+    if async_redis_client is None:
+        return None
+    token = uuid.uuid4().hex
+    if await async_redis_client.set(f"{LOCK_PREFIX}{name}", token, nx=True, px=int(timeout_seconds * 1000)):
+        return token
+    return None
+
+
+async def arelease_lock(name: str, token: str):
+    """Async counterpart of release_lock, using the asyncio client."""
+    if async_redis_client is None:
+        return
+    await async_redis_client.eval(RELEASE_LOCK_SCRIPT, 1, f"{LOCK_PREFIX}{name}", token)
+
+
+def tag_key(tag: str) -> str:
+    """Redis key of the set holding the cache keys tagged with tag."""
+    return f"{TAG_PREFIX}{tag}"
+
+
+def set_with_tags(key: str, value: str, ttl: int, tags: Iterable[str] = ()):
+    """
+    Store a value and register its key in one set per tag, in one pipelined round trip.
+    
+    Each tag set expires with the entries it indexes, so tags must be used
+    by entries with the same TTL (e.g. one tag namespace per cached function).
+    """
+    if redis_client is None:
+        return
+    with redis_client.pipeline(transaction=False) as pipe:
+        pipe.setex(key, ttl, value)
+        for tag in tags:
+            pipe.sadd(tag_key(tag), key)
+            pipe.expire(tag_key(tag), ttl)
+        pipe.execute()
+
+
+async def aset_with_tags(key: str, value: str, ttl: int, tags: Iterable[str] = ()):
+    """Async counterpart of set_with_tags, using the asyncio client."""
+    if async_redis_client is None:
+        return
+    async with async_redis_client.pipeline(transaction=False) as pipe:
+        pipe.setex(key, ttl, value)
+        for tag in tags:
+            pipe.sadd(tag_key(tag), key)
+            pipe.expire(tag_key(tag), ttl)
+        await pipe.execute()
+
+
+def _unlink_in_batches(keys: Iterable[str]) -> int:
+    deleted = 0
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= UNLINK_BATCH_SIZE:
+            deleted += redis_client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += redis_client.unlink(*batch)
+    return deleted
+
+
+def invalidate_tags(*tags: str) -> int:
+    """
+    Invalidate every cache entry registered under any of the given tags.
+    
+    Each tag set is first renamed, so entries cached while the invalidation
+    runs start a fresh set instead of being dropped with the old one; its
+    members are then read with SSCAN and deleted with batched UNLINK.
+    
+    Args:
+        *tags: Tags to invalidate
+        
+    Returns:
+        Number of keys deleted
+    """
+    if redis_client is None:
+        return 0
+    
+    deleted = 0
+    try:
+        for tag in tags:
+            pending = f"{tag_key(tag)}:invalidating:{uuid.uuid4().hex}"
+            try:
+                redis_client.rename(tag_key(tag), pending)
+            except redis.ResponseError:
+                continue  # No entries for this tag
+            deleted += _unlink_in_batches(redis_client.sscan_iter(pending, count=UNLINK_BATCH_SIZE))
+            redis_client.unlink(pending)
+        logger.info(f"Invalidated {deleted} cache keys for tags: {', '.join(tags)}")
+        return deleted
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags: {e}")
+        return deleted
+
+
 def invalidate_cache(pattern: str) -> int:
     """
     Invalidate cache keys matching a pattern.
     
+    Walks the keyspace incrementally with SCAN instead of KEYS, so Redis
+    (shared with Celery) is never blocked for the whole scan; prefer
+    invalidate_tags when the entries are tagged.
+    
     Args:
         pattern: Key pattern (supports wildcards)
         
@@ -189,12 +425,10 @@ def invalidate_cache(pattern: str) -> int:
         return 0
     
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            deleted = redis_client.delete(*keys)
+        deleted = _unlink_in_batches(redis_client.scan_iter(match=pattern, count=UNLINK_BATCH_SIZE))
+        if deleted:
             logger.info(f"Invalidated {deleted} cache keys matching pattern: {pattern}")
-            return deleted
-        return 0
+        return deleted
     except Exception as e:
         logger.error(f"Error invalidating cache: {e}")
         return 0
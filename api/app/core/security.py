@@ -100,3 +100,21 @@ def verify_token_type(payload: dict, expected_type: str) -> bool:
     token_type = payload.get("type")
     return token_type == expected_type
 
+
+
+def subject_user_id(payload: dict) -> Optional[int]:
+    """
+    Estrae l'ID utente dal claim "sub" del token.
+    
+    Il claim è una stringa, come richiesto dallo standard JWT (e da python-jose).
+    
+    Args:
+        payload: Payload del token decodificato
+    
+    Returns:
+        ID utente o None se il claim manca o non è numerico
+    """
+    try:
+        return int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        return None
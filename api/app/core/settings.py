@@ -3,7 +3,7 @@ Configurazione avanzata per ambienti multipli (development, staging, production)
 """
 
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Dict, Optional, List
 from functools import lru_cache
 import os
 
@@ -33,6 +33,10 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 5
     DATABASE_MAX_OVERFLOW: int = 10
     
+    # Redis
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50  # Pool del client asincrono per processo
+    
     # CORS
     BACKEND_CORS_ORIGINS: List[str] = [
         "http://localhost:5173",
@@ -45,12 +49,39 @@ class Settings(BaseSettings):
     RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_AUTH_PER_MINUTE: int = 10
+    RATE_LIMIT_USER_PER_MINUTE: int = 120  # Bucket per utente autenticato (sub del JWT)
+    RATE_LIMIT_KEY_BY_USER: bool = True  # False = limite solo per indirizzo IP
+    RATE_LIMIT_ROUTE_COSTS: Dict[str, int] = {  # Token consumati dalle richieste costose ("METODO /path[?param=valore]")
+        "GET /api/v1/market/news?refresh=true": 20,  # Scraping in tempo reale
+        "GET /api/v1/matching/pmi-suggestions": 3,  # Matching inverso su tutte le PMI
+    }
+    RATE_LIMIT_USE_REDIS: bool = True  # Limiti condivisi tra worker e istanze tramite REDIS_URL
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS: float = 0.2
+    RATE_LIMIT_REDIS_RETRY_SECONDS: int = 30  # Durata del fallback in memoria dopo un errore di Redis
     
     # Caching
     CACHE_ENABLED: bool = True
     CACHE_DEFAULT_TTL: int = 300  # 5 minuti
     CACHE_REPORTS_TTL: int = 3600  # 1 ora
     CACHE_NEWS_TTL: int = 600  # 10 minuti
+    CACHE_MAX_ENTRIES: int = 10000  # Voci massime della cache in memoria (eviction LRU)
+    CACHE_MAX_MEMORY_MB: int = 64  # Dimensione massima stimata dei valori in cache
+    CACHE_L1_TTL: int = 10  # TTL massimo in memoria (L1) per la cache a due livelli
+    CACHE_REDIS_ENABLED: bool = True  # Usa Redis (REDIS_URL) come livello L2 condiviso
+    CACHE_NEWS_STALE_TTL: int = 600  # Notizie servite scadute mentre un worker le ricalcola
+    CACHE_EARLY_EXPIRATION_BETA: float = 1.0  # Scadenza anticipata probabilistica (0 = disattivata)
+    CACHE_LOCK_TIMEOUT: float = 5.0  # Attesa massima / durata del lock di ricalcolo (secondi)
+    
+    # Matching
+    MATCHING_DATA_DIR: str = "./data/matching"  # Indici e artefatti dell'algoritmo di matching
+    MATCHING_PRECOMPUTED_TOP_N: int = 50  # Suggerimenti salvati per ogni PMI
+    MATCHING_RECALCULATION_CHUNK_SIZE: int = 200  # PMI per blocco nel ricalcolo completo
+    MATCHING_SNAPSHOT_TTL_SECONDS: int = 300  # Validità dello snapshot dei partner per modifiche fatte da altri processi
+    MATCHING_WARMUP_ON_STARTUP: bool = True  # Carica engine e snapshot dei partner all'avvio
+    MATCHING_ANN_CANDIDATES: int = 0  # Candidati dall'indice ANN riordinati con lo score esatto (0 = scoring esatto su tutti i partner)
+    MATCHING_WEIGHTS_VERSION: Optional[int] = None  # Versione dei pesi appresi da usare (None = la più recente)
+    MATCHING_WEIGHTS_MIN_SAMPLES: int = 200  # Match valutati necessari per addestrare i pesi
+    MATCHING_MIN_SCORE: float = 0.0  # Score minimo (0-100) dei suggerimenti; sopra 15 i partner irraggiungibili non vengono valutati
     
     # File Upload
     UPLOAD_DIR: str = "./uploads"
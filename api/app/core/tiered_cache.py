@@ -0,0 +1,511 @@
+"""
+Cache a due livelli per le risposte delle API.
+
+L1 è la cache in memoria del processo (core/cache.py) con TTL breve; L2 è
+Redis (core/redis_cache.py), condiviso tra worker e istanze. La lettura è
+read-through (L1, poi L2, poi la funzione; un hit in L2 ripopola L1) e la
+scrittura write-through su entrambi i livelli. I valori sono salvati già
+serializzati in JSON, così L1 e L2 restituiscono la stessa risposta e le
+sessioni del database non servono per le richieste in cache.
+
+Nelle coroutine L2 usa il client redis.asyncio (con pool di connessioni),
+nel codice sincrono il client sincrono; le letture di più chiavi
+avvengono in un solo round trip (MGET).
+
+In L2 ogni voce è registrata nel set del suo namespace e, per i parametri
+indicati in tags, in un set per valore (es. "market:reports|country=Kenya";
+"*" se il filtro non è impostato o è vuoto): l'invalidazione elimina solo
+le chiavi di quei set, senza scansionare il keyspace. In L1 l'invalidazione
+rimuove sempre l'intero namespace, il cui TTL è comunque breve.
+
+Protezione dalle valanghe di miss (cache stampede) nel decorator cached:
+- single-flight: alla scadenza di una chiave la ricalcola una sola
+  richiesta (lock per chiave nel processo, lock SET NX in Redis tra
+  processi); le altre attendono il nuovo valore;
+- scadenza anticipata probabilistica (XFetch): ogni voce ricorda quanto è
+  costato calcolarla e, avvicinandosi alla scadenza, una richiesta la
+  ricalcola in anticipo con probabilità crescente;
+- stale-while-revalidate: con stale_ttl_seconds la voce resta in cache
+  oltre la scadenza e viene servita alle altre richieste mentre una sola
+  la ricalcola.
+
+Senza Redis (o con CACHE_REDIS_ENABLED=False) resta attivo solo L1; il
+TTL breve di L1 limita anche la durata dei dati non aggiornati negli altri
+processi dopo un'invalidazione.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import math
+import random
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import redis_cache
+from .cache import cache as l1_cache, generate_cache_key
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Intervallo tra due letture della cache mentre un altro processo ricalcola la voce
+LOCK_POLL_INTERVAL = 0.05
+
+# Lock di ricalcolo per chiave, rimossi quando nessuno li usa più
+_thread_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+_async_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+
+
+def _l2_client():
+    return redis_cache.get_redis_client() if settings.CACHE_REDIS_ENABLED else None
+
+
+def _async_l2_client():
+    return redis_cache.get_async_redis_client() if settings.CACHE_REDIS_ENABLED else None
+
+
+def _tag(namespace: str, name: str, value: Any) -> str:
+    # Gli endpoint filtrano solo sui valori veri ("if country:"): None, "" e 0
+    # restituiscono l'elenco non filtrato e condividono il tag "*"
+    return f"{namespace}|{name}={value if value else '*'}"
+
+
+def _local_lock(locks: weakref.WeakValueDictionary, key: str, factory: Callable):
+    with _locks_guard:
+        lock = locks.get(key)
+        if lock is None:
+            lock = factory()
+            locks[key] = lock
+        return lock
+
+
+# Voci in cache: {"value": ..., "fresh_until": timestamp, "delta": secondi di calcolo}
+
+def _make_entry(value: Any, ttl_seconds: int, delta: float) -> Dict:
+    return {"value": value, "fresh_until": time.time() + ttl_seconds, "delta": delta}
+
+
+def _is_fresh(entry: Dict) -> bool:
+    return time.time() < entry["fresh_until"]
+
+
+def _should_refresh(entry: Dict) -> bool:
+    """
+    Scadenza anticipata probabilistica (XFetch): vero alla scadenza e,
+    prima, con probabilità che cresce con il costo di calcolo della voce.
+    """
+    early = -entry["delta"] * settings.CACHE_EARLY_EXPIRATION_BETA * math.log(1.0 - random.random())
+    return time.time() + early >= entry["fresh_until"]
+
+
+def _from_l2(key: str, raw: str) -> Optional[Dict]:
+    entry = json.loads(raw)
+    if not isinstance(entry, dict) or "fresh_until" not in entry:
+        return None  # Formato precedente: trattato come miss
+    l1_cache.set(key, entry, settings.CACHE_L1_TTL)
+    return entry
+
+
+def _read_entry(key: str) -> Optional[Dict]:
+    entry = l1_cache.get(key)
+    if entry is not None:
+        return entry
+
+    client = _l2_client()
+    if client is None:
+        return None
+    try:
+        raw = client.get(key)
+    except Exception as e:
+        logger.error(f"L2 cache read error: {e}")
+        return None
+    return None if raw is None else _from_l2(key, raw)
+
+
+async def _aread_entry(key: str) -> Optional[Dict]:
+    entry = l1_cache.get(key)
+    if entry is not None:
+        return entry
+
+    client = _async_l2_client()
+    if client is None:
+        return None
+    try:
+        raw = await client.get(key)
+    except Exception as e:
+        logger.error(f"L2 cache read error: {e}")
+        return None
+    return None if raw is None else _from_l2(key, raw)
+
+
+def _split_l1(keys: List[str]):
+    found, missing = {}, []
+    for key in keys:
+        entry = l1_cache.get(key)
+        if entry is None:
+            missing.append(key)
+        else:
+            found[key] = entry
+    return found, missing
+
+
+def _fresh_values(entries: Dict[str, Dict]) -> Dict[str, Any]:
+    return {key: entry["value"] for key, entry in entries.items() if _is_fresh(entry)}
+
+
+def get_value(key: str) -> Optional[Any]:
+    """
+    Legge un valore non scaduto da L1 oppure da L2 (ripopolando L1).
+
+    Returns:
+        Valore in cache o None
+    """
+    entry = _read_entry(key)
+    return entry["value"] if entry is not None and _is_fresh(entry) else None
+
+
+async def aget_value(key: str) -> Optional[Any]:
+    """
+    Come get_value, con il client Redis asincrono.
+    """
+    entry = await _aread_entry(key)
+    return entry["value"] if entry is not None and _is_fresh(entry) else None
+
+
+def get_values(keys: List[str]) -> Dict[str, Any]:
+    """
+    Legge più chiavi: prima da L1, le mancanti da L2 con un solo MGET.
+
+    Returns:
+        Dizionario chiave -> valore per le sole chiavi trovate e non scadute
+    """
+    found, missing = _split_l1(keys)
+    if missing and _l2_client() is not None:
+        try:
+            raws = redis_cache.get_many(missing)
+        except Exception as e:
+            logger.error(f"L2 cache read error: {e}")
+            return _fresh_values(found)
+        for key, raw in zip(missing, raws):
+            entry = None if raw is None else _from_l2(key, raw)
+            if entry is not None:
+                found[key] = entry
+    return _fresh_values(found)
+
+
+async def aget_values(keys: List[str]) -> Dict[str, Any]:
+    """
+    Come get_values, con il client Redis asincrono.
+    """
+    found, missing = _split_l1(keys)
+    if missing and _async_l2_client() is not None:
+        try:
+            raws = await redis_cache.aget_many(missing)
+        except Exception as e:
+            logger.error(f"L2 cache read error: {e}")
+            return _fresh_values(found)
+        for key, raw in zip(missing, raws):
+            entry = None if raw is None else _from_l2(key, raw)
+            if entry is not None:
+                found[key] = entry
+    return _fresh_values(found)
+
+
+def set_value(
+    key: str,
+    value: Any,
+    ttl_seconds: int,
+    tags: Iterable[str] = (),
+    stale_ttl_seconds: int = 0,
+    delta: float = 0.0
+):
+    """
+    Scrive un valore serializzabile in JSON su entrambi i livelli.
+
+    Args:
+        key: Chiave di cache
+        value: Valore (già serializzabile in JSON)
+        ttl_seconds: Durata del valore; in L1 al massimo CACHE_L1_TTL
+        tags: Tag L2 della voce (stesso TTL per tutte le voci di un tag)
+        stale_ttl_seconds: Permanenza in cache dopo la scadenza (stale-while-revalidate)
+        delta: Secondi impiegati a calcolare il valore (scadenza anticipata)
+    """
+    entry = _make_entry(value, ttl_seconds, delta)
+    retention = ttl_seconds + stale_ttl_seconds
+    l1_cache.set(key, entry, min(retention, settings.CACHE_L1_TTL))
+
+    if _l2_client() is None:
+        return
+    try:
+        redis_cache.set_with_tags(key, json.dumps(entry, default=str), retention, tags)
+    except Exception as e:
+        logger.error(f"L2 cache write error: {e}")
+
+
+async def aset_value(
+    key: str,
+    value: Any,
+    ttl_seconds: int,
+    tags: Iterable[str] = (),
+    stale_ttl_seconds: int = 0,
+    delta: float = 0.0
+):
+    """
+    Come set_value, con il client Redis asincrono.
+    """
+    entry = _make_entry(value, ttl_seconds, delta)
+    retention = ttl_seconds + stale_ttl_seconds
+    l1_cache.set(key, entry, min(retention, settings.CACHE_L1_TTL))
+
+    if _async_l2_client() is None:
+        return
+    try:
+        await redis_cache.aset_with_tags(key, json.dumps(entry, default=str), retention, tags)
+    except Exception as e:
+        logger.error(f"L2 cache write error: {e}")
+
+
+def invalidate(namespace: str, **filters) -> int:
+    """
+    Invalida le voci di un namespace (es. "market:reports") su entrambi i livelli.
+
+    Senza filtri in L2 vengono rimosse tutte le voci del namespace; con i
+    filtri (parametri dichiarati in tags di cached) solo quelle il cui
+    parametro ha quel valore o non è impostato, cioè le sole pagine che
+    possono contenere il record modificato. Con più filtri si rimuove
+    l'unione: più del necessario, mai meno. Le voci invalidate non vengono
+    servite nemmeno come stale.
+
+    Example:
+        invalidate("market:reports", country=report.country)
+
+    Returns:
+        Numero di voci rimosse da L1
+    """
+    deleted = l1_cache.delete_namespace(namespace)
+    if _l2_client() is not None:
+        if filters:
+            tags = [_tag(namespace, name, v) for name, value in filters.items() for v in (value, None)]
+        else:
+            tags = [namespace]
+        redis_cache.invalidate_tags(*tags)
+    logger.debug(f"Invalidated cache namespace: {namespace} {filters or ''}")
+    return deleted
+
+
+def _try_lock_l2(key: str) -> Tuple[bool, Optional[str]]:
+    """Lock di ricalcolo tra processi: (acquisito, token). Senza Redis vale il solo lock locale."""
+    if _l2_client() is None:
+        return True, None
+    try:
+        token = redis_cache.acquire_lock(key, settings.CACHE_LOCK_TIMEOUT)
+    except Exception as e:
+        logger.error(f"L2 cache lock error: {e}")
+        return True, None
+    return token is not None, token
+
+
+def _unlock_l2(key: str, token: Optional[str]):
+    if token is None:
+        return
+    try:
+        redis_cache.release_lock(key, token)
+    except Exception as e:
+        logger.error(f"L2 cache unlock error: {e}")
+
+
+async def _atry_lock_l2(key: str) -> Tuple[bool, Optional[str]]:
+    if _async_l2_client() is None:
+        return True, None
+    try:
+        token = await redis_cache.aacquire_lock(key, settings.CACHE_LOCK_TIMEOUT)
+    except Exception as e:
+        logger.error(f"L2 cache lock error: {e}")
+        return True, None
+    return token is not None, token
+
+
+async def _aunlock_l2(key: str, token: Optional[str]):
+    if token is None:
+        return
+    try:
+        await redis_cache.arelease_lock(key, token)
+    except Exception as e:
+        logger.error(f"L2 cache unlock error: {e}")
+
+
+def _wait_for_entry(key: str) -> Optional[Dict]:
+    """Attende che un altro processo scriva la voce, al massimo CACHE_LOCK_TIMEOUT."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = _read_entry(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+async def _await_entry(key: str) -> Optional[Dict]:
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await _aread_entry(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached(
+    namespace: str,
+    ttl_seconds: Optional[int] = None,
+    response_model: Optional[type] = None,
+    exclude: Iterable[str] = ("db",),
+    tags: Iterable[str] = (),
+    stale_ttl_seconds: int = 0
+) -> Callable:
+    """
+    Decorator read-through/write-through per funzioni sincrone e asincrone.
+
+    La chiave è "<namespace>:<hash>" dei parametri della funzione, esclusi
+    quelli in exclude (es. la sessione del database). Con response_model il
+    risultato viene validato (anche da oggetti ORM) e salvato come JSON.
+    Può decorare direttamente un endpoint FastAPI: la firma viene preservata.
+
+    Un miss viene calcolato da una sola richiesta per chiave, anche tra
+    processi; con stale_ttl_seconds, dopo la scadenza le altre richieste
+    ricevono il valore precedente invece di attendere.
+
+    Args:
+        namespace: Namespace delle chiavi, usato anche per l'invalidazione
+        ttl_seconds: Durata del valore (default CACHE_DEFAULT_TTL)
+        response_model: Modello Pydantic con cui serializzare il risultato
+        exclude: Parametri che non fanno parte della chiave
+        tags: Parametri usati come tag L2 per l'invalidazione mirata
+        stale_ttl_seconds: Finestra dopo la scadenza in cui il valore
+            precedente viene servito mentre una richiesta lo ricalcola
+
+    Example:
+        @router.get("/reports", response_model=MarketReportListResponse)
+        @cached("market:reports", ttl_seconds=3600, response_model=MarketReportListResponse)
+        def list_reports(country: Optional[str] = None, db: Session = Depends(get_db)):
+            ...
+    """
+    excluded = frozenset(exclude)
+    tag_names = tuple(tags)
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        ttl = ttl_seconds or settings.CACHE_DEFAULT_TTL
+
+        def build_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = generate_cache_key(
+                namespace, **{name: value for name, value in bound.arguments.items() if name not in excluded}
+            )
+            return key, [namespace] + [_tag(namespace, name, bound.arguments[name]) for name in tag_names]
+
+        def serialize(result):
+            if response_model is None:
+                return result
+            return response_model.model_validate(result, from_attributes=True).model_dump(mode="json")
+
+        if asyncio.iscoroutinefunction(func):
+            async def _refresh_async(key, entry_tags, args, kwargs):
+                start = time.perf_counter()
+                value = serialize(await func(*args, **kwargs))
+                await aset_value(key, value, ttl, entry_tags, stale_ttl_seconds, time.perf_counter() - start)
+                return value
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not settings.CACHE_ENABLED:
+                    return await func(*args, **kwargs)
+                key, entry_tags = build_key(args, kwargs)
+                entry = await _aread_entry(key)
+                if entry is not None and not _should_refresh(entry):
+                    return entry["value"]
+
+                lock = _local_lock(_async_locks, key, asyncio.Lock)
+                if entry is not None:
+                    # Valore scaduto ma servibile, o in scadenza anticipata:
+                    # lo ricalcola una sola richiesta, le altre usano quello presente
+                    if lock.locked():
+                        return entry["value"]
+                    async with lock:
+                        acquired, token = await _atry_lock_l2(key)
+                        if not acquired:
+                            return entry["value"]
+                        try:
+                            return await _refresh_async(key, entry_tags, args, kwargs)
+                        finally:
+                            await _aunlock_l2(key, token)
+
+                async with lock:
+                    entry = await _aread_entry(key)
+                    if entry is not None:
+                        return entry["value"]
+                    acquired, token = await _atry_lock_l2(key)
+                    if not acquired:
+                        entry = await _await_entry(key)
+                        if entry is not None:
+                            return entry["value"]
+                    try:
+                        return await _refresh_async(key, entry_tags, args, kwargs)
+                    finally:
+                        await _aunlock_l2(key, token)
+            return async_wrapper
+
+        def _refresh_sync(key, entry_tags, args, kwargs):
+            start = time.perf_counter()
+            value = serialize(func(*args, **kwargs))
+            set_value(key, value, ttl, entry_tags, stale_ttl_seconds, time.perf_counter() - start)
+            return value
+
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key, entry_tags = build_key(args, kwargs)
+            entry = _read_entry(key)
+            if entry is not None and not _should_refresh(entry):
+                return entry["value"]
+
+            lock = _local_lock(_thread_locks, key, threading.Lock)
+            if entry is not None:
+                # Valore scaduto ma servibile, o in scadenza anticipata:
+                # lo ricalcola una sola richiesta, le altre usano quello presente
+                if not lock.acquire(blocking=False):
+                    return entry["value"]
+                try:
+                    acquired, token = _try_lock_l2(key)
+                    if not acquired:
+                        return entry["value"]
+                    try:
+                        return _refresh_sync(key, entry_tags, args, kwargs)
+                    finally:
+                        _unlock_l2(key, token)
+                finally:
+                    lock.release()
+
+            with lock:
+                entry = _read_entry(key)
+                if entry is not None:
+                    return entry["value"]
+                acquired, token = _try_lock_l2(key)
+                if not acquired:
+                    entry = _wait_for_entry(key)
+                    if entry is not None:
+                        return entry["value"]
+                try:
+                    return _refresh_sync(key, entry_tags, args, kwargs)
+                finally:
+                    _unlock_l2(key, token)
+        return sync_wrapper
+
+    return decorator
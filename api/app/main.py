@@ -6,9 +6,11 @@ import os
 import logging
 
 from .core.settings import settings
-from .core.database import engine, Base
-from .core.rate_limiter import RateLimitMiddleware, StrictRateLimitMiddleware
+from .core.database import engine, Base, SessionLocal
+from .core.rate_limiter import RateLimitMiddleware, RateLimitPolicy
+from .core.redis_cache import init_redis, init_async_redis, close_async_redis
 from .api import auth, expo, matching, market, training
+from .services.matching_service import warm_up_matching
 
 # Configurazione logging
 logging.basicConfig(
@@ -49,9 +51,20 @@ if settings.ENABLE_GZIP:
 
 # Aggiungi Rate Limiting se abilitato
 if settings.RATE_LIMIT_ENABLED:
-    app.add_middleware(RateLimitMiddleware, requests_per_minute=settings.RATE_LIMIT_PER_MINUTE)
-    app.add_middleware(StrictRateLimitMiddleware, requests_per_minute=settings.RATE_LIMIT_AUTH_PER_MINUTE)
-    logger.info(f"Rate limiting enabled: {settings.RATE_LIMIT_PER_MINUTE} req/min (general), {settings.RATE_LIMIT_AUTH_PER_MINUTE} req/min (auth)")
+    rate_limit_redis = dict(
+        redis_url=settings.REDIS_URL if settings.RATE_LIMIT_USE_REDIS else None,
+        timeout_seconds=settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+        retry_seconds=settings.RATE_LIMIT_REDIS_RETRY_SECONDS,
+    )
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+        auth_requests_per_minute=settings.RATE_LIMIT_AUTH_PER_MINUTE,
+        user_requests_per_minute=settings.RATE_LIMIT_USER_PER_MINUTE,
+        policy=RateLimitPolicy(settings.RATE_LIMIT_ROUTE_COSTS, key_by_user=settings.RATE_LIMIT_KEY_BY_USER),
+        **rate_limit_redis
+    )
+    logger.info(f"Rate limiting enabled: {settings.RATE_LIMIT_PER_MINUTE} req/min (general), {settings.RATE_LIMIT_USER_PER_MINUTE} req/min (user), {settings.RATE_LIMIT_AUTH_PER_MINUTE} req/min (auth)")
 
 # Crea la directory per gli upload se non esiste
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
@@ -98,11 +111,25 @@ async def startup_event():
     """Evento eseguito all'avvio dell'applicazione"""
     logger.info("Application startup complete")
     logger.info(f"Database URL: {settings.DATABASE_URL.split('@')[-1]}")  # Log solo host/db, non credenziali
+    
+    if settings.CACHE_ENABLED and settings.CACHE_REDIS_ENABLED:
+        init_redis(settings.REDIS_URL)
+        await init_async_redis(settings.REDIS_URL, settings.REDIS_MAX_CONNECTIONS)
+    
+    if settings.MATCHING_WARMUP_ON_STARTUP:
+        db = SessionLocal()
+        try:
+            warm_up_matching(db)
+        except Exception as e:
+            logger.warning(f"Matching warm-up failed: {e}")
+        finally:
+            db.close()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento eseguito alla chiusura dell'applicazione"""
+    await close_async_redis()
     logger.info("Application shutdown")
 
 
@@ -1,6 +1,6 @@
 from .user import User, UserRole, PMIProfile, PartnerProfile, AdminProfile
 from .expo import ExpoPage, Product, MediaItem, Document
-from .business import BusinessMatch, Meeting, Message, MarketReport, NewsItem, Alert, MatchStatus
+from .business import BusinessMatch, MatchSuggestionSet, MatchRecomputeEvent, Meeting, Message, MarketReport, NewsItem, Alert, MatchStatus
 from .training import TrainingEvent, EventRegistration, Course, Lesson, CourseEnrollment, EventType, EventStatus
 
 __all__ = [
@@ -14,6 +14,8 @@ __all__ = [
     "MediaItem",
     "Document",
     "BusinessMatch",
+    "MatchSuggestionSet",
+    "MatchRecomputeEvent",
     "Meeting",
     "Message",
     "MarketReport",
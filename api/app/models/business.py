@@ -38,6 +38,32 @@ class BusinessMatch(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class MatchSuggestionSet(Base):
+    """Suggerimenti di match precalcolati per una PMI (top-N ordinato)"""
+    __tablename__ = "match_suggestion_sets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    pmi_id = Column(Integer, ForeignKey("pmi_profiles.id"), unique=True, index=True, nullable=False)
+    
+    # JSON array ordinato per score: partner_id, partner_name, match_score, breakdown
+    # (le spiegazioni vengono generate alla lettura, nella lingua richiesta)
+    suggestions = Column(Text, nullable=False)
+    
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+    weights_version = Column(Integer)  # Versione dei pesi appresi usata (None = pesi predefiniti)
+
+
+class MatchRecomputeEvent(Base):
+    """Outbox dei profili modificati i cui suggerimenti di match vanno ricalcolati"""
+    __tablename__ = "match_recompute_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String(20), nullable=False)  # pmi, partner
+    entity_id = Column(Integer, nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Meeting(Base):
     """Incontri B2B tra PMI e Partner"""
     __tablename__ = "meetings"
@@ -43,6 +43,32 @@ class MatchSuggestionsResponse(BaseModel):
     """Risposta con lista di suggerimenti di match"""
     total: int
     matches: List[MatchSuggestion]
+    computed_at: Optional[datetime] = None  # Momento del calcolo dei suggerimenti
+
+
+class PMISummary(BaseModel):
+    """Riepilogo informazioni PMI per il matching inverso"""
+    id: int
+    company_name: str
+    sector: Optional[str] = None
+    company_size: Optional[str] = None
+    target_markets: List[str] = []
+    business_objectives: Optional[str] = None
+
+
+class PMIMatchSuggestion(BaseModel):
+    """Suggerimento di una PMI per un partner"""
+    pmi_id: int
+    pmi_name: str
+    match_score: float
+    breakdown: MatchBreakdown
+    pmi_data: PMISummary
+
+
+class PMIMatchSuggestionsResponse(BaseModel):
+    """Risposta con lista di PMI suggerite a un partner"""
+    total: int
+    matches: List[PMIMatchSuggestion]
 
 
 class BusinessMatchResponse(BaseModel):
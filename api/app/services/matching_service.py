@@ -2,20 +2,446 @@
 Servizio per il Business Matching con integrazione algoritmo IA
 """
 
-from sqlalchemy.orm import Session
-from typing import List, Dict
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+from datetime import datetime, timezone
+import copy
+import importlib
 import json
+import logging
+import os
 import sys
+import tempfile
+import threading
+import time
 from pathlib import Path
 
-# Aggiungi il path ai modelli IA
+# Path dei modelli IA: matching_algorithm (numpy, scipy, scikit-learn) viene
+# importato al primo utilizzo, non al caricamento dell'applicazione
 ai_models_path = Path(__file__).parent.parent.parent.parent / "ai_models"
-sys.path.insert(0, str(ai_models_path))
 
-from matching_algorithm import BusinessMatchingEngine
+if TYPE_CHECKING:
+    from matching_algorithm import BusinessMatchingEngine, MatchWeights, PartnerFeatureMatrix, PartnerKeywordIndex, PMIFeatureMatrix
 
+from ..core.settings import settings
 from ..models.user import PMIProfile, PartnerProfile
-from ..models.business import BusinessMatch, MatchStatus
+from ..models.business import BusinessMatch, MatchStatus, MatchSuggestionSet, MatchRecomputeEvent
+
+logger = logging.getLogger(__name__)
+
+
+def _ai_module(name: str):
+    """Importa un modulo di ai_models (es. matching_algorithm)."""
+    if str(ai_models_path) not in sys.path:
+        sys.path.insert(0, str(ai_models_path))
+    return importlib.import_module(name)
+
+
+def _weights_dir() -> str:
+    return os.path.join(settings.MATCHING_DATA_DIR, "weights")
+
+
+# Engine condiviso da tutte le richieste del processo (vedi get_matching_engine)
+_matching_engine: Optional["BusinessMatchingEngine"] = None
+_matching_engine_lock = threading.Lock()
+# Versione su disco (mtime) dell'artefatto dei pesi corrente già considerata
+_weights_mtime: Optional[float] = None
+
+
+def _current_weights_mtime() -> Optional[float]:
+    path = os.path.join(_weights_dir(), _ai_module("weight_training").CURRENT_ARTIFACT)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _refresh_weights(engine: "BusinessMatchingEngine", mtime: Optional[float]):
+    """
+    Applica all'engine i pesi appresi dall'artefatto corrente (o da
+    MATCHING_WEIGHTS_VERSION), se diversi da quelli in uso. Da chiamare con
+    _matching_engine_lock.
+    """
+    global _weights_mtime
+    artifact = _ai_module("weight_training").load_weights_artifact(
+        _weights_dir(), settings.MATCHING_WEIGHTS_VERSION
+    )
+    if artifact is not None and artifact['version'] != engine.weights.version:
+        engine.set_weights(artifact['weights'], artifact['version'])
+        logger.info(f"Matching weights v{artifact['version']} loaded: {artifact['weights']}")
+    _weights_mtime = mtime
+
+
+def get_matching_engine() -> "BusinessMatchingEngine":
+    """
+    Restituisce l'engine di matching del processo, creandolo al primo utilizzo.
+    
+    L'engine non ha stato per richiesta: cambiano solo keyword_index, sostituito
+    (mai modificato) quando l'indice viene aggiornato, e i pesi appresi,
+    ricaricati quando train_weights (anche in un altro processo) salva una
+    nuova versione. engine.weights (con la versione in uso) viene sostituito
+    in blocco: chi calcola e salva dei suggerimenti lo legge una sola volta.
+    """
+    global _matching_engine
+    mtime = _current_weights_mtime()
+    if _matching_engine is None or mtime != _weights_mtime:
+        with _matching_engine_lock:
+            if _matching_engine is None:
+                engine = _ai_module("matching_algorithm").BusinessMatchingEngine()
+                engine.min_match_score = settings.MATCHING_MIN_SCORE
+                engine.ann_candidates = settings.MATCHING_ANN_CANDIDATES or None
+                _refresh_weights(engine, mtime)
+                _matching_engine = engine
+            elif mtime != _weights_mtime:
+                _refresh_weights(_matching_engine, mtime)
+    return _matching_engine
+
+# Indice TF-IDF delle descrizioni partner, condiviso nel processo e persistito su disco
+_keyword_index: Optional["PartnerKeywordIndex"] = None
+_keyword_index_mtime: Optional[float] = None
+_keyword_index_lock = threading.Lock()
+
+
+def _keyword_index_path() -> str:
+    return os.path.join(settings.MATCHING_DATA_DIR, "partner_keyword_index.joblib")
+
+
+def _save_keyword_index(index: "PartnerKeywordIndex"):
+    """Salva l'indice in modo atomico e registra la versione su disco caricata."""
+    global _keyword_index_mtime
+    path = _keyword_index_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    index.save(tmp_path)
+    os.replace(tmp_path, path)
+    _keyword_index_mtime = os.path.getmtime(path)
+
+
+def _build_keyword_index(db: Session) -> "PartnerKeywordIndex":
+    """Costruisce, persiste e pubblica l'indice. Da chiamare con _keyword_index_lock."""
+    global _keyword_index
+    rows = db.query(PartnerProfile.id, PartnerProfile.description).all()
+    index = _ai_module("matching_algorithm").PartnerKeywordIndex().fit([r.id for r in rows], [r.description or '' for r in rows])
+    _save_keyword_index(index)
+    _keyword_index = index
+    logger.info(f"Partner keyword index built over {len(rows)} partners")
+    return index
+
+
+def build_keyword_index(db: Session) -> "PartnerKeywordIndex":
+    """
+    Ricostruisce da zero l'indice TF-IDF su tutte le descrizioni dei partner e lo persiste.
+    """
+    with _keyword_index_lock:
+        return _build_keyword_index(db)
+
+
+def get_keyword_index(db: Session) -> "PartnerKeywordIndex":
+    """
+    Restituisce l'indice TF-IDF dei partner, caricandolo da disco (o costruendolo)
+    solo se assente in memoria o aggiornato da un altro processo.
+    
+    La costruzione avviene sotto _keyword_index_lock: con più richieste a freddo
+    l'indice viene costruito una sola volta, e apply_description_changes attende
+    che sia salvato invece di ignorare le modifiche.
+    """
+    global _keyword_index, _keyword_index_mtime
+    path = _keyword_index_path()
+    with _keyword_index_lock:
+        if not os.path.exists(path):
+            return _build_keyword_index(db)
+        mtime = os.path.getmtime(path)
+        if _keyword_index is None or mtime != _keyword_index_mtime:
+            _keyword_index = _ai_module("matching_algorithm").PartnerKeywordIndex.load(path)
+            _keyword_index_mtime = mtime
+        return _keyword_index
+
+
+def apply_description_changes(changes: Dict[int, Optional[str]]):
+    """
+    Applica all'indice le descrizioni modificate (None = partner eliminato).
+    
+    Se l'indice non esiste ancora non fa nulla: verrà costruito al primo utilizzo
+    già con le descrizioni aggiornate. Le modifiche vengono fatte su una copia,
+    così le richieste in corso continuano a usare l'indice precedente.
+    """
+    global _keyword_index, _keyword_index_mtime
+    path = _keyword_index_path()
+    with _keyword_index_lock:
+        if not os.path.exists(path):
+            return
+        mtime = os.path.getmtime(path)
+        if _keyword_index is None or mtime != _keyword_index_mtime:
+            _keyword_index = _ai_module("matching_algorithm").PartnerKeywordIndex.load(path)
+            _keyword_index_mtime = mtime
+        if not _keyword_index.is_fitted:
+            return
+        
+        index = copy.copy(_keyword_index)
+        index.row_by_id = dict(index.row_by_id)
+        # Le righe dei partner eliminati vengono azzerate
+        index.update_many({
+            partner_id: description or ''
+            for partner_id, description in changes.items()
+            if description is not None or partner_id in index.row_by_id
+        })
+        _save_keyword_index(index)
+        _keyword_index = index
+    logger.info(f"Partner keyword index updated for {len(changes)} partners")
+
+
+@event.listens_for(PartnerProfile, "after_insert")
+@event.listens_for(PartnerProfile, "after_update")
+def _track_description_change(mapper, connection, target):
+    """Registra le descrizioni modificate nella sessione, da applicare al commit."""
+    if inspect(target).attrs.description.history.has_changes():
+        session = object_session(target)
+        session.info.setdefault("partner_description_changes", {})[target.id] = target.description or ''
+
+
+@event.listens_for(PartnerProfile, "after_delete")
+def _track_partner_delete(mapper, connection, target):
+    session = object_session(target)
+    session.info.setdefault("partner_description_changes", {})[target.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_tracked_description_changes(session):
+    changes = session.info.pop("partner_description_changes", None)
+    if changes:
+        try:
+            apply_description_changes(changes)
+        except Exception as e:
+            logger.error(f"Error updating partner keyword index: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_tracked_description_changes(session):
+    session.info.pop("partner_description_changes", None)
+
+
+# Attributi che influenzano lo score: solo le loro modifiche generano ricalcoli
+PARTNER_MATCHING_FIELDS = (
+    "company_name", "country", "partner_type", "sectors_expertise",
+    "services_offered", "description", "is_public",
+)
+PMI_MATCHING_FIELDS = (
+    "company_name", "sector", "target_markets", "company_size",
+    "production_capacity", "business_objectives",
+)
+
+
+def _enqueue_recompute(connection, entity_type: str, entity_id: int):
+    """Scrive un evento nell'outbox all'interno della stessa transazione del profilo."""
+    connection.execute(
+        MatchRecomputeEvent.__table__.insert().values(entity_type=entity_type, entity_id=entity_id)
+    )
+
+
+def _matching_fields_changed(target, fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(PartnerProfile, "after_insert")
+@event.listens_for(PartnerProfile, "after_delete")
+def _enqueue_partner_recompute(mapper, connection, target):
+    _enqueue_recompute(connection, "partner", target.id)
+
+
+@event.listens_for(PartnerProfile, "after_update")
+def _enqueue_partner_update(mapper, connection, target):
+    if _matching_fields_changed(target, PARTNER_MATCHING_FIELDS):
+        _enqueue_recompute(connection, "partner", target.id)
+
+
+@event.listens_for(PMIProfile, "after_insert")
+@event.listens_for(PMIProfile, "after_delete")
+def _enqueue_pmi_recompute(mapper, connection, target):
+    _enqueue_recompute(connection, "pmi", target.id)
+
+
+@event.listens_for(PMIProfile, "after_update")
+def _enqueue_pmi_update(mapper, connection, target):
+    if _matching_fields_changed(target, PMI_MATCHING_FIELDS):
+        _enqueue_recompute(connection, "pmi", target.id)
+
+
+class _FeatureSnapshot:
+    """
+    Matrice di feature codificata, condivisa nel processo.
+    
+    Le modifiche committate da questo processo la invalidano subito (vedi
+    invalidate); quelle fatte da altri processi al più tardi dopo
+    MATCHING_SNAPSHOT_TTL_SECONDS. La matrice porta in ``version`` il numero
+    di versione con cui è stata costruita e viene ricostruita da un solo
+    thread alla volta.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.matrix = None
+        self.version = 0
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()
+    
+    def invalidate(self):
+        # Sotto lo stesso lock di get(): una ricostruzione in corso termina con
+        # la versione letta prima dell'incremento e viene quindi scartata
+        with self.lock:
+            self.version += 1
+    
+    def get(self, build):
+        with self.lock:
+            matrix = self.matrix
+            if (
+                matrix is not None
+                and matrix.version == self.version
+                and time.monotonic() - self.loaded_at < settings.MATCHING_SNAPSHOT_TTL_SECONDS
+            ):
+                return matrix
+            
+            version = self.version
+            matrix = build()
+            matrix.version = version
+            self.matrix = matrix
+            self.loaded_at = time.monotonic()
+            logger.info(f"{self.name} snapshot v{version} loaded with {matrix.size} rows")
+            return matrix
+
+
+# Snapshot colonnari dei partner pubblici e delle PMI già codificati
+_partner_snapshot = _FeatureSnapshot("Partner")
+_pmi_snapshot = _FeatureSnapshot("PMI")
+
+# Colonne lette per lo snapshot (nessuna entità ORM viene idratata)
+PARTNER_SNAPSHOT_COLUMNS = (
+    PartnerProfile.id, PartnerProfile.company_name, PartnerProfile.country, PartnerProfile.city,
+    PartnerProfile.partner_type, PartnerProfile.sectors_expertise, PartnerProfile.services_offered,
+    PartnerProfile.description,
+)
+
+
+def invalidate_partner_snapshot():
+    """Forza la ricostruzione dello snapshot dei partner alla prossima richiesta."""
+    _partner_snapshot.invalidate()
+
+
+def get_partner_snapshot(service: "MatchingService") -> "PartnerFeatureMatrix":
+    """
+    Restituisce lo snapshot dei partner pubblici, ricostruendolo se invalidato o scaduto.
+    """
+    return _partner_snapshot.get(service.encode_public_partners)
+
+
+def invalidate_pmi_snapshot():
+    """Forza la ricostruzione dello snapshot delle PMI alla prossima richiesta."""
+    _pmi_snapshot.invalidate()
+
+
+def get_pmi_snapshot(service: "MatchingService") -> "PMIFeatureMatrix":
+    """
+    Restituisce lo snapshot delle PMI per il matching inverso, ricostruendolo
+    se invalidato o scaduto.
+    """
+    return _pmi_snapshot.get(service.encode_pmis)
+
+
+@event.listens_for(PartnerProfile, "after_insert")
+@event.listens_for(PartnerProfile, "after_delete")
+def _track_partner_snapshot_change(mapper, connection, target):
+    object_session(target).info["partner_snapshot_stale"] = True
+
+
+@event.listens_for(PartnerProfile, "after_update")
+def _track_partner_snapshot_update(mapper, connection, target):
+    if _matching_fields_changed(target, PARTNER_MATCHING_FIELDS + ("city",)):
+        object_session(target).info["partner_snapshot_stale"] = True
+
+
+@event.listens_for(PMIProfile, "after_insert")
+@event.listens_for(PMIProfile, "after_delete")
+def _track_pmi_snapshot_change(mapper, connection, target):
+    object_session(target).info["pmi_snapshot_stale"] = True
+
+
+@event.listens_for(PMIProfile, "after_update")
+def _track_pmi_snapshot_update(mapper, connection, target):
+    if _matching_fields_changed(target, PMI_MATCHING_FIELDS):
+        object_session(target).info["pmi_snapshot_stale"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_snapshots_on_commit(session):
+    if session.info.pop("partner_snapshot_stale", False):
+        invalidate_partner_snapshot()
+    if session.info.pop("pmi_snapshot_stale", False):
+        invalidate_pmi_snapshot()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_snapshot_changes(session):
+    session.info.pop("partner_snapshot_stale", None)
+    session.info.pop("pmi_snapshot_stale", None)
+
+
+def warm_up_matching(db: Session):
+    """
+    Prepara engine, indice TF-IDF e snapshot dei partner prima delle richieste.
+    
+    Sposta all'avvio l'import di scikit-learn e la codifica dei partner, che
+    altrimenti peserebbero sulla prima richiesta di matching del processo.
+    """
+    service = MatchingService(db)
+    service.engine.warm_up()
+    service.engine.keyword_index = get_keyword_index(db)
+    snapshot = get_partner_snapshot(service)
+    if service.engine.ann_candidates:
+        service.engine.build_ann_index(snapshot)
+    logger.info(f"Matching engine warmed up with {snapshot.size} partners")
+
+
+def _parse_json_list(value: Optional[str]) -> List:
+    """Decodifica una lista JSON salvata come testo, internando le stringhe."""
+    try:
+        items = json.loads(value) if value else []
+    except:
+        return []
+    return [sys.intern(item) if isinstance(item, str) else item for item in items]
+
+
+# Stati di un match che indicano un giudizio positivo della PMI
+POSITIVE_MATCH_STATUSES = (MatchStatus.ACCEPTED, MatchStatus.MEETING_SCHEDULED, MatchStatus.COMPLETED)
+
+# Colonne del profilo PMI usate da _prepare_pmi_data
+PMI_MATCHING_COLUMNS = (
+    PMIProfile.id, PMIProfile.company_name, PMIProfile.sector, PMIProfile.target_markets,
+    PMIProfile.company_size, PMIProfile.production_capacity, PMIProfile.business_objectives,
+)
+
+
+def _feedback_label(status: MatchStatus, pmi_rating: Optional[int], partner_rating: Optional[int]) -> Optional[float]:
+    """
+    Etichetta di addestramento di un match: 1 positivo, 0 negativo, None se non valutato.
+    
+    Le valutazioni (media >= 4 positiva, <= 2 negativa) prevalgono sullo stato.
+    """
+    ratings = [r for r in (pmi_rating, partner_rating) if r is not None]
+    if ratings:
+        mean = sum(ratings) / len(ratings)
+        if mean >= 4:
+            return 1.0
+        if mean <= 2:
+            return 0.0
+    if status in POSITIVE_MATCH_STATUSES:
+        return 1.0
+    if status == MatchStatus.REJECTED:
+        return 0.0
+    return None
+
+
+def _ranking_key(suggestion: Dict) -> Tuple[float, int]:
+    """Ordine delle classifiche salvate: score decrescente, poi ID partner crescente."""
+    return -suggestion['match_score'], suggestion['partner_id']
 
 
 class MatchingService:
@@ -25,7 +451,7 @@ class MatchingService:
     
     def __init__(self, db: Session):
         self.db = db
-        self.engine = BusinessMatchingEngine()
+        self.engine = get_matching_engine()
     
     def _prepare_pmi_data(self, pmi_profile: PMIProfile) -> Dict:
         """
@@ -53,39 +479,63 @@ class MatchingService:
             'business_objectives': business_objectives
         }
     
-    def _prepare_partner_data(self, partner_profile: PartnerProfile) -> Dict:
+    def _prepare_partner_data(self, partner_profile) -> Dict:
         """
         Prepara i dati del Partner per l'algoritmo di matching.
-        """
-        # Parse JSON fields
-        try:
-            services_offered = json.loads(partner_profile.services_offered) if partner_profile.services_offered else []
-        except:
-            services_offered = []
-        
-        try:
-            sectors_expertise = json.loads(partner_profile.sectors_expertise) if partner_profile.sectors_expertise else []
-        except:
-            sectors_expertise = []
         
+        Accetta sia un PartnerProfile sia una riga con PARTNER_SNAPSHOT_COLUMNS;
+        paese, tipo, settori e servizi vengono internati, dato che si ripetono
+        su migliaia di partner.
+        """
         return {
             'id': partner_profile.id,
             'company_name': partner_profile.company_name,
-            'country': partner_profile.country or '',
+            'country': sys.intern(partner_profile.country or ''),
             'city': partner_profile.city or '',
-            'partner_type': partner_profile.partner_type or '',
-            'sectors_expertise': sectors_expertise,
-            'services_offered': services_offered,
+            'partner_type': sys.intern(partner_profile.partner_type or ''),
+            'sectors_expertise': _parse_json_list(partner_profile.sectors_expertise),
+            'services_offered': _parse_json_list(partner_profile.services_offered),
             'description': partner_profile.description or ''
         }
     
-    def find_matches_for_pmi(self, pmi_id: int, limit: int = 10) -> List[Dict]:
+    def _load_public_partners(self) -> List[Dict]:
+        """
+        Carica e prepara i dati di tutti i partner pubblici (solo le colonne usate).
+        """
+        rows = self.db.query(*PARTNER_SNAPSHOT_COLUMNS).filter(
+            PartnerProfile.is_public == True
+        ).order_by(PartnerProfile.id)
+        return [self._prepare_partner_data(row) for row in rows]
+    
+    def encode_public_partners(self) -> "PartnerFeatureMatrix":
+        """
+        Codifica tutti i partner pubblici leggendoli dal database.
+        
+        Per le richieste usare get_partner_snapshot, che riusa la codifica
+        finché i partner non cambiano.
+        """
+        return self.engine.encode_partners(self._load_public_partners())
+    
+    def encode_pmis(self) -> "PMIFeatureMatrix":
+        """
+        Codifica tutte le PMI per il matching inverso leggendole dal database.
+        
+        Per le richieste usare get_pmi_snapshot, che riusa la codifica
+        finché le PMI non cambiano.
+        """
+        rows = self.db.query(*PMI_MATCHING_COLUMNS).order_by(PMIProfile.id)
+        return self.engine.encode_pmis([self._prepare_pmi_data(row) for row in rows])
+    
+    def find_matches_for_pmi(self, pmi_id: int, limit: int = 10, explain: bool = True,
+                             weights: Optional["MatchWeights"] = None) -> List[Dict]:
         """
         Trova i migliori match per una PMI.
         
         Args:
             pmi_id: ID del profilo PMI
             limit: Numero massimo di match da restituire
+            explain: Se False le spiegazioni non vengono generate (vedi explain_match)
+            weights: Pesi da usare (default: quelli in uso nell'engine)
         
         Returns:
             Lista di match con score e spiegazioni
@@ -95,23 +545,431 @@ class MatchingService:
         if not pmi_profile:
             return []
         
-        # Carica tutti i partner attivi e pubblici
-        partners = self.db.query(PartnerProfile).filter(
-            PartnerProfile.is_public == True
-        ).all()
+        # Partner pubblici già codificati (snapshot condiviso nel processo)
+        features = get_partner_snapshot(self)
         
-        if not partners:
+        if not features.size:
             return []
         
         # Prepara dati per l'algoritmo
         pmi_data = self._prepare_pmi_data(pmi_profile)
-        partners_data = [self._prepare_partner_data(p) for p in partners]
         
-        # Esegui matching
-        matches = self.engine.find_best_matches(pmi_data, partners_data, top_n=limit)
+        # Idf stimati sull'intero corpus dei partner
+        self.engine.keyword_index = get_keyword_index(self.db)
+        
+        # Esegui matching (scoring vettoriale su tutti i partner)
+        matches = self.engine.find_best_matches_batch(pmi_data, features, top_n=limit, explain=explain, weights=weights)
         
         return matches
     
+    def find_pmis_for_partner(self, partner_id: int, limit: int = 10) -> List[Dict]:
+        """
+        Matching inverso: trova le PMI più compatibili con un partner.
+        
+        Lo scoring è quello di find_matches_for_pmi con i ruoli invertiti, in
+        una passata vettoriale sullo snapshot delle PMI già codificate.
+        
+        Args:
+            partner_id: ID del profilo partner
+            limit: Numero massimo di PMI da restituire
+        
+        Returns:
+            Lista di match (pmi_id, pmi_name, match_score, breakdown, pmi_data)
+        """
+        partner_row = self.db.query(*PARTNER_SNAPSHOT_COLUMNS).filter(
+            PartnerProfile.id == partner_id
+        ).first()
+        if partner_row is None:
+            return []
+        
+        pmis = get_pmi_snapshot(self)
+        if not pmis.size:
+            return []
+        
+        self.engine.keyword_index = get_keyword_index(self.db)
+        return self.engine.find_best_pmis_batch(self._prepare_partner_data(partner_row), pmis, top_n=limit)
+    
+    def explain_match(self, breakdown: Dict, pmi_profile: PMIProfile, partner_profile: PartnerProfile,
+                      language: str = 'it') -> str:
+        """
+        Genera la spiegazione di un match da mostrare.
+        
+        Le spiegazioni non vengono salvate con i suggerimenti precalcolati: si
+        generano solo per i match restituiti, nella lingua richiesta.
+        """
+        return self.engine.generate_match_explanation(
+            breakdown,
+            {'sector': pmi_profile.sector or ''},
+            {'country': partner_profile.country or ''},
+            language
+        )
+    
+    @staticmethod
+    def _serialize_suggestions(matches: List[Dict]) -> str:
+        """
+        Serializza i match per il salvataggio (senza dati del partner né spiegazione).
+        """
+        return json.dumps([
+            {
+                'partner_id': m['partner_id'],
+                'partner_name': m['partner_name'],
+                'match_score': m['match_score'],
+                'breakdown': m['breakdown']
+            }
+            for m in matches
+        ])
+    
+    def _store_suggestions(
+        self,
+        pmi_id: int,
+        matches: List[Dict],
+        computed_at: datetime,
+        weights_version: Optional[int],
+        suggestion_set: Optional[MatchSuggestionSet] = None
+    ) -> MatchSuggestionSet:
+        """
+        Crea o aggiorna i suggerimenti precalcolati di una PMI (senza commit).
+        
+        weights_version è la versione dei pesi con cui sono stati calcolati i match.
+        """
+        if suggestion_set is None:
+            suggestion_set = MatchSuggestionSet(pmi_id=pmi_id)
+            self.db.add(suggestion_set)
+        
+        suggestion_set.suggestions = self._serialize_suggestions(matches)
+        suggestion_set.computed_at = computed_at
+        suggestion_set.weights_version = weights_version
+        return suggestion_set
+    
+    def refresh_suggestions(self, pmi_ids: List[int], features: Optional["PartnerFeatureMatrix"] = None) -> int:
+        """
+        Ricalcola e salva i suggerimenti precalcolati per un blocco di PMI.
+        
+        Args:
+            pmi_ids: ID dei profili PMI da aggiornare
+            features: Partner già codificati (se None si usa lo snapshot del processo)
+        
+        Returns:
+            Numero di PMI aggiornate
+        """
+        if features is None:
+            features = get_partner_snapshot(self)
+        self.engine.keyword_index = get_keyword_index(self.db)
+        
+        pmi_profiles = self.db.query(PMIProfile).filter(PMIProfile.id.in_(pmi_ids)).all()
+        weights = self.engine.weights
+        computed_at = datetime.now(timezone.utc)
+        results = {
+            pmi_profile.id: self.engine.find_best_matches_batch(
+                self._prepare_pmi_data(pmi_profile),
+                features,
+                top_n=settings.MATCHING_PRECOMPUTED_TOP_N,
+                explain=False,
+                weights=weights
+            )
+            for pmi_profile in pmi_profiles
+        }
+        
+        try:
+            self._commit_suggestion_batch(pmi_ids, results, computed_at, weights.version)
+        except IntegrityError:
+            # Una richiesta concorrente (get_suggestions_for_pmi) ha salvato per prima
+            # i suggerimenti di una PMI del blocco: si riprova aggiornando la sua riga
+            self.db.rollback()
+            self._commit_suggestion_batch(pmi_ids, results, computed_at, weights.version)
+        return len(pmi_profiles)
+    
+    def _commit_suggestion_batch(self, pmi_ids: List[int], results: Dict[int, List[Dict]],
+                                 computed_at: datetime, weights_version: Optional[int]):
+        """Salva i suggerimenti calcolati per un blocco di PMI e rimuove quelli delle PMI non più esistenti."""
+        existing = {
+            suggestion_set.pmi_id: suggestion_set
+            for suggestion_set in self.db.query(MatchSuggestionSet).filter(
+                MatchSuggestionSet.pmi_id.in_(pmi_ids)
+            )
+        }
+        for pmi_id, matches in results.items():
+            self._store_suggestions(pmi_id, matches, computed_at, weights_version, existing.pop(pmi_id, None))
+        
+        # Suggerimenti di PMI non più esistenti
+        for suggestion_set in existing.values():
+            self.db.delete(suggestion_set)
+        
+        self.db.commit()
+    
+    def patch_suggestions_for_partners(self, partner_ids: List[int], exclude_pmi_ids=()) -> int:
+        """
+        Aggiorna in place i suggerimenti precalcolati dopo la modifica di alcuni partner.
+        
+        Ogni partner modificato viene riscorato contro tutte le PMI con suggerimenti
+        salvati e inserito, spostato o rimosso dalla loro classifica. Se la coda di
+        una classifica piena peggiora (un partner esce o scende in fondo), il posto
+        potrebbe spettare a un partner non presente nella lista: quella PMI viene
+        ricalcolata da zero, come quelle calcolate con pesi diversi da quelli in uso
+        (per non mescolare nella stessa classifica score di due versioni).
+        
+        Args:
+            partner_ids: ID dei partner modificati (anche eliminati o resi privati)
+            exclude_pmi_ids: PMI già ricalcolate da zero, da non modificare
+        
+        Returns:
+            Numero di PMI i cui suggerimenti sono cambiati
+        """
+        partner_ids = set(partner_ids)
+        exclude_pmi_ids = set(exclude_pmi_ids)
+        partners = [
+            self._prepare_partner_data(p)
+            for p in self.db.query(PartnerProfile).filter(
+                PartnerProfile.id.in_(partner_ids),
+                PartnerProfile.is_public == True
+            )
+        ]
+        self.engine.keyword_index = get_keyword_index(self.db)
+        weights = self.engine.weights
+        
+        top_n = settings.MATCHING_PRECOMPUTED_TOP_N
+        computed_at = datetime.now(timezone.utc)
+        stale_pmi_ids = []
+        patched = 0
+        
+        query = self.db.query(MatchSuggestionSet, PMIProfile).join(
+            PMIProfile, PMIProfile.id == MatchSuggestionSet.pmi_id
+        )
+        for suggestion_set, pmi_profile in query.yield_per(500):
+            if pmi_profile.id in exclude_pmi_ids:
+                continue
+            if suggestion_set.weights_version != weights.version:
+                stale_pmi_ids.append(pmi_profile.id)
+                continue
+            
+            suggestions = json.loads(suggestion_set.suggestions)
+            previous_ids = {s['partner_id'] for s in suggestions} & partner_ids
+            merged = [s for s in suggestions if s['partner_id'] not in partner_ids]
+            
+            pmi_data = self._prepare_pmi_data(pmi_profile)
+            for partner in partners:
+                _, breakdown = self.engine.calculate_match_score(pmi_data, partner, weights)
+                if breakdown['total_score'] < settings.MATCHING_MIN_SCORE:
+                    continue
+                merged.append({
+                    'partner_id': partner['id'],
+                    'partner_name': partner['company_name'],
+                    'match_score': breakdown['total_score'],
+                    'breakdown': breakdown
+                })
+            
+            # A parità di score vince l'ID più basso, come nel ricalcolo completo
+            merged.sort(key=_ranking_key)
+            merged = merged[:top_n]
+            
+            # I partner fuori da una classifica piena stanno tutti dopo la sua coda:
+            # se la nuova coda è peggiore della vecchia, uno di loro potrebbe superarla
+            if len(suggestions) >= top_n and (
+                len(merged) < top_n or _ranking_key(merged[-1]) > _ranking_key(suggestions[-1])
+            ):
+                stale_pmi_ids.append(pmi_profile.id)
+                continue
+            
+            if previous_ids or {s['partner_id'] for s in merged} & partner_ids:
+                suggestion_set.suggestions = json.dumps(merged)
+                suggestion_set.computed_at = computed_at
+                patched += 1
+        
+        self.db.commit()
+        
+        if stale_pmi_ids:
+            self.refresh_suggestions(stale_pmi_ids)
+        
+        return patched + len(stale_pmi_ids)
+    
+    def _write_feedback_samples(self, matches: List, samples, offset: int) -> int:
+        """
+        Scrive in samples (da offset) i sotto-punteggi e l'etichetta dei match valutati.
+        
+        Returns:
+            Nuovo offset
+        """
+        pmis = {
+            row.id: self._prepare_pmi_data(row)
+            for row in self.db.query(*PMI_MATCHING_COLUMNS).filter(
+                PMIProfile.id.in_({m.pmi_id for m in matches})
+            )
+        }
+        partners = {
+            row.id: self._prepare_partner_data(row)
+            for row in self.db.query(*PARTNER_SNAPSHOT_COLUMNS).filter(
+                PartnerProfile.id.in_({m.partner_id for m in matches})
+            )
+        }
+        
+        for match in matches:
+            label = _feedback_label(match.status, match.pmi_rating, match.partner_rating)
+            if label is None or match.pmi_id not in pmis or match.partner_id not in partners:
+                continue
+            _, breakdown = self.engine.calculate_match_score(pmis[match.pmi_id], partners[match.partner_id])
+            samples[offset, :-1] = [
+                breakdown['sector_score'], breakdown['country_score'], breakdown['service_score'],
+                breakdown['size_score'], breakdown['keyword_score'],
+            ]
+            samples[offset, :-1] /= 100
+            samples[offset, -1] = label
+            offset += 1
+        return offset
+    
+    def train_weights(self, chunk_size: int = 1000) -> Dict:
+        """
+        Stima i pesi dello score dal feedback sui BusinessMatch e li salva come nuova versione.
+        
+        I match valutati (stato accettato/rifiutato o con rating) vengono letti a
+        blocchi di chunk_size; i loro sotto-punteggi finiscono in un file
+        temporaneo mappato in memoria, su cui la regressione logistica esegue
+        le sue passate sempre a blocchi. I nuovi pesi vengono caricati da ogni
+        processo alla successiva richiesta dell'engine (vedi get_matching_engine).
+        
+        Args:
+            chunk_size: Righe lette e elaborate per blocco
+        
+        Returns:
+            Dizionario con esito, numero di campioni e pesi salvati
+        """
+        import numpy as np
+        weight_training = _ai_module("weight_training")
+        
+        self.engine.keyword_index = get_keyword_index(self.db)
+        
+        query = self.db.query(
+            BusinessMatch.id, BusinessMatch.pmi_id, BusinessMatch.partner_id,
+            BusinessMatch.status, BusinessMatch.pmi_rating, BusinessMatch.partner_rating
+        ).filter(or_(
+            BusinessMatch.status != MatchStatus.SUGGESTED,
+            BusinessMatch.pmi_rating.isnot(None),
+            BusinessMatch.partner_rating.isnot(None)
+        ))
+        total = query.count()
+        if not total:
+            return {"status": "skipped", "reason": "no feedback", "samples": 0}
+        
+        os.makedirs(settings.MATCHING_DATA_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".npy", dir=settings.MATCHING_DATA_DIR)
+        os.close(fd)
+        try:
+            samples = np.lib.format.open_memmap(
+                path, mode="w+", dtype=np.float64, shape=(total, len(weight_training.WEIGHT_NAMES) + 1)
+            )
+            
+            # Paginazione per chiave: ogni blocco è una query indipendente
+            count, last_id = 0, 0
+            while True:
+                matches = query.filter(BusinessMatch.id > last_id).order_by(BusinessMatch.id).limit(chunk_size).all()
+                if not matches:
+                    break
+                count = self._write_feedback_samples(matches, samples, count)
+                last_id = matches[-1].id
+            samples.flush()
+            
+            positives = int(samples[:count, -1].sum())
+            if count < settings.MATCHING_WEIGHTS_MIN_SAMPLES or positives in (0, count):
+                return {"status": "skipped", "reason": "not enough feedback", "samples": count, "positives": positives}
+            
+            def read_chunks():
+                for start in range(0, count, chunk_size):
+                    block = np.asarray(samples[start:start + chunk_size])
+                    yield block[:, :-1], block[:, -1]
+            
+            fit = weight_training.fit_logistic_regression(read_chunks)
+            weights = weight_training.coefficients_to_weights(fit['coefficients'])
+            if weights is None:
+                return {"status": "skipped", "reason": "no positive coefficient", "samples": count, "positives": positives}
+            
+            artifact = weight_training.save_weights_artifact(_weights_dir(), weights, {
+                **fit,
+                "positives": positives,
+                "features": list(weight_training.WEIGHT_NAMES),
+            })
+        finally:
+            os.remove(path)
+        
+        logger.info(f"Matching weights v{artifact['version']} trained on {count} matches: {weights}")
+        return {"status": "completed", "version": artifact['version'], "samples": count, "weights": weights}
+    
+    def process_recompute_events(self, batch_size: int = 500) -> Dict:
+        """
+        Consuma un blocco di eventi dall'outbox e ricalcola solo il lavoro interessato.
+        
+        Le PMI modificate vengono ricalcolate contro tutti i partner; i partner
+        modificati vengono riscorati contro tutte le PMI e inseriti nelle classifiche
+        esistenti (vedi patch_suggestions_for_partners).
+        
+        Args:
+            batch_size: Numero massimo di eventi da consumare
+        
+        Returns:
+            Dizionario con il numero di eventi, PMI e partner elaborati
+        """
+        events = self.db.query(MatchRecomputeEvent).order_by(
+            MatchRecomputeEvent.id
+        ).limit(batch_size).all()
+        
+        if not events:
+            return {"events": 0, "pmis": 0, "partners": 0}
+        
+        pmi_ids = sorted({e.entity_id for e in events if e.entity_type == "pmi"})
+        partner_ids = sorted({e.entity_id for e in events if e.entity_type == "partner"})
+        
+        # Le modifiche ai profili possono arrivare da altri processi
+        if partner_ids:
+            invalidate_partner_snapshot()
+        if pmi_ids:
+            invalidate_pmi_snapshot()
+        
+        if pmi_ids:
+            self.refresh_suggestions(pmi_ids)
+        if partner_ids:
+            self.patch_suggestions_for_partners(partner_ids, exclude_pmi_ids=pmi_ids)
+        
+        self.db.query(MatchRecomputeEvent).filter(
+            MatchRecomputeEvent.id.in_([e.id for e in events])
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        
+        return {"events": len(events), "pmis": len(pmi_ids), "partners": len(partner_ids)}
+    
+    def get_suggestions_for_pmi(self, pmi_id: int, limit: int = 10) -> Tuple[List[Dict], datetime]:
+        """
+        Restituisce i suggerimenti precalcolati di una PMI.
+        
+        Se non sono ancora stati calcolati, esegue il matching in tempo reale e
+        salva il risultato per le richieste successive.
+        
+        Args:
+            pmi_id: ID del profilo PMI
+            limit: Numero massimo di match da restituire
+        
+        Returns:
+            Tupla (lista di match ordinati, momento del calcolo)
+        """
+        suggestion_set = self.db.query(MatchSuggestionSet).filter(
+            MatchSuggestionSet.pmi_id == pmi_id
+        ).first()
+        
+        if suggestion_set is not None:
+            return json.loads(suggestion_set.suggestions)[:limit], suggestion_set.computed_at
+        
+        weights = self.engine.weights
+        matches = self.find_matches_for_pmi(
+            pmi_id, limit=settings.MATCHING_PRECOMPUTED_TOP_N, explain=False, weights=weights
+        )
+        computed_at = datetime.now(timezone.utc)
+        self._store_suggestions(pmi_id, matches, computed_at, weights.version)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Un'altra richiesta o un blocco di refresh_suggestions ha salvato per primo
+            # i suggerimenti di questa PMI: i match appena calcolati restano validi
+            self.db.rollback()
+        
+        return matches[:limit], computed_at
+    
     def create_match(self, pmi_id: int, partner_id: int, score: float, reason: str) -> BusinessMatch:
         """
         Crea un nuovo match tra PMI e Partner.
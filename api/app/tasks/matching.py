@@ -4,13 +4,24 @@ Celery tasks for AI-powered business matching.
 These tasks handle complex matching calculations asynchronously.
 """
 
+from celery import chord
 from app.core.celery_app import celery_app
-from app.services.matching_service import MatchingService
+from app.services.matching_service import MatchingService, build_keyword_index
 from app.core.database import SessionLocal
+from app.core.settings import settings
+from app.models.user import PMIProfile
+from app.models.business import BusinessMatch
+import joblib
 import logging
+import os
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Feature dumps older than this are left over from runs that never finished
+STALE_FEATURES_DUMP_SECONDS = 24 * 3600
+
 
 @celery_app.task(bind=True, max_retries=3)
 def calculate_matches_for_user(self, user_id: int, limit: int = 10):
@@ -45,70 +56,367 @@ def calculate_matches_for_user(self, user_id: int, limit: int = 10):
 
 
 @celery_app.task(bind=True)
-def recalculate_all_matches(self):
+def recalculate_all_matches(self, chunk_size: int = None):
     """
-    Recalculate all business matches in the system.
+    Recalculate the precomputed match suggestions of every PMI.
+    
+    Public partners are encoded once and dumped next to the keyword index;
+    PMIs are then split in chunks of ``chunk_size`` ids dispatched as a chord
+    of ``recalculate_matches_chunk`` tasks, so the work spreads over every
+    worker process. Chunks memory-map the same feature matrix read-only and
+    ``summarize_match_recalculation`` reports the overall throughput; the dump
+    is removed by the callback, or by ``discard_match_features_dump`` if a
+    chunk fails for good.
     
     This is a heavy operation and should be run during off-peak hours.
     
+    Args:
+        chunk_size: Number of PMIs per chunk (default: MATCHING_RECALCULATION_CHUNK_SIZE)
+        
+    Returns:
+        Dictionary with dispatch results
+    """
+    chunk_size = chunk_size or settings.MATCHING_RECALCULATION_CHUNK_SIZE
+    try:
+        db = SessionLocal()
+        matching_service = MatchingService(db)
+        
+        pmi_ids = [row.id for row in db.query(PMIProfile.id).order_by(PMIProfile.id)]
+        if not pmi_ids:
+            return {"status": "completed", "pmis_updated": 0, "timestamp": str(datetime.now())}
+        
+        _remove_stale_feature_dumps()
+        features = matching_service.encode_public_partners()
+        run_id = self.request.id or uuid.uuid4().hex
+        features_path = os.path.join(settings.MATCHING_DATA_DIR, f"partner_features_{run_id}.joblib")
+        os.makedirs(settings.MATCHING_DATA_DIR, exist_ok=True)
+        joblib.dump(features, features_path)
+        
+        chunks = [pmi_ids[start:start + chunk_size] for start in range(0, len(pmi_ids), chunk_size)]
+        header = [
+            recalculate_matches_chunk.s(chunk, features_path, index, len(chunks))
+            for index, chunk in enumerate(chunks)
+        ]
+        callback = summarize_match_recalculation.s(features_path=features_path, started_at=time.time())
+        callback.on_error(discard_match_features_dump.s(features_path=features_path))
+        chord_result = chord(header)(callback)
+        
+        logger.info(
+            f"Dispatched match recalculation of {len(pmi_ids)} PMIs x {features.size} partners "
+            f"in {len(chunks)} chunks"
+        )
+        return {
+            "status": "dispatched",
+            "chunks": len(chunks),
+            "pmis": len(pmi_ids),
+            "partners": features.size,
+            "summary_task_id": chord_result.id,
+            "timestamp": str(datetime.now())
+        }
+        
+    except Exception as exc:
+        logger.error(f"Error recalculating all matches: {exc}")
+        raise self.retry(exc=exc, countdown=600)
+    finally:
+        db.close()
+
+
+def _remove_stale_feature_dumps():
+    """Remove feature dumps of runs that died before any callback could clean up."""
+    if not os.path.isdir(settings.MATCHING_DATA_DIR):
+        return
+    cutoff = time.time() - STALE_FEATURES_DUMP_SECONDS
+    for name in os.listdir(settings.MATCHING_DATA_DIR):
+        path = os.path.join(settings.MATCHING_DATA_DIR, name)
+        if name.startswith("partner_features_") and name.endswith(".joblib") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            logger.warning(f"Removed stale match features dump {path}")
+
+
+# Partner feature matrices memory-mapped by this worker process, by dump path
+_shared_features = {}
+
+
+def _load_shared_features(features_path: str):
+    """
+    Return the feature matrix dumped by recalculate_all_matches, if reachable.
+    
+    Numeric arrays are memory-mapped read-only, so every worker process on a
+    host shares the same pages; the last matrix loaded stays cached for the
+    following chunks of the same run.
+    """
+    features = _shared_features.get(features_path)
+    if features is None and os.path.exists(features_path):
+        features = joblib.load(features_path, mmap_mode="r")
+        _shared_features.clear()
+        _shared_features[features_path] = features
+    return features
+
+
+@celery_app.task(bind=True, max_retries=3)
+def recalculate_matches_chunk(self, pmi_ids: list, features_path: str, chunk_index: int,
+                              total_chunks: int, commit_every: int = 50):
+    """
+    Recalculate the match suggestions of one chunk of PMIs.
+    
+    Progress is published as a PROGRESS state after every ``commit_every``
+    PMIs. Workers that cannot reach ``features_path`` (e.g. on another host)
+    encode the public partners themselves.
+    
+    Args:
+        pmi_ids: IDs of the PMIs in the chunk
+        features_path: Path of the partner feature matrix dumped by the parent task
+        chunk_index: Position of the chunk in the run
+        total_chunks: Number of chunks in the run
+        commit_every: Number of PMIs refreshed per transaction
+        
+    Returns:
+        Dictionary with chunk results and throughput
+    """
+    try:
+        db = SessionLocal()
+        matching_service = MatchingService(db)
+        
+        features = _load_shared_features(features_path) or matching_service.encode_public_partners()
+        
+        started = time.perf_counter()
+        updated = 0
+        for start in range(0, len(pmi_ids), commit_every):
+            updated += matching_service.refresh_suggestions(pmi_ids[start:start + commit_every], features)
+            elapsed = time.perf_counter() - started
+            self.update_state(state="PROGRESS", meta={
+                "chunk": chunk_index,
+                "total_chunks": total_chunks,
+                "pmis_done": updated,
+                "pmis_total": len(pmi_ids),
+                "pairs_per_second": round(updated * features.size / elapsed) if elapsed else None
+            })
+        
+        elapsed = time.perf_counter() - started
+        pairs = updated * features.size
+        result = {
+            "chunk": chunk_index,
+            "pmis_updated": updated,
+            "pairs_scored": pairs,
+            "seconds": round(elapsed, 3),
+            "pairs_per_second": round(pairs / elapsed) if elapsed else None
+        }
+        
+        logger.info(
+            f"Match chunk {chunk_index + 1}/{total_chunks}: {updated} PMIs, {pairs} pairs "
+            f"in {elapsed:.1f}s ({result['pairs_per_second']} pairs/s)"
+        )
+        return result
+        
+    except Exception as exc:
+        logger.error(f"Error recalculating match chunk {chunk_index}: {exc}")
+        raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
+    finally:
+        db.close()
+
+
+@celery_app.task
+def summarize_match_recalculation(chunk_results: list, features_path: str, started_at: float):
+    """
+    Aggregate the chunk results of a recalculation run and remove its feature dump.
+    
+    Args:
+        chunk_results: Results of the recalculate_matches_chunk tasks
+        features_path: Path of the partner feature matrix dumped for the run
+        started_at: Epoch time at which the run was dispatched
+        
     Returns:
         Dictionary with recalculation results
     """
+    if os.path.exists(features_path):
+        os.remove(features_path)
+    
+    elapsed = time.time() - started_at
+    pairs = sum(chunk["pairs_scored"] for chunk in chunk_results)
+    worker_seconds = sum(chunk["seconds"] for chunk in chunk_results)
+    result = {
+        "status": "completed",
+        "chunks": len(chunk_results),
+        "pmis_updated": sum(chunk["pmis_updated"] for chunk in chunk_results),
+        "pairs_scored": pairs,
+        "elapsed_seconds": round(elapsed, 3),
+        "pairs_per_second": round(pairs / elapsed) if elapsed else None,
+        "pairs_per_worker_second": round(pairs / worker_seconds) if worker_seconds else None,
+        "timestamp": str(datetime.now())
+    }
+    
+    logger.info(
+        f"All matches recalculated: {result['pmis_updated']} PMIs, {pairs} pairs "
+        f"in {elapsed:.1f}s ({result['pairs_per_second']} pairs/s)"
+    )
+    return result
+
+
+@celery_app.task
+def discard_match_features_dump(request, exc, traceback, features_path: str):
+    """
+    Error callback of a recalculation run: remove its feature dump.
+    
+    Called when a chunk fails after its retries, since the chord callback
+    that normally removes the dump then never runs.
+    
+    Args:
+        request: Request of the failed task
+        exc: Exception raised
+        traceback: Traceback of the exception
+        features_path: Path of the partner feature matrix dumped for the run
+    """
+    if os.path.exists(features_path):
+        os.remove(features_path)
+    logger.error(f"Match recalculation failed ({exc}); removed features dump {features_path}")
+
+
+@celery_app.task(bind=True)
+def process_match_recompute_events(self, batch_size: int = 500):
+    """
+    Apply pending profile changes to the precomputed match suggestions.
+    
+    Drains the MatchRecomputeEvent outbox written by the PMIProfile and
+    PartnerProfile change listeners, so only affected rankings are rescored.
+    
+    Args:
+        batch_size: Maximum number of events to consume per run
+        
+    Returns:
+        Dictionary with processing results
+    """
     try:
         db = SessionLocal()
-        matching_service = MatchingService()
+        matching_service = MatchingService(db)
+        
+        result = matching_service.process_recompute_events(batch_size=batch_size)
+        
+        if result["events"]:
+            logger.info(
+                f"Processed {result['events']} match recompute events "
+                f"({result['pmis']} PMIs, {result['partners']} partners)"
+            )
+        return result
+        
+    except Exception as exc:
+        logger.error(f"Error processing match recompute events: {exc}")
+        raise self.retry(exc=exc, countdown=60)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True)
+def rebuild_keyword_index(self):
+    """
+    Rebuild the partner description TF-IDF index from scratch.
+    
+    Incremental updates reuse the vocabulary and idf weights estimated at the
+    last full build, so the index is periodically refitted on the whole corpus.
+    
+    Returns:
+        Dictionary with rebuild results
+    """
+    try:
+        db = SessionLocal()
+        index = build_keyword_index(db)
         
-        # This would iterate through all users and recalculate their matches
         result = {
             "status": "completed",
-            "message": "All matches recalculated successfully",
+            "partners_indexed": len(index.row_by_id),
             "timestamp": str(datetime.now())
         }
         
-        logger.info("All matches recalculated successfully")
+        logger.info(f"Partner keyword index rebuilt with {len(index.row_by_id)} partners")
         return result
         
     except Exception as exc:
-        logger.error(f"Error recalculating all matches: {exc}")
+        logger.error(f"Error rebuilding partner keyword index: {exc}")
+        raise self.retry(exc=exc, countdown=600)
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True)
+def train_match_weights(self, chunk_size: int = 1000):
+    """
+    Fit the matching weights on BusinessMatch feedback and version the result.
+    
+    Accepted/rejected statuses and PMI/partner ratings are streamed in chunks;
+    the new weights are stored under MATCHING_DATA_DIR/weights, reloaded by
+    every process on its next use of the matching engine, and a full
+    recalculation is queued so stored suggestions all use the new version.
+    
+    Args:
+        chunk_size: Number of matches read per chunk
+        
+    Returns:
+        Dictionary with training results
+    """
+    try:
+        db = SessionLocal()
+        matching_service = MatchingService(db)
+        
+        result = matching_service.train_weights(chunk_size=chunk_size)
+        result["timestamp"] = str(datetime.now())
+        
+        logger.info(f"Match weight training {result['status']} ({result['samples']} samples)")
+        if result["status"] == "completed":
+            result["recalculation_task_id"] = recalculate_all_matches.delay().id
+        return result
+        
+    except Exception as exc:
+        logger.error(f"Error training match weights: {exc}")
         raise self.retry(exc=exc, countdown=600)
     finally:
         db.close()
 
 
 @celery_app.task(bind=True)
-def update_match_feedback(self, match_id: int, rating: int, feedback: str = None):
+def update_match_feedback(self, match_id: int, rating: int, feedback: str = None, rated_by: str = "pmi"):
     """
-    Update match feedback and retrain algorithm.
+    Store a rating (and optional notes) on a match.
+    
+    Ratings saved on BusinessMatch are read by train_match_weights to
+    retrain the matching weights.
     
     Args:
         match_id: ID of the match
         rating: User rating (1-5)
         feedback: Optional feedback text
+        rated_by: Side giving the feedback, "pmi" or "partner"
         
     Returns:
         Dictionary with update results
     """
+    if rated_by not in ("pmi", "partner"):
+        raise ValueError(f"Invalid rated_by: {rated_by}")
+    
+    db = SessionLocal()
     try:
-        db = SessionLocal()
-        matching_service = MatchingService()
+        match = db.query(BusinessMatch).filter(BusinessMatch.id == match_id).first()
+        if match is None:
+            logger.warning(f"Feedback for unknown match {match_id} ignored")
+            return {"match_id": match_id, "status": "not_found"}
         
-        # Update feedback in database
-        result = {
+        setattr(match, f"{rated_by}_rating", rating)
+        if feedback:
+            setattr(match, f"{rated_by}_notes", feedback)
+        db.commit()
+        
+        logger.info(f"Feedback recorded for match {match_id} with rating {rating} ({rated_by})")
+        return {
             "match_id": match_id,
             "rating": rating,
             "status": "feedback_recorded",
             "message": "Match feedback recorded and will be used to improve future matches"
         }
         
-        logger.info(f"Feedback recorded for match {match_id} with rating {rating}")
-        return result
-        
     except Exception as exc:
+        db.rollback()
         logger.error(f"Error updating match feedback: {exc}")
         raise self.retry(exc=exc, countdown=60)
     finally:
         db.close()
 
-
 from datetime import datetime
 
@@ -0,0 +1,47 @@
+"""
+Fixture comuni dei test dell'API.
+
+L'applicazione legge la configurazione all'import: matching_app imposta
+database SQLite e cartelle dati in una directory temporanea della sessione
+prima di importarla, e ripristina ambiente e sys.path alla fine.
+"""
+
+import importlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+@pytest.fixture(scope="session")
+def matching_app(tmp_path_factory):
+    """
+    Applicazione FastAPI configurata per i test del matching.
+
+    Restituisce app, database e servizio di matching, più populate_database
+    dei generatori sintetici dei benchmark.
+    """
+    workdir = tmp_path_factory.mktemp("matching")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DATABASE_URL", f"sqlite:///{workdir / 'test.sqlite'}")
+        mp.setenv("MATCHING_DATA_DIR", str(workdir / "matching"))
+        mp.setenv("UPLOAD_DIR", str(workdir / "uploads"))
+        mp.setenv("MATCHING_WARMUP_ON_STARTUP", "false")
+        mp.setenv("LOG_LEVEL", "WARNING")
+        mp.syspath_prepend(str(ROOT / "benchmarks"))
+        mp.syspath_prepend(str(ROOT / "api"))
+
+        main = importlib.import_module("app.main")
+        database = importlib.import_module("app.core.database")
+        yield SimpleNamespace(
+            app=main.app,
+            database=database,
+            dependencies=importlib.import_module("app.core.dependencies"),
+            matching_service=importlib.import_module("app.services.matching_service"),
+            models=importlib.import_module("app.models.user"),
+            populate_database=importlib.import_module("synthetic").populate_database,
+            data_dir=workdir / "matching",
+        )
+        database.engine.dispose()
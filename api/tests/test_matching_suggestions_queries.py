@@ -0,0 +1,75 @@
+"""
+Regressione sul numero di query SQL di GET /api/v1/matching/suggestions.
+
+Alla prima richiesta di una PMI i suggerimenti vengono calcolati in tempo
+reale e salvati, alle successive vengono letti già pronti: in entrambi i
+casi il numero di statement non deve dipendere da quante PMI e quanti
+partner ci sono nel database (nessun N+1) né dal limit richiesto.
+
+Uso:
+    cd api && python -m pytest -q tests
+"""
+
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+# Statement massimi per richiesta: prima richiesta di una PMI (calcolo e salvataggio) e successive
+COLD_STATEMENTS = 8
+WARM_STATEMENTS = 3
+
+
+def _reset_matching_state(env):
+    db_engine = env.database.engine
+    env.database.Base.metadata.drop_all(bind=db_engine)
+    env.database.Base.metadata.create_all(bind=db_engine)
+    shutil.rmtree(env.data_dir, ignore_errors=True)
+    env.matching_service._keyword_index = None
+    env.matching_service.invalidate_partner_snapshot()
+    env.matching_service.invalidate_pmi_snapshot()
+
+
+@pytest.fixture
+def count_statements(matching_app):
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db_engine = matching_app.database.engine
+    event.listen(db_engine, "before_cursor_execute", on_execute)
+    yield statements
+    event.remove(db_engine, "before_cursor_execute", on_execute)
+
+
+@pytest.mark.parametrize("limit", [1, 10, 50])
+@pytest.mark.parametrize("pmis, partners", [(5, 50), (20, 500)])
+def test_statement_count_does_not_grow_with_data(matching_app, count_statements, pmis, partners, limit):
+    env = matching_app
+    _reset_matching_state(env)
+    db = env.database.SessionLocal()
+    user_ids = env.populate_database(db, pmis, partners)
+    users = {u.id: u for u in db.query(env.models.User).filter(env.models.User.id.in_(user_ids))}
+    db.expunge_all()
+    db.close()
+
+    app = env.app
+    client = TestClient(app)
+    counts = {"cold": [], "warm": []}
+    try:
+        for phase in counts:
+            for user_id in user_ids:
+                app.dependency_overrides[env.dependencies.require_pmi] = lambda user=users[user_id]: user
+                count_statements.clear()
+                response = client.get(f"/api/v1/matching/suggestions?limit={limit}")
+                assert response.status_code == 200, response.text
+                assert len(response.json()["matches"]) <= limit
+                counts[phase].append(len(count_statements))
+    finally:
+        app.dependency_overrides.clear()
+
+    # La prima richiesta dopo il reset costruisce anche snapshot e indice dei partner
+    assert max(counts["cold"]) == COLD_STATEMENTS, counts["cold"]
+    assert max(counts["warm"]) == WARM_STATEMENTS, counts["warm"]
@@ -0,0 +1,90 @@
+"""
+Misura le allocazioni per richiesta del matching, prima e dopo l'engine condiviso.
+
+"prima": ogni richiesta crea un BusinessMatchingEngine (e il suo TfidfVectorizer),
+decodifica i campi JSON dei partner e li codifica prima dello scoring.
+"dopo": engine e snapshot dei partner vengono creati una volta sola e la
+richiesta esegue solo lo scoring.
+
+Uso:
+    python benchmarks/matching_allocations.py [--partners 10000] [--requests 20]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai_models"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from matching_algorithm import BusinessMatchingEngine
+from matching_batch import PMI
+from synthetic import generate_partners
+
+
+def to_rows(partners):
+    """Partner come arrivano dal database, con le liste serializzate in JSON."""
+    return [
+        dict(p, sectors_expertise=json.dumps(p['sectors_expertise']),
+             services_offered=json.dumps(p['services_offered']))
+        for p in partners
+    ]
+
+
+def request_before(rows, top_n):
+    engine = BusinessMatchingEngine()
+    partners = [
+        dict(r, sectors_expertise=json.loads(r['sectors_expertise']),
+             services_offered=json.loads(r['services_offered']))
+        for r in rows
+    ]
+    return engine.find_best_matches_batch(PMI, partners, top_n=top_n)
+
+
+def make_request_after(partners):
+    engine = BusinessMatchingEngine()
+    features = engine.encode_partners(partners)
+
+    def request_after(rows, top_n):
+        return engine.find_best_matches_batch(PMI, features, top_n=top_n)
+    return request_after
+
+
+def measure(request, rows, requests, top_n):
+    request(rows, top_n)  # riscaldamento (import, cache)
+    tracemalloc.start()
+    peaks, retained = [], []
+    start = time.perf_counter()
+    for _ in range(requests):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        request(rows, top_n)
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current - before)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return max(peaks), sum(retained) / requests, elapsed / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--partners', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--top-n', type=int, default=50)
+    args = parser.parse_args()
+
+    partners = generate_partners(args.partners)
+    rows = to_rows(partners)
+
+    print(f"{'path':>8} {'peak_kib':>10} {'retained_kib':>13} {'ms/request':>11}")
+    for name, request in (('before', request_before), ('after', make_request_after(partners))):
+        peak, retained, seconds = measure(request, rows, args.requests, args.top_n)
+        print(f"{name:>8} {peak / 1024:>10.1f} {retained / 1024:>13.1f} {seconds * 1000:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
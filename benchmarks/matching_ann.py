@@ -0,0 +1,69 @@
+"""
+Recall della modalità ANN di BusinessMatchingEngine rispetto allo scoring esatto.
+
+Per ogni PMI sintetica confronta i top-k di find_best_matches_batch con e senza
+ann_candidates. Un risultato ANN conta come corretto se il suo score raggiunge
+il k-esimo score esatto (così i pari merito non penalizzano il recall).
+
+Uso:
+    python benchmarks/matching_ann.py [--sizes 10000 100000] [--candidates 300] [--backends ivf hnsw]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai_models"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import ann_index
+from matching_algorithm import BusinessMatchingEngine
+from synthetic import generate_partners, generate_pmis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--candidates', type=int, default=300)
+    parser.add_argument('--backends', nargs='+', default=['ivf', 'hnsw'])
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--top-n', type=int, default=10)
+    args = parser.parse_args()
+
+    backends = [b for b in args.backends if b != 'hnsw' or ann_index.hnswlib is not None]
+    pmis = generate_pmis(args.queries)
+    print(f"{'partners':>10} {'backend':>8} {'build_s':>8} {'exact_ms':>9} {'ann_ms':>8} {'recall@' + str(args.top_n):>10}")
+
+    for size in args.sizes:
+        exact_engine = BusinessMatchingEngine()
+        features = exact_engine.encode_partners(generate_partners(size))
+
+        start = time.perf_counter()
+        exact = [exact_engine.find_best_matches_batch(pmi, features, top_n=args.top_n) for pmi in pmis]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(pmis)
+
+        for backend in backends:
+            engine = BusinessMatchingEngine()
+            engine.ann_candidates = args.candidates
+            engine.ann_backend = backend
+            features.ann_index = None
+
+            start = time.perf_counter()
+            engine.build_ann_index(features)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            approximate = [engine.find_best_matches_batch(pmi, features, top_n=args.top_n) for pmi in pmis]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(pmis)
+
+            hits = total = 0
+            for exact_matches, ann_matches in zip(exact, approximate):
+                threshold = exact_matches[-1]['match_score']
+                hits += sum(1 for m in ann_matches if m['match_score'] >= threshold)
+                total += len(exact_matches)
+            print(f"{size:>10} {backend:>8} {build_time:>8.2f} {exact_ms:>9.2f} {ann_ms:>8.2f} {hits / total:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
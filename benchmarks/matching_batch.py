@@ -0,0 +1,76 @@
+"""
+Benchmark dello scoring vettoriale di BusinessMatchingEngine.
+
+Confronta find_best_matches (scalare) con find_best_matches_batch su popolazioni
+sintetiche di 1k/10k/100k partner e verifica che i breakdown coincidano.
+
+Uso:
+    python benchmarks/matching_batch.py [--sizes 1000 10000 100000] [--scalar-limit 10000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ai_models"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from matching_algorithm import BusinessMatchingEngine
+from synthetic import generate_partners
+
+PMI = {
+    'id': 1,
+    'company_name': 'Italian Agritech SRL',
+    'sector': 'agritech',
+    'target_markets': ['Kenya', 'Tanzania'],
+    'business_needs': ['distributor', 'logistics'],
+    'company_size': 'small',
+    'production_capacity': 'medium',
+    'business_objectives': 'Expand agricultural equipment distribution in east africa',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--scalar-limit', type=int, default=10000,
+                        help='Dimensione massima per cui eseguire anche il path scalare')
+    parser.add_argument('--top-n', type=int, default=10)
+    args = parser.parse_args()
+
+    engine = BusinessMatchingEngine()
+    print(f"{'partners':>10} {'encode_s':>10} {'batch_s':>10} {'scalar_s':>10} {'speedup':>8} {'equal':>6}")
+
+    for size in args.sizes:
+        partners = generate_partners(size)
+
+        start = time.perf_counter()
+        features = engine.encode_partners(partners)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_matches = engine.find_best_matches_batch(PMI, features, top_n=args.top_n)
+        batch_time = time.perf_counter() - start
+
+        scalar_time = None
+        equal = '-'
+        if size <= args.scalar_limit:
+            start = time.perf_counter()
+            engine.find_best_matches(PMI, partners, top_n=args.top_n)
+            scalar_time = time.perf_counter() - start
+
+            scores = engine.calculate_match_scores_batch(PMI, features)
+            equal = all(
+                engine.calculate_match_score(PMI, partner)[1] == engine._breakdown_at(scores, i)
+                for i, partner in enumerate(partners)
+            )
+
+        assert len(batch_matches) == min(args.top_n, size)
+        speedup = f"{scalar_time / batch_time:.1f}x" if scalar_time else '-'
+        scalar_str = f"{scalar_time:.3f}" if scalar_time else '-'
+        print(f"{size:>10} {encode_time:>10.3f} {batch_time:>10.3f} {scalar_str:>10} {speedup:>8} {str(equal):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Latenza del rate limiting: due BaseHTTPMiddleware contro un solo middleware ASGI.
+
+"prima": RateLimitMiddleware e StrictRateLimitMiddleware come BaseHTTPMiddleware
+(implementazione precedente), registrati entrambi come in main.py.
+"dopo": RateLimitMiddleware ASGI di app.core.rate_limiter.
+
+Entrambi gli stack usano il limiter in memoria con limiti alti (nessuna
+richiesta rifiutata), davanti a un endpoint JSON minimo; le richieste sono
+inviate in parallelo con httpx sull'app ASGI, senza rete.
+
+Uso:
+    python benchmarks/rate_limit_middleware.py [--requests 5000] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.rate_limiter import DistributedRateLimiter, RateLimitMiddleware
+
+LIMIT = 10 ** 9
+
+
+class BaseRateLimitMiddleware(BaseHTTPMiddleware):
+    """Middleware generale precedente."""
+
+    def __init__(self, app, requests_per_minute: int = 60):
+        super().__init__(app)
+        self.rate_limiter = DistributedRateLimiter("general", requests_per_minute)
+        self.excluded_paths = ["/docs", "/redoc", "/openapi.json", "/health"]
+
+    async def dispatch(self, request, call_next):
+        if any(request.url.path.startswith(path) for path in self.excluded_paths):
+            return await call_next(request)
+        client_ip = request.client.host
+        is_allowed, remaining = await self.rate_limiter.is_allowed(client_ip)
+        if not is_allowed:
+            return JSONResponse(status_code=429, content={"detail": "Too many requests."})
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(self.rate_limiter.requests_per_minute)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        return response
+
+
+class BaseStrictRateLimitMiddleware(BaseHTTPMiddleware):
+    """Middleware per endpoint sensibili precedente."""
+
+    def __init__(self, app, requests_per_minute: int = 10):
+        super().__init__(app)
+        self.rate_limiter = DistributedRateLimiter("auth", requests_per_minute)
+        self.sensitive_paths = ["/api/v1/auth/login", "/api/v1/auth/register"]
+
+    async def dispatch(self, request, call_next):
+        if not any(request.url.path == path for path in self.sensitive_paths):
+            return await call_next(request)
+        is_allowed, _ = await self.rate_limiter.is_allowed(request.client.host)
+        if not is_allowed:
+            return JSONResponse(status_code=429, content={"detail": "Too many authentication attempts."})
+        return await call_next(request)
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/market/reports")
+    def list_reports():
+        return {"total": 0, "reports": []}
+
+    if stack == 'before':
+        app.add_middleware(BaseRateLimitMiddleware, requests_per_minute=LIMIT)
+        app.add_middleware(BaseStrictRateLimitMiddleware, requests_per_minute=LIMIT)
+    else:
+        app.add_middleware(RateLimitMiddleware, requests_per_minute=LIMIT, auth_requests_per_minute=LIMIT)
+    return app
+
+
+async def run(app, requests: int, concurrency: int):
+    """Latenze (ms) di requests richieste con concurrency richieste in volo."""
+    latencies = []
+    queue = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for _ in queue:
+                start = time.perf_counter()
+                response = await client.get("/api/v1/market/reports")
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200
+
+        await client.get("/api/v1/market/reports")  # riscaldamento
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'stack':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'req/s':>8}")
+    for stack in ('before', 'after'):
+        latencies, elapsed = asyncio.run(run(build_app(stack), args.requests, args.concurrency))
+        print(f"{stack:>8} {statistics.median(latencies):>8.3f} {np.percentile(latencies, 95):>8.3f} "
+              f"{np.percentile(latencies, 99):>8.3f} {args.requests / elapsed:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark del RateLimiter in memoria, prima e dopo lo stato GCRA.
+
+"prima": per ogni IP una lista di datetime filtrata a ogni richiesta, con
+pulizia periodica di tutte le chiavi (implementazione originale).
+"dopo": RateLimiter di app.core.rate_limiter, un solo TAT per chiave in un LRU.
+
+Il traffico è una sequenza di richieste da --ips indirizzi distinti, con
+una quota di client che superano il limite.
+
+Uso:
+    python benchmarks/rate_limiter.py [--ips 10000] [--requests 500000]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "api"))
+
+from app.core.rate_limiter import RateLimiter
+
+
+class ListRateLimiter:
+    """Implementazione originale (liste di timestamp per IP)."""
+
+    def __init__(self, requests_per_minute: int = 60):
+        self.requests_per_minute = requests_per_minute
+        self.requests = defaultdict(list)
+        self.cleanup_interval = timedelta(minutes=5)
+        self.last_cleanup = datetime.now()
+
+    def _cleanup_old_requests(self):
+        if datetime.now() - self.last_cleanup > self.cleanup_interval:
+            cutoff_time = datetime.now() - timedelta(minutes=1)
+            for ip in list(self.requests.keys()):
+                self.requests[ip] = [t for t in self.requests[ip] if t > cutoff_time]
+                if not self.requests[ip]:
+                    del self.requests[ip]
+            self.last_cleanup = datetime.now()
+
+    def is_allowed(self, client_ip):
+        self._cleanup_old_requests()
+        now = datetime.now()
+        cutoff_time = now - timedelta(minutes=1)
+        recent_requests = [t for t in self.requests[client_ip] if t > cutoff_time]
+        if len(recent_requests) >= self.requests_per_minute:
+            return False, 0
+        self.requests[client_ip] = recent_requests + [now]
+        return True, self.requests_per_minute - len(self.requests[client_ip])
+
+
+def traffic(ips: int, requests: int, heavy_share: float, seed: int):
+    """Sequenza di IP: il heavy_share del traffico viene da 1% dei client."""
+    rng = random.Random(seed)
+    addresses = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(ips)]
+    heavy = addresses[:max(1, ips // 100)]
+    return [rng.choice(heavy) if rng.random() < heavy_share else rng.choice(addresses)
+            for _ in range(requests)]
+
+
+def measure(factory, sequence):
+    """Tempo per verifica (senza tracemalloc) e memoria trattenuta su un limiter nuovo."""
+    limiter = factory()
+    start = time.perf_counter()
+    allowed = sum(limiter.is_allowed(ip)[0] for ip in sequence)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    limiter = factory()
+    for ip in sequence:
+        limiter.is_allowed(ip)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, allowed, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ips', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=500000)
+    parser.add_argument('--per-minute', type=int, default=60)
+    parser.add_argument('--heavy-share', type=float, default=0.3, help='Quota di traffico dei client più attivi')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sequence = traffic(args.ips, args.requests, args.heavy_share, args.seed)
+
+    print(f"{'path':>8} {'ns/check':>9} {'allowed':>9} {'retained_kib':>13} {'peak_kib':>9}")
+    for name, factory in (('before', ListRateLimiter), ('after', RateLimiter)):
+        elapsed, allowed, current, peak = measure(lambda: factory(args.per_minute), sequence)
+        print(f"{name:>8} {elapsed * 1e9 / len(sequence):>9.0f} {allowed:>9} "
+              f"{current / 1024:>13.1f} {peak / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+"""
+Suite di benchmark del matching con output JSON confrontabile tra commit.
+
+Misura, su popolazioni sintetiche (vedi synthetic.py):
+- engine: codifica dei partner, path scalare, path vettoriale, pruning con
+  score minimo, matching inverso (partner -> PMI) e modalità ANN (con
+  recall@k rispetto al path esatto);
+- endpoint: GET /api/v1/matching/suggestions su un database SQLite
+  temporaneo, alla prima richiesta (matching in tempo reale) e alle
+  successive (suggerimenti precalcolati), con il numero di query SQL.
+
+Uso:
+    python benchmarks/run_matching.py [--sizes 1000 10000] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "ai_models"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np
+
+from matching_algorithm import BusinessMatchingEngine
+from synthetic import generate_partners, generate_pmis, populate_database
+
+
+def _timed(function, items):
+    """Esegue function su ogni elemento; restituisce (risultati, ms per elemento)."""
+    start = time.perf_counter()
+    results = [function(item) for item in items]
+    return results, (time.perf_counter() - start) * 1000 / max(len(items), 1)
+
+
+def _percentiles(samples):
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+    }
+
+
+def _recall(exact, approximate):
+    """Quota dei risultati approssimati che raggiungono il k-esimo score esatto."""
+    hits = total = 0
+    for exact_matches, matches in zip(exact, approximate):
+        if not exact_matches:
+            continue
+        threshold = exact_matches[-1]['match_score']
+        hits += sum(1 for m in matches if m['match_score'] >= threshold)
+        total += len(exact_matches)
+    return round(hits / total, 4) if total else None
+
+
+def bench_engine(size, pmis, args):
+    """Benchmark dei path di BusinessMatchingEngine su size partner."""
+    engine = BusinessMatchingEngine()
+    engine.analyzer  # import di scikit-learn fuori dalle misure
+    partners = generate_partners(size, args.seed)
+
+    start = time.perf_counter()
+    features = engine.encode_partners(partners)
+    result = {'partners': size, 'encode_s': round(time.perf_counter() - start, 4)}
+
+    exact, result['batch_ms'] = _timed(
+        lambda pmi: engine.find_best_matches_batch(pmi, features, top_n=args.top_n), pmis
+    )
+
+    if size <= args.scalar_limit:
+        scalar_pmis = pmis[:args.scalar_pmis]
+        scalar, result['scalar_ms'] = _timed(
+            lambda pmi: engine.find_best_matches(pmi, partners, top_n=args.top_n), scalar_pmis
+        )
+        result['scalar_equal'] = all(
+            [m['partner_id'] for m in a] == [m['partner_id'] for m in b]
+            for a, b in zip(scalar, exact)
+        )
+
+    engine.build_candidate_index(features)
+    candidates = [engine.generate_candidates(pmi, features, args.min_score) for pmi in pmis]
+    pruned, result['pruned_ms'] = _timed(
+        lambda pmi: engine.find_best_matches_batch(pmi, features, top_n=args.top_n, min_score=args.min_score), pmis
+    )
+    result['pruned_min_score'] = args.min_score
+    result['pruned_candidate_ratio'] = round(statistics.fmean(
+        (len(c) if c is not None else size) / size for c in candidates
+    ), 4)
+    filtered = [[m for m in matches if m['match_score'] >= args.min_score] for matches in exact]
+    result['pruned_equal'] = all(
+        [m['partner_id'] for m in a] == [m['partner_id'] for m in b][:len(a)]
+        for a, b in zip(pruned, filtered)
+    )
+
+    # Matching inverso: gli stessi partner contro un catalogo di size PMI
+    catalog = generate_pmis(size, args.seed + 2)
+    start = time.perf_counter()
+    pmi_features = engine.encode_pmis(catalog)
+    result['reverse_encode_s'] = round(time.perf_counter() - start, 4)
+    _, result['reverse_ms'] = _timed(
+        lambda partner: engine.find_best_pmis_batch(partner, pmi_features, top_n=args.top_n),
+        partners[:len(pmis)]
+    )
+
+    if args.ann_candidates and size > args.ann_candidates:
+        engine.ann_candidates = args.ann_candidates
+        start = time.perf_counter()
+        index = engine.build_ann_index(features)
+        result['ann_backend'] = index.backend
+        result['ann_build_s'] = round(time.perf_counter() - start, 4)
+        approximate, result['ann_ms'] = _timed(
+            lambda pmi: engine.find_best_matches_batch(pmi, features, top_n=args.top_n), pmis
+        )
+        result[f'ann_recall_at_{args.top_n}'] = _recall(exact, approximate)
+
+    for key in ('batch_ms', 'scalar_ms', 'pruned_ms', 'reverse_ms', 'ann_ms'):
+        if key in result:
+            result[key] = round(result[key], 3)
+    return result
+
+
+def bench_endpoint(args):
+    """Benchmark end-to-end di /matching/suggestions su SQLite."""
+    workdir = tempfile.mkdtemp(prefix='matching-bench-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}",
+        'MATCHING_DATA_DIR': os.path.join(workdir, 'matching'),
+        'UPLOAD_DIR': os.path.join(workdir, 'uploads'),
+        'LOG_LEVEL': 'WARNING',
+        'MATCHING_WARMUP_ON_STARTUP': 'false',
+    })
+    sys.path.insert(0, str(ROOT / "api"))
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+    from app.core.database import SessionLocal, engine as db_engine
+    from app.core.dependencies import require_pmi
+    from app.main import app
+    from app.models.user import User
+
+    db = SessionLocal()
+    user_ids = populate_database(db, args.endpoint_pmis, args.endpoint_partners, args.seed)
+    users = {u.id: u for u in db.query(User).filter(User.id.in_(user_ids))}
+    db.expunge_all()
+    db.close()
+
+    statements = [0]
+    event.listen(db_engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+    client = TestClient(app)
+    url = f'/api/v1/matching/suggestions?limit={args.top_n}'
+    samples = {'cold': [], 'warm': []}
+    queries = {'cold': [], 'warm': []}
+    for phase in ('cold', 'warm'):
+        for user_id in user_ids:
+            app.dependency_overrides[require_pmi] = lambda user=users[user_id]: user
+            statements[0] = 0
+            start = time.perf_counter()
+            response = client.get(url)
+            samples[phase].append((time.perf_counter() - start) * 1000)
+            queries[phase].append(statements[0])
+            assert response.status_code == 200, response.text
+    app.dependency_overrides.clear()
+
+    return {
+        'partners': args.endpoint_partners,
+        'pmis': args.endpoint_pmis,
+        'limit': args.top_n,
+        **{phase: dict(_percentiles(samples[phase]), sql_statements=max(queries[phase]))
+           for phase in samples},
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--pmis', type=int, default=50, help='PMI per dimensione del catalogo')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--scalar-limit', type=int, default=2000)
+    parser.add_argument('--scalar-pmis', type=int, default=5, help='PMI valutate anche con il path scalare')
+    parser.add_argument('--min-score', type=float, default=50.0)
+    parser.add_argument('--ann-candidates', type=int, default=300, help='0 per saltare la modalità ANN')
+    parser.add_argument('--endpoint-partners', type=int, default=2000, help='0 per saltare il benchmark end-to-end')
+    parser.add_argument('--endpoint-pmis', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='File JSON dei risultati (default: stdout)')
+    args = parser.parse_args()
+
+    pmis = generate_pmis(args.pmis, args.seed + 1)
+    results = {
+        'commit': _commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'parameters': vars(args),
+        'engine': [bench_engine(size, pmis, args) for size in args.sizes],
+    }
+    if args.endpoint_partners:
+        results['endpoint'] = bench_endpoint(args)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
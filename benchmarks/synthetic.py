@@ -0,0 +1,166 @@
+"""
+Generatori di popolazioni sintetiche di PMI e partner per i benchmark del matching.
+
+Settori, paesi, servizi e tipi di partner sono quelli riconosciuti da
+BusinessMatchingEngine; le distribuzioni imitano il catalogo reale (partner
+concentrati in Kenya, Tanzania ed Etiopia, settori e servizi coerenti con
+il tipo di partner, descrizioni legate ai settori). A parità di seed le
+popolazioni sono identiche, così i risultati sono confrontabili tra commit.
+"""
+
+import json
+import random
+from typing import Dict, List
+
+# Settori PMI e settori di expertise compatibili (come in BusinessMatchingEngine)
+SECTOR_CLUSTERS = {
+    'agritech': ['agriculture', 'food_processing', 'logistics'],
+    'manufacturing': ['industrial', 'logistics', 'quality_control'],
+    'technology': ['it_services', 'consulting', 'innovation'],
+    'food_beverage': ['food_processing', 'distribution', 'retail'],
+    'fashion': ['textile', 'retail', 'distribution'],
+    'construction': ['engineering', 'real_estate', 'logistics'],
+    'energy': ['renewable_energy', 'engineering', 'consulting'],
+    'healthcare': ['medical_devices', 'pharmaceuticals', 'distribution'],
+}
+PMI_SECTORS = list(SECTOR_CLUSTERS)
+SECTORS = sorted({s for cluster in SECTOR_CLUSTERS.values() for s in cluster})
+
+COUNTRIES = ['Kenya', 'Tanzania', 'Ethiopia', 'Uganda', 'Sudan']
+COUNTRY_WEIGHTS = [0.35, 0.25, 0.25, 0.10, 0.05]
+TARGET_MARKETS = ['Kenya', 'Tanzania', 'Ethiopia']
+
+# Servizi tipici per tipo di partner ('' = tipo non indicato)
+SERVICES_BY_TYPE = {
+    'small_distributor': ['distributor', 'logistics', 'warehousing'],
+    'medium_distributor': ['distributor', 'logistics', 'warehousing', 'customs'],
+    'large_distributor': ['distributor', 'logistics', 'warehousing', 'customs'],
+    'consultant': ['consulting', 'market_research', 'legal'],
+    'agent': ['distributor', 'market_research', 'consulting'],
+    'logistics_company': ['logistics', 'warehousing', 'customs'],
+    '': ['distributor', 'consulting', 'logistics'],
+}
+PARTNER_TYPES = list(SERVICES_BY_TYPE)
+PARTNER_TYPE_WEIGHTS = [0.20, 0.20, 0.08, 0.20, 0.14, 0.13, 0.05]
+SERVICES = sorted({s for services in SERVICES_BY_TYPE.values() for s in services})
+
+COMPANY_SIZES = ['micro', 'small', 'medium']
+COMPANY_SIZE_WEIGHTS = [0.25, 0.50, 0.25]
+
+# Vocabolario delle descrizioni per settore
+SECTOR_WORDS = {
+    'agriculture': 'agricultural equipment farming irrigation seeds fertilizer harvest cooperative',
+    'food_processing': 'food processing packaging dairy milling cold chain ingredients',
+    'logistics': 'logistics transport freight trucking last mile fleet',
+    'industrial': 'industrial machinery components maintenance spare parts plant',
+    'quality_control': 'quality certification inspection testing standards compliance',
+    'it_services': 'software cloud integration networking data systems',
+    'consulting': 'consulting market entry strategy advisory business development',
+    'innovation': 'innovation startups technology incubation digital transformation',
+    'distribution': 'distribution network wholesale dealers import export',
+    'retail': 'retail shops supermarkets consumer brands outlets',
+    'textile': 'textile garments fabrics apparel cotton manufacturing',
+    'engineering': 'engineering projects infrastructure design installation',
+    'real_estate': 'real estate property development construction sites',
+    'renewable_energy': 'solar renewable energy off grid power installation',
+    'medical_devices': 'medical devices hospital equipment diagnostics',
+    'pharmaceuticals': 'pharmaceutical medicines pharmacy supply registration',
+}
+COMMON_WORDS = 'leading experience east africa regional clients partners years local'.split()
+
+
+def _description(rng: random.Random, sectors: List[str], length: int) -> str:
+    words = [w for s in sectors for w in SECTOR_WORDS[s].split()] or COMMON_WORDS
+    return ' '.join(rng.choice(words) if rng.random() < 0.7 else rng.choice(COMMON_WORDS)
+                    for _ in range(length))
+
+
+def generate_partners(count: int, seed: int = 42) -> List[Dict]:
+    """Genera partner nel formato di MatchingService._prepare_partner_data."""
+    rng = random.Random(seed)
+    partners = []
+    for i in range(count):
+        partner_type = rng.choices(PARTNER_TYPES, PARTNER_TYPE_WEIGHTS)[0]
+        cluster = SECTOR_CLUSTERS[rng.choice(PMI_SECTORS)]
+        sectors = rng.sample(cluster, rng.randint(0, 2)) if rng.random() < 0.95 else []
+        if rng.random() < 0.2:
+            sectors.append(rng.choice(SECTORS))
+        services = SERVICES_BY_TYPE[partner_type]
+        partners.append({
+            'id': i,
+            'company_name': f'Partner {i}',
+            'country': rng.choices(COUNTRIES, COUNTRY_WEIGHTS)[0],
+            'city': '',
+            'partner_type': partner_type,
+            'sectors_expertise': list(dict.fromkeys(sectors)),
+            'services_offered': rng.sample(services, rng.randint(1, len(services))),
+            'description': _description(rng, sectors, rng.randint(0, 25)) if rng.random() < 0.9 else '',
+        })
+    return partners
+
+
+def generate_pmis(count: int, seed: int = 7) -> List[Dict]:
+    """Genera PMI nel formato di MatchingService._prepare_pmi_data."""
+    rng = random.Random(seed)
+    pmis = []
+    for i in range(count):
+        sector = rng.choice(PMI_SECTORS)
+        pmis.append({
+            'id': i,
+            'company_name': f'PMI {i}',
+            'sector': sector,
+            'target_markets': rng.sample(TARGET_MARKETS, rng.randint(1, 2)),
+            'business_needs': ['distributor', 'logistics'],  # come MatchingService._prepare_pmi_data
+            'company_size': rng.choices(COMPANY_SIZES, COMPANY_SIZE_WEIGHTS)[0],
+            'production_capacity': 'medium',
+            'business_objectives': _description(rng, SECTOR_CLUSTERS[sector], rng.randint(4, 15)),
+        })
+    return pmis
+
+
+def populate_database(db, pmi_count: int, partner_count: int, seed: int = 42) -> List[int]:
+    """
+    Inserisce utenti, profili PMI e profili partner sintetici nel database.
+
+    Richiede che il package ``app`` dell'API sia importabile.
+
+    Returns:
+        ID degli utenti PMI creati
+    """
+    from app.models.user import User, UserRole, PMIProfile, PartnerProfile
+
+    for partner in generate_partners(partner_count, seed):
+        user = User(email=f"partner{partner['id']}@example.com", hashed_password='x',
+                    full_name=partner['company_name'], role=UserRole.PARTNER)
+        db.add(user)
+        db.flush()
+        db.add(PartnerProfile(
+            user_id=user.id,
+            company_name=partner['company_name'],
+            country=partner['country'],
+            partner_type=partner['partner_type'],
+            description=partner['description'],
+            services_offered=json.dumps(partner['services_offered']),
+            sectors_expertise=json.dumps(partner['sectors_expertise']),
+            is_public=True,
+        ))
+
+    pmi_user_ids = []
+    for pmi in generate_pmis(pmi_count, seed + 1):
+        user = User(email=f"pmi{pmi['id']}@example.com", hashed_password='x',
+                    full_name=pmi['company_name'], role=UserRole.PMI)
+        db.add(user)
+        db.flush()
+        db.add(PMIProfile(
+            user_id=user.id,
+            company_name=pmi['company_name'],
+            sector=pmi['sector'],
+            company_size=pmi['company_size'],
+            production_capacity=pmi['production_capacity'],
+            target_markets=json.dumps(pmi['target_markets']),
+            business_objectives=pmi['business_objectives'],
+        ))
+        pmi_user_ids.append(user.id)
+
+    db.commit()
+    return pmi_user_ids